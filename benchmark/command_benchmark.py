@@ -0,0 +1,94 @@
+"""Loopback benchmark of the command rate of `CameraServer` and `CameraDriver` on the fake camera backend.
+
+Starts `server/camera_server.py --backend fake` like `e2e_benchmark.py` and sends `template_action` commands, which
+do not touch the camera, so the numbers are the cost of the command protocol itself: framing, dispatch, the reply
+reader thread and the loopback round trip. Runs once with the framed protocol and once with bare JSON messages,
+which older drivers and servers speak, so the backward compatible path is measured as well.
+
+Reports commands per second:
+    sequential   `send`, one command at a time
+    send_many    all commands pipelined with `send_many`
+    send_async   all commands sent with `send_async` before the first reply is awaited
+
+Bare JSON messages only allow one command in flight, there `send_many` and `send_async` send one after another.
+
+Usage:
+    python benchmark/command_benchmark.py [--commands 5000] [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import camera_driver
+from camera_driver import CameraDriver
+from e2e_benchmark import free_ports, start_server
+
+COMMAND = {"action": "template_action", "args": {"test_int": 1}}
+# Protocol version offered by the driver per mode, version 0 makes the server answer with bare JSON messages
+MODES = (("framed", camera_driver.PROTOCOL_VERSION), ("bare JSON", 0))
+
+
+def sequential(camera, count):
+    for _ in range(count):
+        camera.send(COMMAND)
+
+
+def send_many(camera, count):
+    camera.send_many([COMMAND] * count)
+
+
+def send_async(camera, count):
+    futures = [camera.send_async(COMMAND) for _ in range(count)]
+    for future in futures:
+        future.result()
+
+
+def run(name, protocol, ports, count, repeat):
+    camera_driver.PROTOCOL_VERSION = protocol
+    camera = CameraDriver("127.0.0.1", *ports)
+    rates = []
+    try:
+        # Warm up the connection and the server
+        sequential(camera, 100)
+        for bench in (sequential, send_many, send_async):
+            samples = []
+            for _ in range(repeat):
+                t_start = time.perf_counter()
+                bench(camera, count)
+                samples.append(count / (time.perf_counter() - t_start))
+            rates.append(np.median(samples))
+        assert camera.protocol == protocol, f"Driver negotiated protocol {camera.protocol} instead of {protocol}"
+    finally:
+        camera.close()
+    print(f"{name:<10} protocol {protocol} " + " ".join(f"{rate:>10.0f} /s {bench}" for rate, bench in zip(rates, ("sequential", "send_many", "send_async"))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=5000, help="Commands per measurement.")
+    parser.add_argument("--repeat", type=int, default=3, help="Measurements per mode and method, the median is reported.")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    ports = free_ports(3)
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(*ports, 30.0, workdir)
+        try:
+            print(f"{args.commands} template_action commands over loopback, median of {args.repeat} runs")
+            for name, protocol in MODES:
+                run(name, protocol, ports, args.commands, args.repeat)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
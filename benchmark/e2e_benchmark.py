@@ -0,0 +1,209 @@
+"""End-to-end loopback benchmark of `CameraServer` and `CameraDriver` on the fake camera backend.
+
+Starts `server/camera_server.py --backend fake` in a subprocess on free loopback ports and drives it with a
+`CameraDriver`, so every number includes the real command protocol, the camera thread, the data connections and
+the video fanout. Only the camera itself is synthetic: `FakeCamera` delivers frames at `--fps`, encoded still
+images of typical size for the format and a H.264-like byte stream. The results are regression numbers for the
+software path, they run on any Linux machine without a Raspberry Pi.
+
+Reports:
+    commands/s       `template_action` round trips, one at a time and pipelined with `send_many`
+    capture latency  p50/p95/p99 of `capture` in memory mode, cold (camera configured per capture) and persistent
+    stills/s         persistent captures back to back, and frames per second of `iter_burst`
+    transfer MB/s    large `bmp` captures received into memory
+    video            H.264 throughput and frame rate of `start_video`, frames dropped by the server
+    video stills     latency of captures during the video and the longest gap between video frames meanwhile
+    stream           bitrate, lost MPEG-TS packets and jitter of `start_stream`, received by the driver
+    async sessions   `AsyncCameraDriver` sessions on one event loop: connect time, command rate and captures of all sessions at once
+
+Usage:
+    python benchmark/e2e_benchmark.py [--captures 50] [--fps 30] [--video-seconds 5]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+from camera_driver import CameraDriver
+from async_camera_driver import AsyncCameraDriver
+
+STILL_RESOLUTION = (1280, 720)
+TRANSFER_RESOLUTION = (4608, 2592)
+VIDEO_RESOLUTION = (1280, 720)
+
+
+def free_ports(count):
+    """Ports that are free on the loopback interface right now."""
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_STREAM) for _ in range(count)]
+    for s in sockets:
+        s.bind(("127.0.0.1", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def start_server(cmd_port, data_port, stream_port, fps, workdir):
+    """Run the camera server with the fake camera and wait until it accepts control connections."""
+    command = [sys.executable, os.path.join(ROOT, "server", "camera_server.py"), "--backend", "fake", "--fps", str(fps),
+               "--cmd-port", str(cmd_port), "--data-port", str(data_port), "--stream-port", str(stream_port)]
+    server = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10.0
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Camera server exited with code {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", cmd_port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("Camera server did not start")
+
+
+def percentiles(samples_ms):
+    return " ".join(f"{np.percentile(samples_ms, p):>8.1f} ms p{p}" for p in (50, 95, 99))
+
+
+def bench_commands(camera, count):
+    t_start = time.perf_counter()
+    for _ in range(count):
+        camera.send({"action": "template_action", "args": {"test_int": 1}})
+    sequential = count / (time.perf_counter() - t_start)
+    t_start = time.perf_counter()
+    camera.send_many([{"action": "template_action", "args": {"test_int": 1}}] * count)
+    pipelined = count / (time.perf_counter() - t_start)
+    print(f"{'commands':<22} {sequential:>10.0f} /s sequential {pipelined:>10.0f} /s pipelined")
+
+
+def bench_capture_latency(camera, count, persistent):
+    latencies = []
+    for _ in range(count):
+        t_start = time.perf_counter()
+        camera.capture(resolution=STILL_RESOLUTION, autofocus=False, focus_length=1.0, persistent=persistent, transfer_mode="memory")
+        latencies.append((time.perf_counter() - t_start) * 1000)
+    camera.release_camera()
+    name = "capture persistent" if persistent else "capture cold"
+    print(f"{name:<22} {percentiles(latencies)}")
+    if persistent:
+        # Without the first capture, which configures the camera
+        print(f"{'stills persistent':<22} {1000 / np.mean(latencies[1:]):>10.1f} stills/s")
+
+
+def bench_burst(camera, count):
+    t_first = None
+    frames = 0
+    for index, timestamp, data in camera.iter_burst(count, resolution=STILL_RESOLUTION, autofocus=False, focus_length=1.0):
+        if t_first is None:
+            t_first = time.perf_counter()
+        frames += 1
+    elapsed = time.perf_counter() - t_first
+    print(f"{'burst':<22} {(frames - 1) / elapsed:>10.1f} frames/s ({frames} frames)")
+
+
+def bench_transfer(camera, count):
+    received = 0
+    elapsed = 0.0
+    # Warm camera, so only the capture of the next frame and the transfer are timed
+    camera.capture(file_format="bmp", resolution=TRANSFER_RESOLUTION, autofocus=False, focus_length=1.0, persistent=True, transfer_mode="memory")
+    for _ in range(count):
+        t_start = time.perf_counter()
+        response = camera.capture(file_format="bmp", resolution=TRANSFER_RESOLUTION, autofocus=False, focus_length=1.0, persistent=True, transfer_mode="memory")
+        elapsed += time.perf_counter() - t_start
+        received += len(response["details"]["data"])
+    camera.release_camera()
+    print(f"{'transfer bmp':<22} {received / elapsed / 1024 / 1024:>10.1f} MB/s ({received / count / 1024 / 1024:.1f} MB per image)")
+
+
+def bench_video(camera, seconds, workdir):
+    camera.start_video("e2e_video", workdir, resolution=VIDEO_RESOLUTION, duration=0)
+    time.sleep(seconds / 2)
+    # Stills from the running video, which must not interrupt it
+    latencies = []
+    gaps = []
+    for _ in range(5):
+        t_start = time.perf_counter()
+        response = camera.capture(transfer_mode="memory")
+        latencies.append((time.perf_counter() - t_start) * 1000)
+        gaps.append(response["details"]["video"]["gap_ms"])
+    time.sleep(seconds / 2)
+    sinks = camera.video_status()["details"]["sinks"]
+    status = camera.stop_video()["details"]
+    camera._video_thread.join(5.0)
+    size = os.path.getsize(os.path.join(workdir, "e2e_video.h264"))
+    dropped = sum(sink["dropped"] for sink in sinks)
+    print(f"{'video':<22} {size * 8 / seconds / 1e6:>10.2f} Mbit/s {status['sent'] / seconds:>6.1f} frames/s {dropped:>4} dropped")
+    print(f"{'video stills':<22} {percentiles(latencies)} {max(gaps):>8.1f} ms max video gap")
+
+
+def bench_stream(camera, seconds):
+    camera.start_stream(resolution=VIDEO_RESOLUTION, receive=True)
+    time.sleep(seconds)
+    stats = camera.stop_stream()["details"]["receiver"]
+    print(f"{'stream':<22} {stats['bitrate_bps'] / 1e6:>10.2f} Mbit/s {stats['lost']:>6} lost {stats['jitter_ms']:>6.2f} ms jitter")
+
+
+async def bench_async_sessions(cmd_port, data_port, stream_port, sessions, commands):
+    """Many sessions driven by one event loop, without a thread per session."""
+    t_start = time.perf_counter()
+    cameras = await asyncio.gather(*(AsyncCameraDriver("127.0.0.1", cmd_port, data_port, stream_port, timeout=120.0).connect() for _ in range(sessions)))
+    connect = time.perf_counter() - t_start
+    threads = threading.active_count()
+    try:
+        t_start = time.perf_counter()
+        await asyncio.gather(*(camera.send_many([{"action": "template_action", "args": {"test_int": 1}}] * commands) for camera in cameras))
+        rate = sessions * commands / (time.perf_counter() - t_start)
+        # All sessions share the camera, their captures are queued fairly on the server
+        t_start = time.perf_counter()
+        await asyncio.gather(*(camera.capture(resolution=STILL_RESOLUTION, autofocus=False, focus_length=1.0, persistent=True, transfer_mode="memory") for camera in cameras))
+        captures = sessions / (time.perf_counter() - t_start)
+        await cameras[0].send({"action": "release_camera", "args": {}})
+    finally:
+        await asyncio.gather(*(camera.close() for camera in cameras))
+    print(f"{'async sessions':<22} {sessions:>10} sessions {connect * 1000:>8.1f} ms connect {threads:>4} threads")
+    print(f"{'async commands':<22} {rate:>10.0f} /s {captures:>10.1f} captures/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captures", type=int, default=50, help="Captures per latency measurement.")
+    parser.add_argument("--commands", type=int, default=2000, help="Commands per command rate measurement.")
+    parser.add_argument("--transfers", type=int, default=10, help="Large captures of the transfer measurement.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate of the fake camera.")
+    parser.add_argument("--video-seconds", type=float, default=5.0, help="Duration of the video measurement.")
+    parser.add_argument("--async-sessions", type=int, default=200, help="Concurrent sessions of the async driver measurement.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    cmd_port, data_port, stream_port = free_ports(3)
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(cmd_port, data_port, stream_port, args.fps, workdir)
+        try:
+            camera = CameraDriver("127.0.0.1", cmd_port, data_port, stream_port)
+            print(f"CameraServer with fake camera at {args.fps} fps over loopback")
+            bench_commands(camera, args.commands)
+            bench_capture_latency(camera, args.captures, persistent=False)
+            bench_capture_latency(camera, args.captures, persistent=True)
+            bench_burst(camera, args.captures)
+            bench_transfer(camera, args.transfers)
+            bench_video(camera, args.video_seconds, workdir)
+            bench_stream(camera, args.video_seconds)
+            camera.close()
+            asyncio.run(bench_async_sessions(cmd_port, data_port, stream_port, args.async_sessions, commands=10))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
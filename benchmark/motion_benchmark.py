@@ -0,0 +1,93 @@
+"""Benchmark of the motion detection with synthetic frame sequences instead of the camera.
+
+Feeds a `MotionDetector` with noisy textured grayscale frames of the low resolution stream size. The scene holds still
+periods, a step and a flicker of the brightness of the whole frame (e.g. a light switched on, auto exposure) and objects
+moving through it. Reports the detection time per frame and the frame rate one CPU core keeps up with, the latency from
+the first frame of an object to its start event in frames, and false events outside of the object periods. Runs with
+different cell sizes and with a zone, which is how the detection is meant to be tuned on a Raspberry Pi.
+
+Usage:
+    python benchmark/motion_benchmark.py [--repeat 3] [--fps 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from motion_detector import MotionDetector
+
+FRAME_SIZE = (640, 360)
+OBJECT_SIZE = 80
+# Periods of the scene: kind and number of frames
+SCENE = (("still", 60), ("light step", 60), ("object", 45), ("still", 90), ("flicker", 60), ("object", 45), ("still", 90))
+# Detector settings per run: cell size and zones
+RUNS = (("cell 16", 16, None),
+        ("cell 8", 8, None),
+        ("cell 32", 32, None),
+        ("cell 16 + zone", 16, [(0.0, 0.0, 0.5, 1.0)]))
+
+
+def scene_frames(rng):
+    """Yield the frames of `SCENE` with the period index and kind of every frame."""
+    width, height = FRAME_SIZE
+    texture = rng.normal(110, 25, size=(height, width)).clip(0, 200).astype(np.int16)
+    brightness = 0
+    for period, (kind, frames) in enumerate(SCENE):
+        if kind == "light step":
+            brightness += 30
+        for index in range(frames):
+            offset = brightness + (12 * (-1) ** index if kind == "flicker" else 0)
+            frame = texture + offset + rng.integers(-6, 7, size=(height, width), dtype=np.int16)
+            if kind == "object":
+                # Crosses the left half of the frame diagonally
+                x = int(index / frames * (width // 2 - OBJECT_SIZE))
+                y = int(index / frames * (height - OBJECT_SIZE))
+                frame[y:y + OBJECT_SIZE, x:x + OBJECT_SIZE] = 240
+            yield period, kind, frame.clip(0, 255).astype(np.uint8)
+
+
+def run(name, cell, zones, fps, repeat):
+    costs = []
+    latencies = []
+    false_events = 0
+    for attempt in range(repeat):
+        started = []
+        detector = MotionDetector(lambda event: event["state"] == "start" and started.append(event), zones=zones, cell=cell, hold=1.0)
+        object_start = {}
+        for number, (period, kind, frame) in enumerate(scene_frames(np.random.default_rng(attempt))):
+            if kind == "object":
+                object_start.setdefault(period, number)
+            count = len(started)
+            t_start = time.perf_counter()
+            detector.submit(frame, number / fps)
+            costs.append(time.perf_counter() - t_start)
+            if len(started) > count:
+                if kind == "object" and period in object_start:
+                    latencies.append(number - object_start.pop(period))
+                else:
+                    false_events += 1
+        detector.close()
+
+    costs = np.array(costs) * 1000
+    objects = repeat * sum(kind == "object" for kind, _ in SCENE)
+    latency = np.mean(latencies) if latencies else np.nan
+    print(f"{name:<16} {np.percentile(costs, 50):>6.3f} ms p50 {np.percentile(costs, 99):>6.3f} ms p99 {1000 / costs.mean():>8.0f} frames/s "
+          f"{len(latencies):>3}/{objects:<3} detected {latency:>4.1f} frames latency {false_events:>3} false events")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the scene per setting, with different noise.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate of the simulated low resolution stream, which sets the timing of `hold`.")
+    args = parser.parse_args()
+
+    print(f"{sum(frames for _, frames in SCENE)} frames of {FRAME_SIZE[0]}x{FRAME_SIZE[1]} at {args.fps} fps: " + ", ".join(f"{kind} {frames}" for kind, frames in SCENE))
+    for name, cell, zones in RUNS:
+        run(name, cell, zones, args.fps, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
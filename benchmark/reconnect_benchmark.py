@@ -0,0 +1,216 @@
+"""Loopback fault injection benchmark of the reconnect of `CameraDriver`.
+
+Starts `server/camera_server.py --backend fake` like `e2e_benchmark.py` and connects a `CameraDriver` through a TCP proxy
+in front of the command and data port, which injects the faults. Load threads keep sending commands while the faults
+happen: `template_action`, captures received into memory and `video_status`, which goes over the connection pool.
+
+Faults:
+    reset        the proxy resets all connections (RST), as after a NAT or firewall dropped them
+    restart      the camera server is killed and started again after `--down` seconds
+    blackhole    the proxy stops forwarding for `--down` seconds without closing anything, commands run into `--timeout`
+
+Reports per fault the recovery time, from the end of the fault to the first reply to a command sent after its start
+(p50 and maximum over `--repeat` faults), the commands that failed, the commands resent after a reconnect and the
+reconnects of the driver.
+
+Usage:
+    python benchmark/reconnect_benchmark.py [--repeat 5] [--down 1.0] [--timeout 0.5] [--threads 3]
+"""
+import argparse
+import logging
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from camera_driver import CameraDriver
+from e2e_benchmark import free_ports, start_server
+
+CAPTURE_RESOLUTION = (640, 480)
+FAULTS = ("reset", "restart", "blackhole")
+
+
+class FaultProxy:
+    """Relays TCP connections from `port` to `target_port` on the loopback interface. `reset` aborts all relayed
+    connections, while `stalled` is set nothing is forwarded."""
+
+    def __init__(self, port, target_port):
+        self.target_port = target_port
+        self.stalled = threading.Event()
+        self._pairs = []
+        self._lock = threading.Lock()
+        self._listener = socket.create_server(("127.0.0.1", port))
+        threading.Thread(target=self._accept_thread, daemon=True).start()
+
+    def _accept_thread(self):
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(("127.0.0.1", self.target_port), timeout=1.0)
+                upstream.settimeout(None)
+            except OSError:
+                # Server down, the client sees the connection closed
+                client.close()
+                continue
+            with self._lock:
+                self._pairs.append((client, upstream))
+            threading.Thread(target=self._relay_thread, args=(client, upstream), daemon=True).start()
+            threading.Thread(target=self._relay_thread, args=(upstream, client), daemon=True).start()
+
+    def _relay_thread(self, source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                while self.stalled.is_set():
+                    time.sleep(0.01)
+                target.sendall(data)
+        except OSError:
+            pass
+        for sock in (source, target):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def reset(self):
+        with self._lock:
+            pairs, self._pairs = self._pairs, []
+        for pair in pairs:
+            for sock in pair:
+                # Linger of zero seconds closes with RST instead of FIN
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                try:
+                    sock.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+                sock.close()
+
+    def close(self):
+        self._listener.close()
+        self.reset()
+
+
+class Load:
+    """Threads that keep sending commands and record `(start, end, ok)` of every command."""
+
+    def __init__(self, camera, threads):
+        self.camera = camera
+        self.results = []
+        self._running = True
+        self._threads = [threading.Thread(target=self._load_thread, args=(index,), daemon=True) for index in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def _load_thread(self, index):
+        commands = (lambda: self.camera.template_action(index),
+                    lambda: self.camera.capture(resolution=CAPTURE_RESOLUTION, autofocus=False, persistent=True, transfer_mode="memory"),
+                    self.camera.video_status)
+        step = index
+        while self._running:
+            t_start = time.perf_counter()
+            try:
+                commands[step % len(commands)]()
+                ok = True
+            except Exception:
+                ok = False
+            self.results.append((t_start, time.perf_counter(), ok))
+            step += 1
+            if not ok:
+                time.sleep(0.01)
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+
+
+def recovery(results, t_fault, t_end):
+    """Seconds from the end of the fault `t_end` to the first reply to a command sent after the fault started at `t_fault`."""
+    ends = [end for start, end, ok in results if ok and start >= t_fault]
+    return max(0.0, min(ends) - t_end) if ends else np.nan
+
+
+def run(fault, args, ports, proxies, workdir, server):
+    cmd_port, data_port, stream_port, proxy_cmd, proxy_data = ports
+    timeout = args.timeout if fault == "blackhole" else 10.0
+    camera = CameraDriver("127.0.0.1", proxy_cmd, proxy_data, stream_port, timeout=timeout)
+    load = Load(camera, args.threads)
+    time.sleep(0.5)
+    recoveries = []
+    for _ in range(args.repeat):
+        count = len(load.results)
+        t_fault = time.perf_counter()
+        if fault == "reset":
+            for proxy in proxies:
+                proxy.reset()
+        elif fault == "restart":
+            server.kill()
+            server.wait()
+            for proxy in proxies:
+                proxy.reset()
+            time.sleep(args.down)
+            server = start_server(cmd_port, data_port, stream_port, args.fps, workdir)
+        else:
+            for proxy in proxies:
+                proxy.stalled.set()
+            time.sleep(args.down)
+            for proxy in proxies:
+                proxy.stalled.clear()
+        t_end = time.perf_counter()
+        # Wait for the recovery and some commands after it
+        deadline = t_end + 30.0
+        while time.perf_counter() < deadline and not any(ok and start >= t_fault for start, _, ok in load.results[count:]):
+            time.sleep(0.05)
+        time.sleep(1.0)
+        recoveries.append(recovery(load.results[count:], t_fault, t_end))
+    load.stop()
+    stats = camera.connection_stats()
+    camera.close()
+
+    recoveries = np.array(recoveries) * 1000
+    failed = sum(not ok for _, _, ok in load.results)
+    print(f"{fault:<10} {np.nanpercentile(recoveries, 50):>8.1f} ms p50 {np.nanmax(recoveries):>8.1f} ms max recovery "
+          f"{failed:>4}/{len(load.results):<5} commands failed {stats['resent']:>4} resent {stats['reconnects']:>3} reconnects")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Faults injected per kind.")
+    parser.add_argument("--down", type=float, default=1.0, help="Seconds the server is down or the connections are stalled.")
+    parser.add_argument("--timeout", type=float, default=0.5, help="Command timeout of the driver in the blackhole runs.")
+    parser.add_argument("--threads", type=int, default=3, help="Threads sending commands.")
+    parser.add_argument("--fps", type=int, default=30, help="Frame rate of the fake camera.")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    cmd_port, data_port, stream_port, proxy_cmd, proxy_data = ports = free_ports(5)
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(cmd_port, data_port, stream_port, args.fps, workdir)
+        proxies = (FaultProxy(proxy_cmd, cmd_port), FaultProxy(proxy_data, data_port))
+        try:
+            print(f"{args.repeat} faults per kind, {args.down} s down, {args.threads} threads sending commands")
+            for fault in FAULTS:
+                server = run(fault, args, ports, proxies, workdir, server)
+        finally:
+            for proxy in proxies:
+                proxy.close()
+            server.kill()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
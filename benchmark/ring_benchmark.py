@@ -0,0 +1,124 @@
+"""Benchmark and check of the pre-trigger video ring buffer with a synthetic encoder instead of the camera.
+
+Feeds a `VideoRing` with a synthetic H.264-like frame sequence: a keyframe every `--gop` frames, which is larger than
+the frames in between, with timestamps at `--fps`. Reports the append cost per frame and the time to cut a clip, and
+checks the guarantees `save_clip` relies on:
+    keyframe     every clip starts on a keyframe
+    pre_seconds  a clip reaches back at least `pre_seconds` before the trigger, and at most one keyframe interval further
+    post         a clip ends at the end of the requested post trigger period
+    seconds      the ring holds no more than `seconds` of video
+    max_bytes    the ring holds no more than `max_bytes`, frames beyond the budget are dropped from the front
+
+Exits with status 1 if a check fails.
+
+Usage:
+    python benchmark/ring_benchmark.py [--fps 30] [--gop 30] [--seconds 10] [--triggers 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from video_ring import VideoRing
+
+KEYFRAME_SIZE = 60_000
+FRAME_SIZE = 8_000
+PRE_SECONDS = (0.5, 2.0, 5.0)
+POST_SECONDS = 1.0
+
+
+def synthetic_frames(count, fps, gop, rng):
+    """Yield `(timestamp, keyframe, data)` of an encoded sequence with a keyframe every `gop` frames."""
+    keyframe_data = bytes(KEYFRAME_SIZE)
+    for index in range(count):
+        keyframe = index % gop == 0
+        size = KEYFRAME_SIZE if keyframe else FRAME_SIZE + int(rng.integers(-2000, 2000))
+        yield index / fps, keyframe, keyframe_data[:size]
+
+
+def check(name, ok, detail):
+    print(f"{name:<12} {'ok' if ok else 'FAILED':<7} {detail}")
+    return ok
+
+
+def run_clips(args, rng):
+    """Fill the ring longer than `seconds` and cut clips around random triggers. Returns the results of the checks."""
+    frame_period = 1 / args.fps
+    gop_period = args.gop / args.fps
+    ring = VideoRing(args.seconds, max_bytes=1 << 40)
+    count = int(3 * args.seconds * args.fps)
+    costs = []
+    for timestamp, keyframe, data in synthetic_frames(count, args.fps, args.gop, rng):
+        t_start = time.perf_counter()
+        ring.append(data, keyframe, timestamp)
+        costs.append(time.perf_counter() - t_start)
+    end = (count - 1) * frame_period
+    costs = np.array(costs) * 1e6
+    print(f"{'append':<12} {np.percentile(costs, 50):>7.2f} us p50 {np.percentile(costs, 99):>7.2f} us p99 per frame, "
+          f"{len(ring)} frames {ring.nbytes / 1e6:.1f} MB held")
+
+    results = [check("seconds", ring.span() <= args.seconds and ring.span() > args.seconds - frame_period,
+                     f"ring spans {ring.span():.3f} s of {args.seconds} s, {ring.dropped} frames dropped")]
+    starts_on_keyframe = reaches_back = not_too_far = ends_in_time = True
+    clip_costs = []
+    for _ in range(args.triggers):
+        pre = float(rng.choice(PRE_SECONDS))
+        # Triggers late enough that the ring reaches `pre` back and the post period was appended
+        trigger = float(rng.uniform(end - args.seconds + pre + gop_period, end - POST_SECONDS))
+        t_start = time.perf_counter()
+        clip = ring.clip(trigger - pre, trigger + POST_SECONDS)
+        clip_costs.append(time.perf_counter() - t_start)
+        starts_on_keyframe &= bool(clip) and clip[0][1]
+        reaches_back &= bool(clip) and clip[0][0] <= trigger - pre
+        not_too_far &= bool(clip) and clip[0][0] > trigger - pre - gop_period
+        ends_in_time &= bool(clip) and trigger + POST_SECONDS - frame_period < clip[-1][0] <= trigger + POST_SECONDS
+    clip_costs = np.array(clip_costs) * 1000
+    print(f"{'clip':<12} {np.percentile(clip_costs, 50):>7.3f} ms p50 {np.percentile(clip_costs, 99):>7.3f} ms p99 for {args.triggers} triggers")
+    results.append(check("keyframe", starts_on_keyframe, "clips start on a keyframe"))
+    results.append(check("pre_seconds", reaches_back and not_too_far, f"clips start between pre_seconds and pre_seconds + {gop_period:.2f} s before the trigger"))
+    results.append(check("post", ends_in_time, f"clips end within one frame before trigger + {POST_SECONDS} s"))
+
+    # A ring shorter than `pre_seconds` starts the clip on its first keyframe
+    short = VideoRing(gop_period * 2.5, max_bytes=1 << 40)
+    for timestamp, keyframe, data in synthetic_frames(count, args.fps, args.gop, rng):
+        short.append(data, keyframe, timestamp)
+    clip = short.clip(end - 100.0, end)
+    results.append(check("short ring", bool(clip) and clip[0][1] and clip[0][0] - (end - short.span()) < gop_period,
+                         f"clip of a {short.span():.2f} s ring starts {clip[0][0] - (end - short.span()):.2f} s after its oldest frame"))
+    return results
+
+
+def run_budget(args, rng):
+    """Feed a ring whose `max_bytes` budget is smaller than its `seconds`. Returns the result of the check."""
+    max_bytes = (KEYFRAME_SIZE + (args.gop - 1) * FRAME_SIZE) * 2
+    ring = VideoRing(args.seconds, max_bytes)
+    over_budget = 0
+    for timestamp, keyframe, data in synthetic_frames(int(args.seconds * args.fps), args.fps, args.gop, rng):
+        ring.append(data, keyframe, timestamp)
+        over_budget += ring.nbytes > max_bytes
+    clip = ring.clip(0.0, float("inf"))
+    return [check("max_bytes", not over_budget and ring.nbytes > max_bytes - KEYFRAME_SIZE and ring.span() < args.seconds,
+                  f"ring holds {ring.nbytes} of {max_bytes} bytes, {ring.span():.2f} s, {ring.dropped} frames dropped"),
+            check("keyframe", bool(clip) and clip[0][1], "clips of a ring cut by the budget start on a keyframe")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate of the synthetic encoder.")
+    parser.add_argument("--gop", type=int, default=30, help="Frames per keyframe interval.")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Length of the ring.")
+    parser.add_argument("--triggers", type=int, default=200, help="Clips cut at random triggers.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"Synthetic encoder at {args.fps} fps, keyframe every {args.gop} frames, ring of {args.seconds} s")
+    results = run_clips(args, rng) + run_budget(args, rng)
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
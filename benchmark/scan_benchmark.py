@@ -0,0 +1,97 @@
+"""Benchmark of the code scanning pipeline with synthetic QR code frames instead of the camera.
+
+Renders QR codes with the `qrcode` package into noisy grayscale frames of the low resolution stream size, feeds them
+to a `CodeScanner` at the camera frame rate and reports how many codes were found, the decode latency from frame to
+reported code, and how many frames the scanner skipped while the worker was busy. Runs with the whole frame and with
+a region of interest and downscaling, which is how the scan mode is meant to be tuned on a Raspberry Pi.
+
+Requires `qrcode`, `pyzbar` and the zbar library (`sudo apt install libzbar0`).
+
+Usage:
+    python benchmark/scan_benchmark.py [--codes 50] [--fps 30]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import qrcode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from code_scanner import CodeScanner, create_decoder_pool
+
+FRAME_SIZE = (640, 360)
+# Scanner settings per run: region of interest and downscale factor
+RUNS = (("whole frame", None, 1),
+        ("roi", (0.25, 0.0, 0.5, 1.0), 1),
+        ("roi + downscale 2", (0.25, 0.0, 0.5, 1.0), 2))
+
+
+def render_code(data, module_px=4):
+    """Render `data` as QR code with a quiet zone, dark modules are black on white."""
+    qr = qrcode.QRCode(border=4)
+    qr.add_data(data)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    return np.kron(np.where(matrix, 0, 255).astype(np.uint8), np.ones((module_px, module_px), dtype=np.uint8))
+
+
+def synthetic_frame(code, rng):
+    """Noisy grey frame with the code placed at a random position in the middle half of the frame."""
+    width, height = FRAME_SIZE
+    frame = rng.normal(110, 20, size=(height, width)).clip(0, 255).astype(np.uint8)
+    y = rng.integers(0, height - code.shape[0])
+    x = rng.integers(width // 4, 3 * width // 4 - code.shape[1])
+    frame[y:y + code.shape[0], x:x + code.shape[1]] = code
+    return frame
+
+
+def run(name, pool, roi, downscale, codes, fps, frames_per_code):
+    found = {}
+    done = threading.Event()
+    def on_codes(new):
+        for code in new:
+            found.setdefault(code["data"], code["latency_ms"])
+        if len(found) == len(codes):
+            done.set()
+
+    # ttl 0 reports a code with every frame it is decoded in, only the first report per code is counted
+    scanner = CodeScanner("qrcode", on_codes, pool, roi=roi, downscale=downscale, ttl=0.0)
+    rng = np.random.default_rng(0)
+    t_start = time.perf_counter()
+    for data, code in codes:
+        frame = synthetic_frame(code, rng)
+        for _ in range(frames_per_code):
+            scanner.submit(frame)
+            time.sleep(1 / fps)
+    done.wait(1.0)
+    elapsed = time.perf_counter() - t_start
+    scanner.close()
+
+    latencies = np.array(sorted(found.values())) if found else np.array([np.nan])
+    print(f"{name:<20} {len(found):>4}/{len(codes):<4} found {np.percentile(latencies, 50):>8.1f} ms p50 {np.percentile(latencies, 95):>8.1f} ms p95 "
+          f"{scanner.decoded / elapsed:>7.1f} decodes/s {scanner.skipped:>6} frames skipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=50, help="Number of different QR codes.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate of the simulated low resolution stream.")
+    parser.add_argument("--frames-per-code", type=int, default=6, help="Frames every code stays in view.")
+    args = parser.parse_args()
+
+    codes = [(f"sample-{index:04d}", render_code(f"sample-{index:04d}")) for index in range(args.codes)]
+    pool = create_decoder_pool(1)
+    # Wait for the worker process to start and load zbar
+    pool.submit(time.sleep, 0).result()
+    print(f"{args.codes} QR codes in {FRAME_SIZE[0]}x{FRAME_SIZE[1]} frames at {args.fps} fps, {args.frames_per_code} frames per code")
+    try:
+        for name, roi, downscale in RUNS:
+            run(name, pool, roi, downscale, codes, args.fps, args.frames_per_code)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Loopback benchmark of the still image transfer path.
+
+Compares the previous transfer code (`getvalue()` copies on the server, a `bytearray` grown by 4 KB per `recv`
+on the client) with the copy-free path of `CameraServer` and `CameraDriver` (reusable encode buffer sent from a
+`memoryview`, `recv_into` a presized buffer or streamed straight to disk).
+Every mode runs in its own subprocess, so the reported peak RSS belongs to that mode only.
+
+Usage:
+    python benchmark/transfer_benchmark.py [--size-mb 6] [--repeat 20]
+"""
+import argparse
+import io
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from camera_driver import TRANSFER_CHUNK_SIZE, _recv_exact, _recv_into_file
+
+MODES = ("legacy", "memory", "disk")
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def serve(listener, image, repeat, mode):
+    """Send `image` `repeat` times, once per data connection, like `CameraServer.capture` does."""
+    encode_buffer = io.BytesIO()
+    for _ in range(repeat):
+        connection, _ = listener.accept()
+        if mode == "legacy":
+            picture_data = io.BytesIO()
+            picture_data.write(image)
+            file_size = len(picture_data.getvalue())
+            connection.sendall(picture_data.getvalue())
+        else:
+            encode_buffer.seek(0)
+            encode_buffer.write(image)
+            file_size = encode_buffer.tell()
+            with encode_buffer.getbuffer() as view, view[:file_size] as payload:
+                connection.sendall(payload)
+        connection.close()
+
+
+def receive(port, file_size, mode, target):
+    """Receive one image like `CameraDriver.capture` does."""
+    data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    data_socket.connect(("127.0.0.1", port))
+    if mode == "legacy":
+        picture_data = bytearray()
+        while len(picture_data) < file_size:
+            packet = data_socket.recv(4096)
+            picture_data.extend(packet)
+        with open(target, "wb") as f:
+            f.write(picture_data)
+    elif mode == "memory":
+        picture_data = _recv_exact(data_socket, file_size)
+    else:
+        with open(target, "wb") as f:
+            _recv_into_file(data_socket, f, file_size, receive.buffer)
+    data_socket.close()
+
+
+receive.buffer = bytearray(TRANSFER_CHUNK_SIZE)
+
+
+def run_mode(mode, size_mb, repeat):
+    image = os.urandom(int(size_mb * 1024 * 1024))
+    baseline_mb = peak_rss_mb()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    port = listener.getsockname()[1]
+    server = threading.Thread(target=serve, args=(listener, image, repeat, mode), daemon=True)
+    server.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "picture.jpeg")
+        t_start = time.perf_counter()
+        for _ in range(repeat):
+            receive(port, len(image), mode, target)
+        elapsed = time.perf_counter() - t_start
+    server.join()
+    listener.close()
+    throughput = len(image) * repeat / elapsed / 1024 / 1024
+    print(f"{mode:<8} {throughput:>10.1f} MB/s {peak_rss_mb():>10.1f} MB peak RSS {peak_rss_mb() - baseline_mb:>10.1f} MB above baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=6.0, help="Size of the simulated encoded image in MB.")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of transfers per mode.")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.size_mb, args.repeat)
+        return
+
+    print(f"Transfer of a {args.size_mb} MB image, {args.repeat} times over loopback")
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, "--mode", mode, "--size-mb", str(args.size_mb), "--repeat", str(args.repeat)], check=True)
+
+
+if __name__ == "__main__":
+    main()
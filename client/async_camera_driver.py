@@ -0,0 +1,666 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from camera_driver import CameraDriver, CameraException, PROTOCOL_VERSION, MESSAGE_HEADER, CHUNK_HEADER, CHANNEL_RECONNECTS, _region_args
+from stream_receiver import AsyncStreamReceiver
+
+COMMAND_TIMEOUT = 30.0                  # Default seconds to wait for a reply, and for the next chunk of a transfer
+CONNECT_TIMEOUT = 10.0                  # Seconds to connect and negotiate the protocol
+CLOSED_TRANSFERS = 1024                 # Ids of abandoned transfers remembered, late chunks of them are discarded
+
+
+class CameraTimeout(CameraException):
+    """A command or its transfer did not finish within its timeout."""
+
+
+def _write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class _AsyncTransfer:
+    """Receiving end of one transfer on the data channel of an `AsyncCameraDriver`. The channel reader task queues the chunks,
+    `read` and `read_into` wait for them. `received` counts the bytes of the transfer received from the channel so far."""
+
+    def __init__(self, driver, transfer_id):
+        self.driver = driver
+        self.id = transfer_id
+        self.received = 0
+        self.complete = False
+        self.iterated = False
+        self._chunks = deque()
+        self._current = memoryview(b"")
+        self._ready = asyncio.Event()
+
+    def put(self, chunk):
+        """Queue a chunk, `None` for the end of the transfer or an exception, which is raised once all chunks before it were read."""
+        self._chunks.append(chunk)
+        self._ready.set()
+
+    async def _next(self, timeout) -> bool:
+        """Wait until data is available. Returns `False` at the end of the transfer."""
+        while not self._current:
+            if not self._chunks:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    raise CameraTimeout(f"No data of transfer {self.id} received within {timeout} seconds.")
+                continue
+            chunk = self._chunks[0]
+            # Stays at the end, further reads see it again
+            if chunk is None:
+                return False
+            if isinstance(chunk, Exception):
+                raise chunk
+            self._current = memoryview(self._chunks.popleft())
+        return True
+
+    async def read(self, timeout=None) -> bytes:
+        """Next chunk of the transfer, `b""` at its end."""
+        if not await self._next(timeout):
+            return b""
+        data, self._current = self._current, memoryview(b"")
+        return bytes(data)
+
+    async def read_into(self, view, timeout=None) -> int:
+        """Fill `view`. Returns the number of bytes, which is less only at the end of the transfer."""
+        filled = 0
+        while filled < len(view):
+            if not await self._next(timeout):
+                break
+            n = min(len(view) - filled, len(self._current))
+            view[filled:filled + n] = self._current[:n]
+            self._current = self._current[n:]
+            filled += n
+        return filled
+
+    def close(self):
+        self.driver._close_transfer(self.id)
+
+
+class AsyncCameraDriver():
+    def __init__(self, IP, CMD_PORT=8000, DATA_PORT=8001, STREAM_PORT=8002, timeout=COMMAND_TIMEOUT):
+        """Asyncio counterpart of `CameraDriver` for camera servers with the data channel (protocol version 2). The command connection and the
+        data channel are asyncio streams driven by the event loop, so one loop serves many camera sessions without threads. Connect with
+        `await driver.connect()` or `async with AsyncCameraDriver(IP) as camera:`.
+
+        Every command waits at most `timeout` seconds for its reply and for each chunk of its transfer, and raises `CameraTimeout` beyond.
+        A cancelled command is abandoned: its late reply and the data of its transfer are discarded.
+
+        Args:
+            IP (str): IP address of the camera server.
+            CMD_PORT, DATA_PORT, STREAM_PORT (int): Ports of the camera server, see `CameraDriver`.
+            timeout (float [default:`30.0`]): Default timeout in seconds of all commands, overridden by the `timeout` argument of a method.
+        """
+        self.IP = IP
+        self.CMD_PORT = CMD_PORT
+        self.DATA_PORT = DATA_PORT
+        self.STREAM_PORT = STREAM_PORT
+        self.timeout = timeout
+        self.logger = logging.getLogger("Camera")
+        self.session = None
+        self.protocol = None
+        self._reader = None
+        self._writer = None
+        self._drain_lock = None
+        self._request_ids = itertools.count(1)
+        self._pending = {}
+        self._reply_error = None
+        self._timings = {}
+        self._reply_task = None
+        self._tasks = set()
+        self._closing = False
+
+        # Data channel, see `CameraDriver`
+        self._channel_reader = None
+        self._channel_writer = None
+        self._channel_task = None
+        self._channel_error = None
+        self._channel_generation = 0
+        self._transfers = {}
+        self._closed_transfers = OrderedDict()
+
+        self._video = None
+        self._video_task = None
+        self._stream_receiver = None
+
+    # Client side timings are kept and summarized like by `CameraDriver`
+    _record = CameraDriver._record
+    client_metrics = CameraDriver.client_metrics
+
+
+    async def connect(self, timeout=CONNECT_TIMEOUT):
+        """Connect to the camera server, negotiate the framed protocol and open the data channel.
+
+        Args:
+            timeout (float [default:`10.0`]): Seconds until `CameraTimeout` is raised.
+        """
+        self.logger.debug(f"Connecting to camera server command port '{self.IP}:{self.CMD_PORT}'")
+        try:
+            await asyncio.wait_for(self._connect(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise CameraTimeout(f"Connecting to camera server '{self.IP}:{self.CMD_PORT}' timed out after {timeout} seconds.")
+        except BaseException:
+            await self.close()
+            raise
+        self.logger.info("Connected")
+        return self
+
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.IP, self.CMD_PORT)
+        self._drain_lock = asyncio.Lock()
+        hello = {"action": "hello", "args": {"protocol": PROTOCOL_VERSION}}
+        self._writer.write(json.dumps(hello).encode("utf-8"))
+        raw = await self._reader.read(2048)
+        try:
+            response = json.loads(raw.decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            response = {}
+        self.protocol = int(response["details"].get("protocol", 0)) if response.get("status") == "hello" else 0
+        if self.protocol < 2:
+            raise CameraException(f"AsyncCameraDriver requires a camera server with the data channel (protocol version 2), the server speaks version {self.protocol}.")
+        self.session = response["details"].get("session")
+        self._reply_task = asyncio.get_running_loop().create_task(self._read_replies())
+        await self._open_channel()
+        self._channel_task = asyncio.get_running_loop().create_task(self._run_channel())
+
+
+    async def __aenter__(self):
+        return await self.connect()
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+    async def close(self):
+        """Closes the command connection and the data channel. Pending commands and transfers fail with a `CameraException`."""
+        self._closing = True
+        if self._stream_receiver is not None:
+            self._stream_receiver.stop()
+            self._stream_receiver = None
+        for writer in (self._writer, self._channel_writer):
+            if writer is not None:
+                writer.close()
+        error = CameraException("Connection to camera server closed.")
+        transfers, self._transfers = self._transfers, {}
+        for transfer in transfers.values():
+            transfer.put(error)
+        tasks = [task for task in (self._reply_task, self._channel_task, *self._tasks) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.logger.info("Disconnected")
+
+
+    def _spawn(self, coro):
+        """Run a background task of the driver and keep a reference to it until it is done. Its failure is logged, not lost."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.warning(f"WARNING: Background task of the camera driver failed: {task.exception()}")
+
+
+    async def _read_replies(self):
+        """Reads framed replies from the command connection and resolves the pending request with the matching `id`. Replies of abandoned requests are dropped."""
+        error = CameraException("Connection to camera server closed.")
+        try:
+            while True:
+                header = await self._reader.readexactly(MESSAGE_HEADER.size)
+                (size,) = MESSAGE_HEADER.unpack(header)
+                response = json.loads((await self._reader.readexactly(size)).decode("utf-8"))
+                if "event" in response:
+                    self.logger.debug(f"Ignoring event '{response['event']}'")
+                    continue
+                future = self._pending.pop(response.pop("id", None), None)
+                if future is None:
+                    self.logger.warning(f"WARNING: Received reply without matching request: {response}")
+                elif not future.done():
+                    future.set_result(response)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            error = CameraException(f"Receiving replies from camera server failed. DETAILS: {e}")
+        finally:
+            self._reply_error = error
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+
+    async def _open_channel(self):
+        reader, writer = await asyncio.open_connection(self.IP, self.DATA_PORT)
+        payload = json.dumps({"session": self.session, "channel": True}).encode("utf-8")
+        writer.write(MESSAGE_HEADER.pack(len(payload)) + payload)
+        self._channel_reader, self._channel_writer = reader, writer
+
+
+    async def _run_channel(self):
+        """Reads the data channel and reconnects it when it breaks, resuming the open transfers like `CameraDriver`."""
+        while True:
+            try:
+                await self._read_channel(self._channel_reader)
+                error = ConnectionError("Data channel closed by the camera server.")
+            except (OSError, asyncio.IncompleteReadError) as e:
+                error = ConnectionError(f"Data channel failed. DETAILS: {e}")
+            self._channel_writer.close()
+            if self._closing:
+                return
+            self.logger.warning(f"WARNING: {error} Reconnecting...")
+
+            for attempt in range(CHANNEL_RECONNECTS):
+                await asyncio.sleep(0.1 * 2 ** attempt)
+                try:
+                    await self._open_channel()
+                    break
+                except OSError as e:
+                    error = ConnectionError(f"Reconnecting the data channel failed. DETAILS: {e}")
+            else:
+                self._channel_error = error
+                transfers, self._transfers = self._transfers, {}
+                for transfer in transfers.values():
+                    transfer.put(error)
+                return
+
+            self._channel_generation += 1
+            for transfer in [transfer for transfer in self._transfers.values() if not transfer.complete]:
+                self._spawn(self._resume_transfer(transfer, self._channel_generation))
+
+
+    async def _read_channel(self, reader):
+        """Hand the chunks of the channel to their transfers until it closes."""
+        while True:
+            try:
+                header = await reader.readexactly(CHUNK_HEADER.size)
+            except asyncio.IncompleteReadError:
+                return
+            transfer_id, offset, size = CHUNK_HEADER.unpack(header)
+            transfer = None
+            if transfer_id in self._closed_transfers:
+                if not size:
+                    del self._closed_transfers[transfer_id]
+            else:
+                # Chunks can arrive before the reply of their request was read
+                transfer = self._transfer(transfer_id)
+            if not size:
+                if transfer is not None:
+                    transfer.complete = True
+                    transfer.put(None)
+                continue
+
+            data = await reader.readexactly(size)
+            if transfer is None:
+                continue
+            # A resumed transfer can overlap with the data that was received before
+            skip = min(max(transfer.received - offset, 0), size)
+            if skip == size:
+                continue
+            if offset > transfer.received:
+                transfer.put(ConnectionError(f"Transfer {transfer_id} skipped from {transfer.received} to {offset} bytes."))
+                continue
+            transfer.put(memoryview(data)[skip:] if skip else data)
+            transfer.received = offset + size
+
+
+    async def _resume_transfer(self, transfer, generation):
+        """Ask the server to send the rest of `transfer` on the reconnected channel."""
+        try:
+            response, _ = await self._request({"action": "resume_transfer", "args": {"transfer": transfer.id, "offset": transfer.received}}, self.timeout)
+        except Exception as e:
+            response = {"status": "error", "details": {"error_message": str(e)}}
+        # Errors of an outdated resume are overtaken by the resume on the newer channel
+        if response["status"] == "error" and generation == self._channel_generation:
+            transfer.put(ConnectionError(f"Transfer interrupted after {transfer.received} bytes. DETAILS: {response['details']['error_message']}"))
+
+
+    def _transfer(self, transfer_id) -> _AsyncTransfer:
+        """Transfer `transfer_id` on the data channel, created on first use."""
+        transfer = self._transfers.get(transfer_id)
+        if transfer is None:
+            transfer = self._transfers[transfer_id] = _AsyncTransfer(self, transfer_id)
+            if self._channel_error is not None:
+                transfer.put(self._channel_error)
+        return transfer
+
+
+    def _close_transfer(self, transfer_id):
+        """Discard further chunks of a transfer, which was closed before its end or whose request was abandoned."""
+        transfer = self._transfers.pop(transfer_id, None)
+        if transfer is None or not transfer.complete:
+            self._closed_transfers[transfer_id] = None
+            while len(self._closed_transfers) > CLOSED_TRANSFERS:
+                self._closed_transfers.popitem(last=False)
+
+
+    async def _request(self, cmd: dict, timeout):
+        """Send a command and wait for its reply. Returns the response and the request id, which tags the transfer of the command on the data channel."""
+        if self._writer is None:
+            raise CameraException("Not connected. Call 'connect' first.")
+        if self._reply_error is not None:
+            raise self._reply_error
+        request_id = next(self._request_ids)
+        payload = json.dumps({"id": request_id, **cmd}).encode("utf-8")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        t_start = time.perf_counter()
+        try:
+            self._writer.write(MESSAGE_HEADER.pack(len(payload)) + payload)
+            async with self._drain_lock:
+                await self._writer.drain()
+            response = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._close_transfer(request_id)
+            raise CameraTimeout(f"No reply to '{cmd.get('action')}' within {timeout} seconds.")
+        except BaseException:
+            # Cancelled or disconnected, the reply and the transfer are discarded when they arrive
+            self._close_transfer(request_id)
+            raise
+        round_trip = self._record(cmd.get("action"), "round_trip", t_start)
+        if isinstance(response.get("details"), dict):
+            response["details"]["client_timings_ms"] = {"round_trip": round_trip}
+        return response, request_id
+
+
+    def _warning(self, response) -> bool:
+        """Raise the error of a response as `CameraException` and log its warning. Returns `True` for a warning."""
+        if response["status"] == "error":
+            raise CameraException(response["details"]["error_message"])
+        if response["status"] == "warning":
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return True
+        return False
+
+
+    async def _receive(self, action, request_id, size, timeout) -> bytearray:
+        """Receive the `size` bytes of the transfer of a request into a buffer."""
+        transfer = self._transfer(request_id)
+        buffer = bytearray(size)
+        t_transfer = time.perf_counter()
+        try:
+            received = await transfer.read_into(memoryview(buffer), timeout)
+        finally:
+            transfer.close()
+        self._record(action, "transfer", t_transfer)
+        if received < size:
+            raise CameraException(f"Transfer ended after {received} of {size} bytes.")
+        return buffer
+
+
+    async def send(self, cmd: dict, timeout=None) -> dict:
+        """Send a JSON command and return the JSON response of the server. Commands of concurrent tasks are pipelined on the connection.
+
+        Raises:
+            CameraTimeout: No reply within `timeout` seconds (default: the driver's `timeout`).
+            CameraException: The connection to the camera server is closed.
+        """
+        return (await self._request(cmd, self.timeout if timeout is None else timeout))[0]
+
+
+    async def send_many(self, cmds: list, timeout=None) -> list:
+        """Pipeline several JSON commands and return their JSON responses in the same order. Failed commands are returned as `error` responses."""
+        responses = await asyncio.gather(*(self.send(cmd, timeout) for cmd in cmds), return_exceptions=True)
+        return [response if isinstance(response, dict) else
+                {"status": "error", "details": {"error_message": f"Error during sending or recieving a message: {response}"}}
+                for response in responses]
+
+    # ======= CAMERA METHODS ======= #
+
+    async def capture(self, file_name=None, file_path=".", file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0, persistent=False, transfer_mode="disk", trigger_at=None, focus_profile=None, roi=None, binning=1, grayscale=False, timeout=None):
+        """Captures an image, see `CameraDriver.capture`. In `disk` mode the image is received into memory and written to disk by the default executor, so the event loop never blocks on the file.
+
+        Args:
+            timeout (float [default:`None`]): Seconds to wait for the reply and for every chunk of the image, the driver's `timeout` if `None`.
+            others: See `CameraDriver.capture`.
+
+        Returns:
+            response_dictionary (dict): DETAILS: see `CameraDriver.capture`
+        """
+        if transfer_mode not in ("disk", "memory"):
+            raise CameraException(f"Unsupported transfer mode '{transfer_mode}'. Only 'disk' and 'memory' are available.")
+        timeout = self.timeout if timeout is None else timeout
+        cmd = {"action": "capture",
+               "args": {"file_format": file_format,
+                        "resolution": resolution,
+                        "autofocus": autofocus,
+                        "focus_length": focus_length}}
+        if persistent: cmd["args"]["persistent"] = persistent
+        if trigger_at is not None: cmd["args"]["trigger_at"] = trigger_at
+        if focus_profile is not None: cmd["args"]["focus_profile"] = focus_profile
+        _region_args(cmd["args"], roi, binning, grayscale)
+        response, request_id = await self._request(cmd, timeout)
+        if self._warning(response):
+            return response
+
+        details = response["details"]
+        if file_name is not None: details["file_name"] = f"{file_name}.{file_format}"
+        t_transfer = time.perf_counter()
+        data = await self._receive("capture", request_id, details["file_size"], timeout)
+        if transfer_mode == "memory":
+            details["data"] = data
+            response["status"] = "Picture captured and received"
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, _write_file, os.path.join(file_path, details["file_name"]), data)
+            response["status"] = "Picture captured and saved to disk"
+        details["client_timings_ms"]["transfer"] = round((time.perf_counter() - t_transfer) * 1000, 3)
+        self.logger.info(response["status"])
+        return response
+
+
+    async def capture_array(self, resolution=(1280, 720), pixel_format="RGB888", autofocus=True, focus_length=0.0, persistent=False, focus_profile=None, roi=None, binning=1, grayscale=False, timeout=None):
+        """Captures a single frame without image encoding, see `CameraDriver.capture_array`.
+
+        Returns:
+            array (np.ndarray): Frame with the `shape`, `dtype` and `strides` reported by the server.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        cmd = {"action": "capture_array",
+               "args": {"resolution": resolution,
+                        "pixel_format": pixel_format,
+                        "autofocus": autofocus,
+                        "focus_length": focus_length,
+                        "persistent": persistent}}
+        if focus_profile is not None: cmd["args"]["focus_profile"] = focus_profile
+        _region_args(cmd["args"], roi, binning, grayscale)
+        response, request_id = await self._request(cmd, timeout)
+        if response["status"] == "warning": raise CameraException(response["details"]["warning_message"])
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        details = response["details"]
+        buffer = await self._receive("capture_array", request_id, details["size"], timeout)
+        return np.ndarray(shape=details["shape"], dtype=np.dtype(details["dtype"]), buffer=buffer, strides=details["strides"])
+
+
+    async def start_video(self, file_name=None, file_path=".", resolution=(1280, 720), duration=5, roi=None, binning=1, grayscale=False, timeout=None):
+        """Starts H.264 video on the camera server. With `file_name`, a task of the driver writes the raw `.h264` data to disk, otherwise the data
+        is read with `iter_video`. With a `duration`, the video is stopped after awaiting it; cancelling the call meanwhile stops the video as well.
+
+        Args:
+            file_name (str [default:`None`]): Base name for the output file ('.h264' extension will be appended). `None` for `iter_video`.
+            file_path (str [default:`.`]): Relative or absolute directory where the file will be saved.
+            resolution (tuple [default:`(1280, 720)`]): Width and height of the video stream.
+            duration (float [default:`5`]): Seconds to record. If `None` or `0`, the video continues until `stop_video` is awaited.
+            roi, binning, grayscale: Shrink the video in the camera before encoding, see `CameraDriver.start_video`.
+            timeout (float [default:`None`]): Seconds to wait for the reply, the driver's `timeout` if `None`.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `file_name`, `duration`, and the details of `stop_video` with a `duration`
+        """
+        if duration is not None and (isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration < 0):
+            raise CameraException(f"Unsupported duration argument '{duration}'. Expected POSITIVE NUMBER or NONE.")
+        if self._video is not None:
+            raise CameraException("The driver already receives a video. Call 'stop_video' first.")
+        cmd = {"action": "start_video",
+               "args": _region_args({"resolution": resolution}, roi, binning, grayscale)}
+        response, request_id = await self._request(cmd, self.timeout if timeout is None else timeout)
+        if self._warning(response):
+            return response
+
+        self._video = self._transfer(request_id)
+        if file_name is not None:
+            full_dir = os.path.abspath(file_path)
+            os.makedirs(full_dir, exist_ok=True)
+            self._video_task = self._spawn(self._write_video(self._video, os.path.join(full_dir, f"{file_name}.h264")))
+            response["details"]["file_name"] = f"{file_name}.h264"
+        if not duration:
+            response["details"]["duration"] = "N/A"
+            return response
+
+        try:
+            await asyncio.sleep(duration)
+        except asyncio.CancelledError:
+            # Do not leave the video running on the server
+            self._spawn(self.stop_video(timeout))
+            raise
+        stop_response = await self.stop_video(timeout)
+        stop_response["details"]["file_name"] = response["details"].get("file_name")
+        stop_response["details"]["duration"] = duration
+        return stop_response
+
+
+    async def _write_video(self, transfer, path) -> int:
+        """Write the video data to `path` as it arrives. Returns the file size."""
+        loop = asyncio.get_running_loop()
+        size = 0
+        transfer.iterated = True
+        f = await loop.run_in_executor(None, open, path, "wb")
+        try:
+            while True:
+                chunk = await transfer.read()
+                if not chunk:
+                    break
+                await loop.run_in_executor(None, f.write, chunk)
+                size += len(chunk)
+        finally:
+            await loop.run_in_executor(None, f.close)
+            transfer.close()
+        self.logger.debug(f"Video stream complete; saved to '{path}'")
+        return size
+
+
+    async def iter_video(self, timeout=None):
+        """Yields the raw H.264 data of the video started with `start_video` without `file_name`, as it arrives from the server, until `stop_video`.
+
+        Args:
+            timeout (float [default:`None`]): Raise `CameraTimeout` after `timeout` seconds without data. `None` waits forever.
+
+        Yields:
+            chunk (bytes): Consecutive pieces of the H.264 byte stream.
+        """
+        transfer = self._video
+        if transfer is None or self._video_task is not None or transfer.iterated:
+            raise CameraException("No video to iterate. Call 'start_video' without 'file_name' first.")
+        transfer.iterated = True
+        try:
+            while True:
+                chunk = await transfer.read(timeout)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            transfer.close()
+
+
+    async def stop_video(self, timeout=None):
+        """Stops the video on the camera server and waits until its data was written to disk. A failure of the transfer is raised here as `CameraException`.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `sent` and `dropped` frames, `file_size` (only with `file_name`)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        response, _ = await self._request({"action": "stop_video", "args": {}}, timeout)
+        transfer, task = self._video, self._video_task
+        self._video = self._video_task = None
+        if task is not None:
+            try:
+                response["details"]["file_size"] = await asyncio.wait_for(task, timeout)
+            except asyncio.TimeoutError:
+                raise CameraTimeout(f"Video transfer did not end within {timeout} seconds.")
+            except Exception as e:
+                raise CameraException(f"Video stream failed. DETAILS: {e}")
+        elif transfer is not None and not transfer.iterated:
+            # Nobody reads the video, drop its data
+            transfer.close()
+        if self._warning(response):
+            return response
+        self.logger.debug(response["status"])
+        return response
+
+
+    async def start_stream(self, resolution=(1280, 720), IP_out=None, receive=False, file_name=None, file_path=".", callback=None, roi=None, binning=1, grayscale=False, timeout=None):
+        """Starts the UDP MPEG-TS stream of the camera server, see `CameraDriver.start_stream`. The driver receives the stream on the event loop,
+        `callback` is called on the event loop and must return quickly.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `url`, `resolution`, `file_name` (only with `file_name`)
+        """
+        # Bind the receiver first, so the first keyframe is not lost
+        receiver = None
+        if (receive or file_name is not None or callback is not None) and self._stream_receiver is None:
+            recording = None if file_name is None else os.path.join(os.path.abspath(file_path), f"{file_name}.ts")
+            receiver = AsyncStreamReceiver(self.STREAM_PORT, file_path=recording, callback=callback)
+            await receiver.start()
+
+        cmd = {"action": "start_stream",
+               "args": _region_args({"resolution": resolution,
+                                     "IP_out": IP_out}, roi, binning, grayscale)}
+        try:
+            response, _ = await self._request(cmd, self.timeout if timeout is None else timeout)
+            if self._warning(response):
+                if receiver is not None: receiver.stop()
+                return response
+        except BaseException:
+            if receiver is not None: receiver.stop()
+            raise
+
+        if receiver is not None:
+            self._stream_receiver = receiver
+            if file_name is not None: response["details"]["file_name"] = f"{file_name}.ts"
+        # The server streams to the address of this client by default
+        if IP_out is None: IP_out = self._writer.get_extra_info("sockname")[0]
+        response["details"]["url"] = f"udp://{IP_out}:{self.STREAM_PORT}"
+        self.logger.info(f"UPD video stream started under: {response['details']['url']}")
+        return response
+
+
+    def stream_stats(self):
+        """Reports the quality of the UDP stream received since `start_stream`, see `CameraDriver.stream_stats`."""
+        if self._stream_receiver is None:
+            raise CameraException("No stream is received. Call 'start_stream' with 'receive=True' first.")
+        return self._stream_receiver.stats()
+
+
+    async def stop_stream(self, timeout=None):
+        """Stops the UDP stream on the camera server.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `receiver` with the final `stream_stats`, if the stream was received by the driver
+        """
+        try:
+            response, _ = await self._request({"action": "stop_stream", "args": {}}, self.timeout if timeout is None else timeout)
+        finally:
+            # Also stops a receiver, whose stream had already ended on the server
+            receiver, self._stream_receiver = self._stream_receiver, None
+            stats = receiver.stop() if receiver is not None else None
+        if self._warning(response):
+            return response
+        if stats is not None:
+            response["details"]["receiver"] = stats
+        self.logger.debug(response["status"])
+        return response
@@ -1,23 +1,365 @@
 import socket
+import struct
 import threading
+import itertools
 import json
 import time
 import numpy as np
 import logging
 import os
+import queue
+import random
+import tarfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from frame_decoder import FrameDecoder, H264Decoder, FRAME_QUEUE_SIZE
+from stream_receiver import StreamReceiver, PACKET_QUEUE_SIZE
+
+PROTOCOL_VERSION = 2                    # Highest framed command protocol version spoken by this driver, 2 adds the data channel
+MESSAGE_HEADER = struct.Struct("!I")    # Length prefix of framed command messages
+CHUNK_HEADER = struct.Struct("!IQI")    # Transfer id, offset and length of every chunk on the data channel, length 0 ends the transfer
+CHANNEL_RECONNECTS = 5                  # Attempts to reconnect a broken data channel, with doubling delays from 0.1 seconds
+CONNECT_TIMEOUT = 10.0                  # Seconds to connect a command connection or the data channel and to negotiate the protocol
+COMMAND_TIMEOUT = 30.0                  # Default seconds to wait for a reply, on top of the time a command waits on purpose (e.g. `trigger_at`)
+KEEPALIVE_IDLE = 5                      # Seconds without traffic until TCP keepalive probes a connection, then every KEEPALIVE_INTERVAL seconds
+KEEPALIVE_INTERVAL = 2
+KEEPALIVE_PROBES = 3                    # Unanswered probes until a connection counts as dead
+RECONNECT_DELAY = 0.1                   # First delay between attempts to reconnect a lost command connection, doubled per attempt
+RECONNECT_MAX_DELAY = 5.0
+RECONNECT_TIMEOUT = 60.0                # Seconds a lost command connection is reconnected in the background before waiting commands fail
+POOL_SIZE = 2                           # Command connections per camera server: the session connection and the pool for POOLED_ACTIONS
+POOLED_ACTIONS = ("get_metrics", "video_status", "timelapse_status", "list_spool")
+# Commands sent again after a reconnect if their reply was lost, running them twice has no other effect than running them once.
+# `fetch_spool` never changes the spool, `CameraDriver.fetch_spool` deletes the fetched frames with a separate `delete_spool` call
+IDEMPOTENT_ACTIONS = ("template_action", "capture", "capture_array", "preview", "release_camera", "clear_focus", "read_qrcode", "read_barcode",
+                      "get_metrics", "video_status", "timelapse_status", "list_spool", "fetch_spool", "delete_spool")
+FRAME_HEADER = struct.Struct("!IQd")    # Frame index, payload size and capture timestamp in front of every burst frame
+TRANSFER_CHUNK_SIZE = 1024 * 1024       # Receive buffer size for transfers streamed directly to disk
+CODE_QUEUE_SIZE = 256                   # Scanned codes kept for 'iter_codes', the oldest are dropped first
+MOTION_QUEUE_SIZE = 256                 # Motion events kept for 'iter_motion', the oldest are dropped first
+TIMING_SAMPLES = 1024                   # Client side timings kept per action and phase for 'client_metrics'
+TAR_BLOCK = 512                         # Block size of the tar archives of 'fetch_spool'
 
 
 class CameraException(Exception):
     def __init__(self, message):
         super().__init__(message)
-    
+
+
+def _region_args(args, roi, binning, grayscale):
+    """Add the `roi`, `binning` and `grayscale` arguments to the command `args`, only when used, so older camera servers keep accepting the command."""
+    if roi is not None: args["roi"] = roi
+    if binning != 1: args["binning"] = binning
+    if grayscale: args["grayscale"] = grayscale
+    return args
+
+
+def _set_keepalive(sock):
+    """Enable TCP keepalive on `sock`, so a camera server that vanished without closing the connection (power loss, network outage) is noticed
+    about `KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_PROBES` seconds after the last traffic, also while sent data is unacknowledged (Linux)."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+                          ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                          ("TCP_KEEPCNT", KEEPALIVE_PROBES),
+                          ("TCP_USER_TIMEOUT", (KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_PROBES) * 1000)):
+        # Not every platform offers every option
+        if hasattr(socket, option):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+            except OSError:
+                pass
+
+
+def _idempotent(cmd) -> bool:
+    """Whether `cmd` may be sent again after its reply was lost with the connection."""
+    args = cmd.get("args") or {}
+    if cmd.get("action") == "capture" and args.get("trigger_at") is not None:
+        # The moment has passed
+        return False
+    return cmd.get("action") in IDEMPOTENT_ACTIONS
+
+
+def _command_wait(cmd) -> float:
+    """Seconds `cmd` waits on purpose before the server replies, which its timeout is extended by."""
+    args = cmd.get("args") or {}
+    action = cmd.get("action")
+    if action == "capture" and args.get("trigger_at") is not None:
+        return max(0.0, float(args["trigger_at"]) - time.time())
+    if action in ("read_qrcode", "read_barcode"):
+        return float(args.get("timeout") or 0.0)
+    if action == "save_clip":
+        return float(args.get("post_seconds") or 0.0)
+    return 0.0
+
+
+def _recv_exact(sock, size):
+    """Receive exactly `size` bytes from a socket. Returns `None` if the connection was closed before."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            return None
+        received += n
+    return buffer
+
+
+def _recv_exact_into(sock, view):
+    """Receive into all of `view`. Returns the number of bytes received, which is less only if the connection was closed before."""
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            break
+        received += n
+    return received
+
+
+def _recv_into_file(sock, file, size, buffer):
+    """Receive exactly `size` bytes from a socket and write them to an open file through a reusable receive buffer. Returns the number of bytes received."""
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[:min(len(view), size - received)])
+        if n == 0:
+            break
+        file.write(view[:n])
+        received += n
+    return received
+
+
+class _ChannelTransfer:
+    """Receiving end of one transfer on the data channel. Offers `recv_into`, `recv` and `close` like the socket of a data connection,
+    so both are read the same way. A waiting `recv_into` lets the channel reader thread receive the next chunk straight into its buffer,
+    chunks nobody waits for are queued. `received` counts the bytes of the transfer received from the channel so far."""
+
+    def __init__(self, driver, transfer_id):
+        self.driver = driver
+        self.id = transfer_id
+        self.received = 0
+        self.complete = False
+        self._chunks = deque()
+        self._current = memoryview(b"")
+        self._target = None
+        self._filled = 0
+        self._ready = threading.Condition()
+
+    def put(self, chunk):
+        """Queue a chunk, `None` for the end of the transfer or an exception, which is raised once all chunks before it were read."""
+        with self._ready:
+            self._chunks.append(chunk)
+            self._ready.notify()
+
+    def deliver(self, channel, size) -> bool:
+        """Receive the next `size` bytes of the transfer from `channel`. Runs on the channel reader thread. Returns `False` if the channel closed."""
+        with self._ready:
+            target = self._target
+            if target is not None and not self._chunks:
+                n = min(len(target), size)
+                if _recv_exact_into(channel, target[:n]) < n:
+                    return False
+                self._target = None
+                self._filled = n
+                self._ready.notify()
+                size -= n
+        if size:
+            data = _recv_exact(channel, size)
+            if data is None:
+                return False
+            self.put(data)
+        return True
+
+    def recv_into(self, buffer, nbytes=0):
+        view = memoryview(buffer).cast("B")
+        if nbytes:
+            view = view[:nbytes]
+        with self._ready:
+            while not self._current:
+                if not self._chunks:
+                    self._target = view
+                    self._ready.wait_for(lambda: self._filled or self._chunks)
+                    self._target = None
+                    if self._filled:
+                        n, self._filled = self._filled, 0
+                        return n
+                    continue
+                chunk = self._chunks[0]
+                if chunk is None or isinstance(chunk, Exception):
+                    # Stays at the end, further reads see it again
+                    if chunk is None:
+                        return 0
+                    raise chunk
+                self._current = memoryview(self._chunks.popleft())
+            n = min(len(view), len(self._current))
+            view[:n] = self._current[:n]
+            self._current = self._current[n:]
+            return n
+
+    def recv(self, size):
+        buffer = bytearray(size)
+        n = self.recv_into(buffer)
+        del buffer[n:]
+        return bytes(buffer)
+
+    def close(self):
+        self.driver._close_transfer(self.id)
+
+
+class _CommandConnection:
+    """One command connection to the camera server with the protocol version and session negotiated on it.
+    Sent requests wait in `pending` for their reply; with the framed protocol a daemon thread reads the replies, resolves the request with the
+    matching `id` and hands events to the driver. The first failure of the connection hands the requests still waiting to `_connection_lost`
+    of the driver, which sends them again or fails them."""
+
+    def __init__(self, driver, name):
+        self.driver = driver
+        self.name = name
+        self.sock = None
+        self.protocol = 0
+        self.session = None
+        self.pending = {}
+        self.lost = False
+        self._send_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def connect(self, timeout):
+        """Connect and negotiate the protocol, each step within `timeout` seconds."""
+        address = (self.driver.IP, self.driver.CMD_PORT)
+        self.sock = socket.create_connection(address, timeout)
+        try:
+            _set_keepalive(self.sock)
+            if not self._negotiate():
+                self.driver.logger.debug("Camera server does not support the framed protocol, reconnecting with bare JSON messages")
+                self.sock.close()
+                self.sock = socket.create_connection(address, timeout)
+                _set_keepalive(self.sock)
+            self.sock.settimeout(None)
+        except Exception:
+            self.sock.close()
+            raise
+        if self.protocol >= 1:
+            threading.Thread(target=self._reply_reader_thread, name=f"camera {self.name}", daemon=True).start()
+        return self
+
+    def _negotiate(self) -> bool:
+        """Offer the framed protocol with a bare JSON `hello` command. Servers without protocol support reply with an error and close the connection, then `False` is returned."""
+        hello = {"action": "hello", "args": {"protocol": PROTOCOL_VERSION}}
+        self.sock.sendall(json.dumps(hello).encode("utf-8"))
+        raw = self.sock.recv(2048)
+        if not raw:
+            # E.g. a camera server that is shutting down, not one without protocol support
+            raise ConnectionError("Camera server closed the connection during the protocol negotiation.")
+        try:
+            response = json.loads(raw.decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            response = {}
+        if response.get("status") != "hello":
+            return False
+        self.session = response["details"].get("session")
+        self.protocol = int(response["details"].get("protocol", 0))
+        return True
+
+    def send(self, cmd, future, timeout=None):
+        """Send `cmd` as request of `future`. Raises `ConnectionError` if the command could not be sent, the connection is lost then.
+        Bare JSON messages only allow one command in flight, their reply is read right away within `timeout` seconds."""
+        with self._state_lock:
+            if self.lost:
+                raise ConnectionError("Command connection to the camera server is lost.")
+            request_id = next(self.driver._request_ids)
+            future.request_id = request_id
+            future.connection = self
+            self.pending[request_id] = future
+        with self._send_lock:
+            try:
+                if self.protocol >= 1:
+                    payload = json.dumps({"id": request_id, **cmd}).encode("utf-8")
+                    self.sock.sendall(MESSAGE_HEADER.pack(len(payload)) + payload)
+                    return
+                self.sock.settimeout(timeout)
+                self.sock.sendall(json.dumps(cmd).encode("utf-8"))
+            except OSError as e:
+                with self._state_lock:
+                    self.pending.pop(request_id, None)
+                self.lose(e)
+                raise ConnectionError(f"Sending '{cmd.get('action')}' failed. DETAILS: {e}")
+            try:
+                raw = self.sock.recv(2048)
+                error = None if raw else ConnectionError("Connection closed by the camera server.")
+            except socket.timeout:
+                # A late reply would be read as the reply of the next command
+                with self._state_lock:
+                    self.pending.pop(request_id, None)
+                future.set_exception(TimeoutError(f"No reply to '{cmd.get('action')}' within {timeout} seconds."))
+                error = ConnectionError("Command connection out of step after a timeout.")
+            except OSError as e:
+                error = e
+        if error is not None:
+            self.lose(error)
+            return
+        with self._state_lock:
+            self.pending.pop(request_id, None)
+        future.set_result(json.loads(raw.decode("utf-8")))
+
+    def abandon(self, request_id):
+        """Forget a request whose caller stopped waiting, its late reply is dropped."""
+        with self._state_lock:
+            self.pending.pop(request_id, None)
+
+    def lose(self, error):
+        """Close the lost connection. The first call hands the requests still waiting for their reply to the driver."""
+        with self._state_lock:
+            if self.lost:
+                return
+            self.lost = True
+            pending, self.pending = self.pending, {}
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.driver._connection_lost(self, pending, error)
+
+    def _reply_reader_thread(self):
+        """Runs in a daemon thread. Reads framed replies and resolves the pending request with the matching `id`. Events pushed by the server are handed to `_handle_event` of the driver."""
+        error = ConnectionError("Connection closed by the camera server.")
+        try:
+            while True:
+                header = _recv_exact(self.sock, MESSAGE_HEADER.size)
+                if header is None:
+                    break
+                (size,) = MESSAGE_HEADER.unpack(header)
+                raw = _recv_exact(self.sock, size)
+                if raw is None:
+                    break
+                response = json.loads(raw.decode("utf-8"))
+                if "event" in response:
+                    self.driver._handle_event(response)
+                    continue
+                with self._state_lock:
+                    future = self.pending.pop(response.pop("id", None), None)
+                if future is None:
+                    self.driver.logger.warning(f"WARNING: Received reply without matching request: {response}")
+                    continue
+                future.set_result(response)
+        except Exception as e:
+            error = ConnectionError(f"Receiving replies from camera server failed. DETAILS: {e}")
+        self.lose(error)
+
+
 class CameraDriver():
-    def __init__(self, IP, CMD_PORT=8000, DATA_PORT=8001, STREAM_PORT=8002):
+    def __init__(self, IP, CMD_PORT=8000, DATA_PORT=8001, STREAM_PORT=8002, timeout=COMMAND_TIMEOUT, connect_timeout=CONNECT_TIMEOUT, reconnect_timeout=RECONNECT_TIMEOUT, pool_size=POOL_SIZE):
          # Socket configuration
         self.IP = IP
         self.CMD_PORT  = CMD_PORT
         self.DATA_PORT = DATA_PORT
         self.STREAM_PORT  = STREAM_PORT
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.reconnect_timeout = reconnect_timeout
+        self.pool_size = pool_size
         
         # Configure logging
         camera_identifier = "Camera"
@@ -26,27 +368,527 @@ class CameraDriver():
         elif not verbose: logging.basicConfig(level=logging.INFO, format=f"[{camera_identifier}]   %(message)s")
         self.logger = logging.getLogger(f"{camera_identifier}")
         
-        # Initialize TCP socket connection to command port
+        self._request_ids = itertools.count(1)
+        self._transfer_buffer = None
+        self._codes = queue.Queue(maxsize=CODE_QUEUE_SIZE)
+        self._code_callback = None
+        self._motion = queue.Queue(maxsize=MOTION_QUEUE_SIZE)
+        self._motion_callback = None
+        self._stream_receiver = None
+        self._frame_decoder = None
+        self._timings = {}
+
+        # Command connections: the first carries the session with its data channel and events, the pool serves `POOLED_ACTIONS` next to it
+        self.session = None
+        self.protocol = None
+        self._connection = None
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._reconnecting = False
+        self._connection_error = None
+        self._resend = []
+        self._connection_stats = {"reconnects": 0, "resent": 0, "failed": 0, "last_outage_ms": None}
+
+        # Data channel, which carries all transfers of this session since protocol version 2
+        self._channel = None
+        self._channel_error = None
+        self._channel_generation = 0
+        self._closing = False
+        self._transfers = {}
+        self._closed_transfers = set()
+        self._transfers_lock = threading.Lock()
+
+        # Initialize TCP socket connection to command port and negotiate the framed command protocol (falls back to bare JSON messages for older servers)
         self.logger.debug(f"Connecting to camera server command port '{self.IP}:{self.CMD_PORT}'")
-        self.cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.cmd_socket.connect((self.IP, self.CMD_PORT))
+        self._connect()
         self.logger.info("Connected")
-        
+        self.logger.debug(f"Using command protocol version {self.protocol}")
+
 
-    def send(self, cmd: dict) -> dict:
-        """Send a JSON command over TCP, wait for reply, and return the JSON response."""
+    @property
+    def cmd_socket(self):
+        """Socket of the command connection, which carries the session."""
+        return self._connection.sock
+
+
+    def _connect(self):
+        """Connect the command connection and, since protocol version 2, the data channel of its session, and make them the connections of the driver."""
+        connection = _CommandConnection(self, "command").connect(self.connect_timeout)
+        channel = None
         try:
-            self.cmd_socket.sendall(json.dumps(cmd).encode("utf-8"))
-            # self.cmd_socket.settimeout(100.0)
-            raw = self.cmd_socket.recv(2048)
-            response = json.loads(raw.decode("utf-8"))
+            if connection.protocol >= 2:
+                channel = self._open_channel(connection.session)
+            if self._closing:
+                raise CameraException("Connection to camera server closed.")
+        except BaseException as e:
+            if channel is not None:
+                channel.close()
+            connection.lose(e)
+            raise
+        with self._transfers_lock:
+            self._channel = channel
+            self._channel_error = None
+            self.session = connection.session
+            self.protocol = connection.protocol
+            self._connection = connection
+        self._connected.set()
+        if channel is not None:
+            self._channel_thread = threading.Thread(target=self._channel_reader_thread, args=(channel, connection.session), daemon=True)
+            self._channel_thread.start()
+
+
+    def _connection_lost(self, connection, pending, error):
+        """Called once by a lost command connection with the requests that were waiting for their reply. Idempotent requests are sent again
+        once a connection is back, the others fail, since the server may have run them. The session connection is reconnected in the background
+        with a new session, which fails the transfers of the old one; a lost pool connection is dropped."""
+        retry = []
+        for _, future in sorted(pending.items()):
+            if self._closing or future.abandoned or not _idempotent(future.cmd):
+                if not self._closing and not future.abandoned:
+                    self._connection_stats["failed"] += 1
+                    message = f"Connection to camera server lost while waiting for the reply to '{future.cmd.get('action')}', which was not sent again as it may have run. DETAILS: {error}"
+                else:
+                    message = "Connection to camera server closed."
+                future.set_exception(CameraException(message))
+            else:
+                retry.append(future)
+        if self._closing:
+            return
+
+        if connection is not self._connection:
+            with self._pool_lock:
+                if connection in self._pool:
+                    self._pool.remove(connection)
+            for future in retry:
+                self._resend_request(future)
+            return
+
+        with self._state_lock:
+            self._connected.clear()
+            self._connection_error = error
+            self._resend.extend(retry)
+            start = not self._reconnecting
+            self._reconnecting = True
+        self._fail_transfers(ConnectionError(f"Connection to camera server lost. DETAILS: {error}"))
+        if start:
+            threading.Thread(target=self._reconnect_thread, args=(error,), name="camera reconnect", daemon=True).start()
+
+
+    def _reconnect_thread(self, error):
+        """Runs in a daemon thread. Reconnects the lost session connection with exponential backoff until `reconnect_timeout`, then sends the idempotent requests, whose reply was lost, again."""
+        self.logger.warning(f"WARNING: Connection to camera server lost: {error} Reconnecting...")
+        t_lost = time.perf_counter()
+        deadline = None if self.reconnect_timeout is None else time.monotonic() + self.reconnect_timeout
+        delay = RECONNECT_DELAY
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                self._connect()
+                break
+            except Exception as e:
+                error = e
+            if self._closing or (deadline is not None and time.monotonic() + delay > deadline):
+                with self._state_lock:
+                    self._reconnecting = False
+                    self._connection_error = error
+                    resend, self._resend = self._resend, []
+                self.logger.warning(f"WARNING: Reconnecting to camera server failed after {attempts} attempts: {error}")
+                for future in resend:
+                    future.set_exception(CameraException(f"Reconnecting to camera server failed. DETAILS: {error}"))
+                return
+            # The jitter keeps the clients of a rebooted server from reconnecting in lockstep
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+        outage_ms = round((time.perf_counter() - t_lost) * 1000, 3)
+        with self._state_lock:
+            self._reconnecting = False
+            self._connection_stats["reconnects"] += 1
+            self._connection_stats["last_outage_ms"] = outage_ms
+            resend, self._resend = self._resend, []
+        self.logger.info(f"Reconnected to camera server after {outage_ms} ms ({attempts} attempts). Videos, streams and scans of the lost session were stopped by the server.")
+        for future in resend:
+            self._resend_request(future)
+
+
+    def _resend_request(self, future):
+        """Send the request of `future` again, after its reply was lost with a connection."""
+        if future.abandoned:
+            return
+        self._connection_stats["resent"] += 1
+        self.logger.debug(f"Sending '{future.cmd.get('action')}' again")
+        try:
+            self._submit(future)
+        except Exception as e:
+            future.set_exception(e)
+
+
+    def _fail_transfers(self, error):
+        """Fail the transfers of a lost session and close its data channel, whose reader thread ends then."""
+        with self._transfers_lock:
+            self._channel_error = error
+            transfers, self._transfers = self._transfers, {}
+            self._closed_transfers.clear()
+            channel = self._channel
+        for transfer in transfers.values():
+            transfer.put(error)
+        if channel is not None:
+            try:
+                channel.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+    def _command_connection(self, cmd):
+        """Connection to send `cmd` over: a pool connection for `POOLED_ACTIONS`, otherwise the session connection. Waits up to `timeout` for a
+        running reconnect, or starts a new one if reconnecting gave up before."""
+        if cmd.get("action") in POOLED_ACTIONS and self.pool_size > 1 and self._connected.is_set():
+            connection = self._pool_connection()
+            if connection is not None:
+                return connection
+        if not self._connected.is_set():
+            with self._state_lock:
+                start = not self._reconnecting and not self._closing
+                if start:
+                    self._reconnecting = True
+            if start:
+                threading.Thread(target=self._reconnect_thread, args=(self._connection_error,), name="camera reconnect", daemon=True).start()
+            deadline = None if self.timeout is None else time.monotonic() + self.timeout
+            while not self._connected.wait(0.05):
+                if not self._reconnecting or (deadline is not None and time.monotonic() > deadline):
+                    raise CameraException(f"Not connected to camera server '{self.IP}:{self.CMD_PORT}'. DETAILS: {self._connection_error}")
+        if self._closing:
+            raise CameraException("Connection to camera server closed.")
+        return self._connection
+
+
+    def _pool_connection(self):
+        """Least busy pool connection, a new one while the pool has room and the others are busy. `None` if no pool connection can be opened."""
+        with self._pool_lock:
+            pool = [connection for connection in self._pool if not connection.lost]
+            idle = min(pool, key=lambda connection: len(connection.pending), default=None)
+            if idle is not None and (not idle.pending or len(pool) >= self.pool_size - 1):
+                return idle
+            try:
+                connection = _CommandConnection(self, f"pool {len(pool) + 1}").connect(self.connect_timeout)
+            except Exception as e:
+                self.logger.debug(f"Opening a pool connection failed: {e}")
+                return idle
+            if self._closing:
+                connection.lose(CameraException("Connection to camera server closed."))
+                return None
+            self._pool.append(connection)
+            return connection
+
+
+    def _submit(self, future):
+        """Send the command of `future` over a connection. A command that could not be sent is sent again once the connection is back."""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            connection = self._command_connection(future.cmd)
+            try:
+                connection.send(future.cmd, future, self._reply_timeout(future.cmd))
+                return
+            except ConnectionError as e:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise CameraException(e)
+                # The lost connection is being replaced
+                time.sleep(0.01)
+
+
+    def _reply_timeout(self, cmd, timeout=None):
+        """Seconds to wait for the reply to `cmd`: `timeout` or the driver's `timeout`, plus the time the command waits on purpose. `None` waits forever."""
+        timeout = self.timeout if timeout is None else timeout
+        return None if timeout is None else timeout + _command_wait(cmd)
+
+
+    def _open_channel(self, session):
+        """Connect the data channel of `session`. The server sends the data of every transfer through it, tagged with the id of the request it answers."""
+        channel = socket.create_connection((self.IP, self.DATA_PORT), self.connect_timeout)
+        try:
+            channel.settimeout(None)
+            _set_keepalive(channel)
+            payload = json.dumps({"session": session, "channel": True}).encode("utf-8")
+            channel.sendall(MESSAGE_HEADER.pack(len(payload)) + payload)
+        except OSError:
+            channel.close()
+            raise
+        return channel
+
+
+    def _stale_channel(self, session) -> bool:
+        """Whether the data channel of `session` is no longer wanted: the driver closes, or the session connection is lost or was replaced."""
+        return self._closing or session != self.session or not self._connected.is_set()
+
+
+    def _channel_reader_thread(self, channel, session):
+        """Runs in a daemon thread. Reads the chunks of the data channel of `session` and queues them at their transfer. A broken channel is reconnected and
+        its open transfers are resumed from the bytes received so far. Transfers the server can not resume fail with a `ConnectionError`.
+        A channel that can not be reconnected gives up its session: the session connection is reconnected, which opens a new channel."""
+        while True:
+            try:
+                self._read_channel(channel)
+                error = ConnectionError("Data channel closed by the camera server.")
+            except Exception as e:
+                error = ConnectionError(f"Data channel failed. DETAILS: {e}")
+            channel.close()
+            if self._stale_channel(session):
+                return
+            self.logger.warning(f"WARNING: {error} Reconnecting...")
+
+            for attempt in range(CHANNEL_RECONNECTS):
+                time.sleep(0.1 * 2 ** attempt)
+                if self._stale_channel(session):
+                    return
+                try:
+                    channel = self._open_channel(session)
+                    break
+                except OSError as e:
+                    error = ConnectionError(f"Reconnecting the data channel failed. DETAILS: {e}")
+            else:
+                connection = self._connection
+                if connection.session == session:
+                    connection.lose(error)
+                return
+
+            with self._transfers_lock:
+                if session != self.session:
+                    channel.close()
+                    return
+                self._channel = channel
+                self._channel_generation += 1
+                generation = self._channel_generation
+                transfers = [transfer for transfer in self._transfers.values() if not transfer.complete]
+            for transfer in transfers:
+                self._resume_transfer(transfer, generation)
+
+
+    def _read_channel(self, channel):
+        """Hand the chunks of `channel` to their transfers until it closes."""
+        while True:
+            header = _recv_exact(channel, CHUNK_HEADER.size)
+            if header is None:
+                return
+            transfer_id, offset, size = CHUNK_HEADER.unpack(header)
+            with self._transfers_lock:
+                transfer = None
+                if transfer_id in self._closed_transfers:
+                    if not size:
+                        self._closed_transfers.discard(transfer_id)
+                else:
+                    transfer = self._transfers.get(transfer_id)
+                    if transfer is None:
+                        # Chunks can arrive before the reply of their request was read
+                        transfer = self._transfers[transfer_id] = _ChannelTransfer(self, transfer_id)
+            if not size:
+                if transfer is not None:
+                    transfer.complete = True
+                    transfer.put(None)
+                continue
+
+            # A resumed transfer can overlap with the data that was received before
+            skip = size if transfer is None else min(max(transfer.received - offset, 0), size)
+            if skip and _recv_exact(channel, skip) is None:
+                return
+            if skip == size:
+                continue
+            if offset > transfer.received:
+                transfer.put(ConnectionError(f"Transfer {transfer_id} skipped from {transfer.received} to {offset} bytes."))
+                if _recv_exact(channel, size) is None:
+                    return
+                continue
+            if not transfer.deliver(channel, size - skip):
+                return
+            transfer.received = offset + size
+
+
+    def _resume_transfer(self, transfer, generation):
+        """Ask the server to send the rest of `transfer` on the reconnected channel."""
+        def resumed(future):
+            try:
+                response = future.result()
+            except Exception as e:
+                response = {"status": "error", "details": {"error_message": str(e)}}
+            # Errors of an outdated resume are overtaken by the resume on the newer channel
+            if response["status"] == "error" and generation == self._channel_generation:
+                transfer.put(ConnectionError(f"Transfer interrupted after {transfer.received} bytes. DETAILS: {response['details']['error_message']}"))
+
+        cmd = {"action": "resume_transfer", "args": {"transfer": transfer.id, "offset": transfer.received}}
+        try:
+            self.send_async(cmd).add_done_callback(resumed)
+        except Exception as e:
+            transfer.put(ConnectionError(f"Transfer interrupted after {transfer.received} bytes. DETAILS: {e}"))
+
+
+    def _data_socket(self, request_id):
+        """Socket to receive the data the server sends for request `request_id`: its transfer on the data channel, or a new socket for a data connection to servers without channel."""
+        if self._channel is None or request_id is None:
+            return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        with self._transfers_lock:
+            transfer = self._transfers.get(request_id)
+            if transfer is None:
+                transfer = self._transfers[request_id] = _ChannelTransfer(self, request_id)
+                if self._channel_error is not None:
+                    transfer.put(self._channel_error)
+        return transfer
+
+
+    def _close_transfer(self, transfer_id):
+        """Discard further chunks of a transfer that was closed before its end."""
+        with self._transfers_lock:
+            transfer = self._transfers.pop(transfer_id, None)
+            if transfer is not None and not transfer.complete:
+                self._closed_transfers.add(transfer_id)
+
+
+    def _connect_data(self, data_socket):
+        """Connect a socket to the data port and name the session it belongs to, so the server hands the connection to this driver's transfer.
+        Transfers on the data channel are already connected."""
+        if isinstance(data_socket, _ChannelTransfer):
+            return
+        data_socket.settimeout(self.connect_timeout)
+        data_socket.connect((self.IP, self.DATA_PORT))
+        data_socket.settimeout(None)
+        _set_keepalive(data_socket)
+        if self.session is not None:
+            payload = json.dumps({"session": self.session}).encode("utf-8")
+            data_socket.sendall(MESSAGE_HEADER.pack(len(payload)) + payload)
+
+
+    def _handle_event(self, event: dict):
+        """Process an event pushed by the server. Runs on the reply reader thread of the session connection."""
+        if event["event"] == "codes":
+            for code in event["details"]["codes"]:
+                self.logger.debug(f"Scanned {code['type']}: {code['data']}")
+                self._queue_event(self._codes, code, self._code_callback, "Code")
+        elif event["event"] == "motion":
+            motion = event["details"]
+            self.logger.debug(f"Motion event {motion['event']} {motion['state']}")
+            self._queue_event(self._motion, motion, self._motion_callback, "Motion")
+        else:
+            self.logger.debug(f"Ignoring unknown event '{event['event']}'")
+
+
+    def _queue_event(self, events, item, callback, name):
+        """Queue an item of an event for its iterator, dropping the oldest if the queue is full, and hand it to the `callback`."""
+        while True:
+            try:
+                events.put_nowait(item)
+                break
+            except queue.Full:
+                events.get_nowait()
+        if callback is not None:
+            try:
+                callback(item)
+            except Exception as e:
+                self.logger.warning(f"WARNING: {name} callback failed: {e}")
+
+
+    def _record(self, action, phase, t_start):
+        """Keep the milliseconds since the `time.perf_counter` value `t_start` as client side timing of `action` and return them."""
+        elapsed_ms = round((time.perf_counter() - t_start) * 1000, 3)
+        self._timings.setdefault((action, phase), deque(maxlen=TIMING_SAMPLES)).append(elapsed_ms)
+        return elapsed_ms
+
+
+    def send_async(self, cmd: dict) -> Future:
+        """Send a JSON command over TCP without waiting for the reply. Several commands can be in flight at the same time, replies are matched by their request `id`.
+        `POOLED_ACTIONS` go over a pool connection, so they do not queue behind the commands of the session. While the connection is lost the
+        command waits up to `timeout` for the reconnect; idempotent commands whose reply was lost are sent again after it.
+
+        Returns:
+            future (concurrent.futures.Future): Resolves to the JSON response of the server.
+        """
+        future = Future()
+        future.request_id = None
+        future.cmd = cmd
+        future.abandoned = False
+        future.connection = None
+        t_start = time.perf_counter()
+        future.add_done_callback(lambda _: self._record(cmd.get("action"), "round_trip", t_start))
+        self._submit(future)
+        return future
+
+
+    def _abandon(self, future):
+        """Stop waiting for the reply of `future`. It is not sent again after a reconnect, and data sent for it is discarded."""
+        future.abandoned = True
+        if future.connection is not None and future.request_id is not None:
+            future.connection.abandon(future.request_id)
+            if future.connection is self._connection:
+                self._close_transfer(future.request_id)
+
+
+    def send(self, cmd: dict, timeout=None) -> dict:
+        """Send a JSON command over TCP, wait for reply, and return the JSON response. The client side round trip time is added to its details as `client_timings_ms`.
+        `timeout` overrides the `timeout` of the driver for this command."""
+        return self._send(cmd, timeout)[0]
+
+
+    def _send(self, cmd: dict, timeout=None):
+        """Same as `send`, but also returns the request id of the command, which tags its transfer on the data channel (`None` for bare JSON messages)."""
+        t_start = time.perf_counter()
+        request_id = None
+        try:
+            future = self.send_async(cmd)
+            try:
+                response = future.result(self._reply_timeout(cmd, timeout))
+            except FutureTimeoutError:
+                self._abandon(future)
+                raise TimeoutError(f"No reply to '{cmd.get('action')}' within {self._reply_timeout(cmd, timeout):.1f} seconds.")
+            # Set by the connection that got the reply, a resent command has a new one
+            request_id = future.request_id if future.connection.protocol >= 1 else None
         except Exception as e:
             response = {"status": "error", 
-                        "details": {"error during sending or recieving a message": str(e)}}
-        return response
+                        "details": {"error_message": f"Error during sending or recieving a message: {e}"}}
+        if isinstance(response.get("details"), dict):
+            response["details"]["client_timings_ms"] = {"round_trip": round((time.perf_counter() - t_start) * 1000, 3)}
+        return response, request_id
 
 
-    def _video_receiver_thread(self, file_name, file_path):
+    def send_many(self, cmds: list, timeout=None) -> list:
+        """Pipeline several JSON commands over TCP and return their JSON responses in the same order. `timeout` applies to every command."""
+        futures = []
+        for cmd in cmds:
+            try:
+                futures.append(self.send_async(cmd))
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+                futures.append(future)
+
+        responses = []
+        for cmd, future in zip(cmds, futures):
+            try:
+                try:
+                    responses.append(future.result(self._reply_timeout(cmd, timeout)))
+                except FutureTimeoutError:
+                    self._abandon(future)
+                    raise TimeoutError(f"No reply to '{cmd.get('action')}' within {self._reply_timeout(cmd, timeout):.1f} seconds.")
+            except Exception as e:
+                responses.append({"status": "error", 
+                                  "details": {"error_message": f"Error during sending or recieving a message: {e}"}})
+        return responses
+
+
+    def connection_stats(self):
+        """Returns the state of the command connections: `connected`, `session`, `protocol`, the `reconnects` so far with the duration of the
+        last outage `last_outage_ms`, commands `resent` after a reconnect, commands `failed` because they may have run before the connection
+        was lost, the last connection `error` and the open `pool` connections."""
+        with self._pool_lock:
+            pool = sum(not connection.lost for connection in self._pool)
+        return {"connected": self._connected.is_set(),
+                "session": self.session,
+                "protocol": self.protocol,
+                **self._connection_stats,
+                "error": None if self._connection_error is None else str(self._connection_error),
+                "pool": pool}
+
+
+    def _video_receiver_thread(self, file_name, file_path, request_id=None):
         """Runs in a daemon thread. Connects to self.IP:self.DATA_PORT,
         reads raw H.264 packets from the server until the socket closes,
         and writes everything to file_path/file_name.h264.
@@ -54,8 +896,8 @@ class CameraDriver():
         data_socket = None
         try:
             self.logger.debug(f"Connecting to camera data socket '{self.IP}:{self.DATA_PORT}'.")
-            data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            data_socket.connect((self.IP, self.DATA_PORT))
+            data_socket = self._data_socket(request_id)
+            self._connect_data(data_socket)
             self.logger.debug("Connection established with DATA_PORT. Starting real-time video data transfer…")
             
             full_dir = os.path.abspath(file_path)
@@ -82,6 +924,27 @@ class CameraDriver():
                     pass
 
 
+    def close(self):
+        """Closes the command connections and the data channel to the camera server. Pending commands fail with a `CameraException`."""
+        self._closing = True
+        # Wakes up commands waiting for a reconnect
+        self._connected.set()
+        with self._pool_lock:
+            connections, self._pool = [self._connection, *self._pool], []
+        for connection in connections:
+            connection.lose(CameraException("Connection to camera server closed."))
+        if self._channel is not None:
+            try:
+                self._channel.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._channel.close()
+        if self._stream_receiver is not None:
+            self._stream_receiver.stop()
+            self._stream_receiver = None
+        self.logger.info("Disconnected")
+
+
     def template_action(self, test_int=0):
         cmd = {"action": "template_action", 
                "args": {"test_int": test_int}}
@@ -96,8 +959,9 @@ class CameraDriver():
 
     # ======= CAMERA METHODS ======= #
 
-    def capture(self, file_name=None, file_path=".", file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0):
+    def capture(self, file_name=None, file_path=".", file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0, persistent=False, transfer_mode="disk", trigger_at=None, focus_profile=None, roi=None, binning=1, grayscale=False):
         """Captures image with external camera (server) of specified format, resolution, and focus settings. Receive the raw image data over the data socket and save it to disk at the given path.
+        While a video, stream, recording, ring buffer or scan runs on the server, the image is taken from the running video at the video resolution without refocusing and without interrupting the video.
 
         Args:
             file_name (str, [default:`picam_<timestamp>`]): File identifier under which it will be saved to disk.
@@ -106,52 +970,298 @@ class CameraDriver():
             resolution (str [default:`(4608, 2592)`]): Height and width of the RGB array.
             autofocus (bool [default:`True`]): Triggers standard autofocus cycle of [PiCamera2 library](https://datasheets.raspberrypi.com/camera/picamera2-manual.pdf).<br>`True` = 'autofocus on', `False` = 'autofocus off'
             focus_length (float [default:`0.0`]): Lens position must only set manually, if before `autofocus=False`.<br>The minimum value for the lens position is most commonly `0.0` (meaning infinity). For the maximum, a value of `10.0` would indicate that the closest focal distance is 1 / 10 metres, or 10cm. Default values might often be around `0.5` to `1.0`, implying a hyperfocal distance of approximately 1m to 2m.
+            persistent (bool [default:`False`]): Keeps the camera running after the capture. Following captures with the same resolution skip the camera configuration and startup until `release_camera` is called.
+            transfer_mode (str [default:`disk`]): `disk` streams the received data directly into the file. `memory` receives the image into a buffer of `file_size` bytes, which is returned as `data` instead of being saved to disk.
+            trigger_at (float [default:`None`]): Unix timestamp at which the server takes the picture, after the camera was prepared and focused. Requires synchronized clocks (e.g. NTP) between client and server.
+            focus_profile (str [default:`None`]): Name of a focus profile, e.g. per fixture. With `autofocus=True` the server remembers the converged lens position under this name and reuses it for later captures instead of running the autofocus cycle again, until the picture gets blurred or the entry expires.
+            roi (tuple [default:`None`]): Region `(x, y, width, height)` of the field of view as fractions `0.0`-`1.0`, cropped in the camera before encoding. The pixel density of `resolution` is kept, so the image shrinks with the region, e.g. `(0.25, 0.25, 0.5, 0.5)` at `(4608, 2592)` gives `2304x1296`.
+            binning (int [default:`1`]): Divides width and height by `1`, `2`, or `4` in the camera, which picks a binned sensor mode for small outputs.
+            grayscale (bool [default:`False`]): Encode the luminance only.
         
         Returns:
-            response_dictionary (dict): DETAILS: `file_name`, `file_name` 
+            response_dictionary (dict): DETAILS: `file_name`, `file_size`, `resolution`, `timings_ms`, `trigger_timestamp`, `focus` (only with `focus_profile`), `video` (only while a video runs: `resolution`, `gap_ms`, `frames`), `data` (only `memory` mode)
         """
+        if transfer_mode not in ("disk", "memory"):
+            raise CameraException(f"Unsupported transfer mode '{transfer_mode}'. Only 'disk' and 'memory' are available.")
         self.logger.debug("Send 'capture' command to camera server and wait for response")
         cmd = {"action": "capture", 
                "args": {"file_format": file_format, 
                         "resolution": resolution, 
                         "autofocus": autofocus, 
                         "focus_length": focus_length}}
-        response = self.send(cmd)
+        # Optional arguments are only sent when used, so older camera servers keep accepting the command
+        if persistent: cmd["args"]["persistent"] = persistent
+        if trigger_at is not None: cmd["args"]["trigger_at"] = trigger_at
+        if focus_profile is not None: cmd["args"]["focus_profile"] = focus_profile
+        _region_args(cmd["args"], roi, binning, grayscale)
+        response, request_id = self._send(cmd)
         if response["status"] == "warning": 
             self.logger.warning(f"WARNING: {response['details']['warning_message']}")
             return response
         elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
         
         try: 
-            picture_data = bytearray()
             if file_name != None: response["details"]["file_name"] = f"{file_name}.{file_format}"
             file_name = response["details"].get("file_name")
             file_size = response["details"].get("file_size")
             
-            self.logger.debug(f"Connecting to camera data socket '{self.IP}:{self.CMD_PORT}'")
-            data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            data_socket.connect((self.IP, self.DATA_PORT))
-            
-            self.logger.debug(f"Connection established with the DATA_PORT. Starting transfer...")
-            while len(picture_data) < file_size:
-                packet = data_socket.recv(4096)
-                if packet is None: raise BrokenPipeError()
-                picture_data.extend(packet)
-            data_socket.close()
+            self.logger.debug(f"Connecting to camera data socket '{self.IP}:{self.DATA_PORT}'")
+            data_socket = self._data_socket(request_id)
+            t_transfer = time.perf_counter()
+            try:
+                self._connect_data(data_socket)
+                self.logger.debug(f"Connection established with the DATA_PORT. Starting transfer...")
+                if transfer_mode == "memory":
+                    picture_data = _recv_exact(data_socket, file_size)
+                    received = file_size if picture_data is not None else 0
+                else:
+                    if self._transfer_buffer is None:
+                        self._transfer_buffer = bytearray(TRANSFER_CHUNK_SIZE)
+                    with open(os.path.join(file_path, file_name), 'wb') as f:
+                        received = _recv_into_file(data_socket, f, file_size, self._transfer_buffer)
+            finally:
+                data_socket.close()
+            response["details"]["client_timings_ms"]["transfer"] = self._record("capture", "transfer", t_transfer)
+            if received < file_size:
+                raise BrokenPipeError(f"Transfer ended after {received} of {file_size} bytes.")
             self.logger.debug(f"Transfer successfull, data socket closed")
-            
-            with open(os.path.join(file_path, file_name), 'wb') as f:
-                f.write(picture_data)
                 
         except Exception as e:
             raise CameraException(e)
     
-        response["status"] = "Picture captured and saved to disk"
+        if transfer_mode == "memory":
+            response["details"]["data"] = picture_data
+            response["status"] = "Picture captured and received"
+        else:
+            response["status"] = "Picture captured and saved to disk"
+        self.logger.info(response["status"])
+        return response
+
+
+    def capture_array(self, resolution=(1280, 720), pixel_format="RGB888", autofocus=True, focus_length=0.0, persistent=False, focus_profile=None, roi=None, binning=1, grayscale=False):
+        """Captures a single frame with the external camera (server) without image encoding. The raw array buffer is received over the data socket and wrapped into a NumPy array without copying.
+        While a video runs on the server, the frame is taken from the running video at the video resolution without interrupting it, see `capture`.
+
+        Args:
+            resolution (tuple [default:`(1280, 720)`]): Width and height of the frame.
+            pixel_format (str [default:`RGB888`]): Pixel format of the frame: `RGB888`, `BGR888`, `XRGB8888`, `XBGR8888`, or `YUV420` (returned as single plane array of 1.5 times the height).
+            autofocus (bool [default:`True`]): Triggers standard autofocus cycle of the camera.
+            focus_length (float [default:`0.0`]): Lens position, only used with `autofocus=False`.
+            persistent (bool [default:`False`]): Keeps the camera running after the capture.
+            focus_profile (str [default:`None`]): Name of a focus profile, see `capture`.
+            roi (tuple [default:`None`]): Region of the field of view, see `capture`.
+            binning (int [default:`1`]): Reduction of width and height, see `capture`.
+            grayscale (bool [default:`False`]): Return the luminance as 2D `uint8` array (height x width) instead of `pixel_format`.
+
+        Returns:
+            array (np.ndarray): Frame with the `shape`, `dtype` and `strides` reported by the server.
+        """
+        self.logger.debug("Send 'capture_array' command to camera server and wait for response")
+        cmd = {"action": "capture_array", 
+               "args": {"resolution": resolution, 
+                        "pixel_format": pixel_format, 
+                        "autofocus": autofocus, 
+                        "focus_length": focus_length,
+                        "persistent": persistent}}
+        if focus_profile is not None: cmd["args"]["focus_profile"] = focus_profile
+        _region_args(cmd["args"], roi, binning, grayscale)
+        response, request_id = self._send(cmd)
+        if response["status"] == "warning": raise CameraException(response["details"]["warning_message"])
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        details = response["details"]
+        data_socket = self._data_socket(request_id)
+        t_transfer = time.perf_counter()
+        try:
+            self._connect_data(data_socket)
+            buffer = _recv_exact(data_socket, details["size"])
+        except OSError as e:
+            raise CameraException(e)
+        finally:
+            data_socket.close()
+        self._record("capture_array", "transfer", t_transfer)
+        if buffer is None:
+            raise CameraException(f"Array transfer ended before {details['size']} bytes were received.")
+
+        # Wraps the received buffer, the strides skip any row padding sent along
+        array = np.ndarray(shape=details["shape"], dtype=np.dtype(details["dtype"]), buffer=buffer, strides=details["strides"])
+        self.logger.debug(f"Array of shape {array.shape} received")
+        if "video" in details:
+            self.logger.debug(f"Array taken from the running video, video gap {details['video'].get('gap_ms')} ms, reply after {details['timings_ms']['reply']} ms")
+        return array
+
+
+    def iter_burst(self, count, interval=0.0, file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0, persistent=False, focus_profile=None, roi=None, binning=1, grayscale=False):
+        """Captures a sequence of images back to back from the running camera (server) and yields every frame as soon as it arrived over a single data socket connection.
+
+        Args:
+            count (int): Number of frames to capture.
+            interval (float [default:`0.0`]): Minimum time in seconds between two captures. `0.0` captures as fast as possible.
+            file_format (str [default:`jpeg`]):  Supported are the following file formats: `jpeg`, `png`, `bmp`, and `gif`.
+            resolution (tuple [default:`(4608, 2592)`]): Width and height of the images.
+            autofocus (bool [default:`True`]): Triggers the autofocus cycle once before the first frame.
+            focus_length (float [default:`0.0`]): Lens position, only used with `autofocus=False`.
+            persistent (bool [default:`False`]): Keeps the camera running after the burst.
+            focus_profile (str [default:`None`]): Name of a focus profile, see `capture`.
+            roi (tuple [default:`None`]): Region of the field of view, see `capture`.
+            binning (int [default:`1`]): Reduction of width and height, see `capture`.
+            grayscale (bool [default:`False`]): Encode the luminance only.
+
+        Yields:
+            frame (tuple): `(index, timestamp, data)` with the frame index, the unix capture timestamp and the encoded image as `bytearray`.
+        """
+        self.logger.debug("Send 'capture_burst' command to camera server and wait for response")
+        cmd = {"action": "capture_burst", 
+               "args": {"count": count,
+                        "interval": interval,
+                        "file_format": file_format, 
+                        "resolution": resolution, 
+                        "autofocus": autofocus, 
+                        "focus_length": focus_length,
+                        "persistent": persistent}}
+        if focus_profile is not None: cmd["args"]["focus_profile"] = focus_profile
+        _region_args(cmd["args"], roi, binning, grayscale)
+        response, request_id = self._send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        self.logger.debug(f"Connecting to camera data socket '{self.IP}:{self.DATA_PORT}'")
+        data_socket = self._data_socket(request_id)
+        t_transfer = time.perf_counter()
+        try:
+            self._connect_data(data_socket)
+            self.logger.debug(f"Connection established with the DATA_PORT. Receiving {count} frames...")
+            for _ in range(response["details"]["count"]):
+                header = _recv_exact(data_socket, FRAME_HEADER.size)
+                if header is None:
+                    raise CameraException("Burst transfer ended before all frames were received.")
+                index, size, timestamp = FRAME_HEADER.unpack(header)
+                data = _recv_exact(data_socket, size)
+                if data is None:
+                    raise CameraException("Burst transfer ended before all frames were received.")
+                yield index, timestamp, data
+            self._record("capture_burst", "transfer", t_transfer)
+        except OSError as e:
+            raise CameraException(e)
+        finally:
+            data_socket.close()
+
+
+    def capture_burst(self, count, interval=0.0, file_name=None, file_path=".", file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0, persistent=False, focus_profile=None, roi=None, binning=1, grayscale=False):
+        """Captures a sequence of images with a single command and data connection, and saves every frame to disk at the given path as `<file_name>_<index>.<file_format>`.
+
+        Args:
+            count (int): Number of frames to capture.
+            interval (float [default:`0.0`]): Minimum time in seconds between two captures. `0.0` captures as fast as possible.
+            file_name (str, [default:`picam_burst_<timestamp>`]): Base name of the saved frames.
+            file_path (str [default:`.`]): Relative or absolute directory, where the frames will be saved to.
+            file_format (str [default:`jpeg`]):  Supported are the following file formats: `jpeg`, `png`, `bmp`, and `gif`.
+            resolution (tuple [default:`(4608, 2592)`]): Width and height of the images.
+            autofocus (bool [default:`True`]): Triggers the autofocus cycle once before the first frame.
+            focus_length (float [default:`0.0`]): Lens position, only used with `autofocus=False`.
+            persistent (bool [default:`False`]): Keeps the camera running after the burst.
+            focus_profile (str [default:`None`]): Name of a focus profile, see `capture`.
+            roi (tuple [default:`None`]): Region of the field of view, see `capture`.
+            binning (int [default:`1`]): Reduction of width and height, see `capture`.
+            grayscale (bool [default:`False`]): Encode the luminance only.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `file_names`, `count`, `fps` 
+        """
+        if file_name is None: file_name = time.strftime("picam_burst_%Y%m%d_%H%M%S")
+        os.makedirs(file_path, exist_ok=True)
+        file_names = []
+        timestamps = []
+        for index, timestamp, data in self.iter_burst(count, interval, file_format, resolution, autofocus, focus_length, persistent, focus_profile, roi, binning, grayscale):
+            frame_name = f"{file_name}_{index:04d}.{file_format}"
+            with open(os.path.join(file_path, frame_name), "wb") as f:
+                f.write(data)
+            file_names.append(frame_name)
+            timestamps.append(timestamp)
+
+        duration = timestamps[-1] - timestamps[0] if len(timestamps) > 1 else 0.0
+        response = {"status": "Burst captured and saved to disk",
+                    "details": {"file_names": file_names,
+                                "count": len(file_names),
+                                "fps": (len(timestamps) - 1) / duration if duration > 0 else None}}
         self.logger.info(response["status"])
         return response
 
 
-    def start_video(self, file_name, file_path=".", resolution=(1280, 720), duration=5):
+    def preview(self, format="jpeg", quality=75, max_age=0.5):
+        """Fetches a small grayscale preview from the low resolution stream of the camera server, e.g. for a live view polled by several clients.
+        Previews start an idle camera at `(1280, 720)`, but never reconfigure a running one, so captures and videos are not disturbed. The camera stops again after 10 seconds without previews.
+
+        Args:
+            format (str [default:`jpeg`]): `jpeg` for a JPEG image, `raw` for the luminance plane as NumPy `uint8` array.
+            quality (int [default:`75`]): JPEG quality `1`-`95`.
+            max_age (float [default:`0.5`]): Maximum age in seconds of a frame the server reuses, including its encoding.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `format`, `size`, `shape`, `age_ms`, and `data` (JPEG bytes) or `array` (NumPy array)
+        """
+        cmd = {"action": "preview", "args": {"format": format, "quality": quality, "max_age": max_age}}
+        response, request_id = self._send(cmd)
+        if response["status"] == "warning": raise CameraException(response["details"]["warning_message"])
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        details = response["details"]
+        data_socket = self._data_socket(request_id)
+        t_transfer = time.perf_counter()
+        try:
+            self._connect_data(data_socket)
+            buffer = _recv_exact(data_socket, details["size"])
+        except OSError as e:
+            raise CameraException(e)
+        finally:
+            data_socket.close()
+        self._record("preview", "transfer", t_transfer)
+        if buffer is None:
+            raise CameraException(f"Preview transfer ended before {details['size']} bytes were received.")
+
+        if format == "raw":
+            details["array"] = np.ndarray(shape=details["shape"], dtype=np.dtype(details["dtype"]), buffer=buffer, strides=details["strides"])
+        else:
+            details["data"] = bytes(buffer)
+        return response
+
+
+    def release_camera(self):
+        """Stops the camera on the server, if it was kept running by a persistent capture.
+        
+        Returns:
+            response_dictionary (dict):
+        """
+        cmd = {"action": "release_camera", "args": {}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(response["status"])
+        return response
+
+
+    def clear_focus(self, focus_profile=None):
+        """Forgets the lens position the camera server remembered for a focus profile, or for all profiles, so the next capture with it runs the autofocus cycle again.
+
+        Args:
+            focus_profile (str [default:`None`]): Name of the focus profile. `None` clears all profiles.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `focus_profile`
+        """
+        cmd = {"action": "clear_focus", "args": {"focus_profile": focus_profile}}
+        response = self.send(cmd)
+        if response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        self.logger.debug(response["status"])
+        return response
+
+
+    def start_video(self, file_name, file_path=".", resolution=(1280, 720), duration=5, roi=None, binning=1, grayscale=False):
         """Starts streaming H.264‐encoded video from the external camera (server) and writes the raw `.h264` data to disk at the given path.
 
         Args:
@@ -159,21 +1269,24 @@ class CameraDriver():
             file_path (str [default:`.`]): Relative or absolute directory where the file will be saved. Default is the driver directory.
             resolution (tuple [default:`(1280, 720)`]): Width and height of the video stream.
             duration (int [default:`5`]): Duration in seconds to record. If `None` or `0`, streaming continues until `stop_video` is called.
+            roi (tuple [default:`None`]): Region `(x, y, width, height)` of the field of view as fractions `0.0`-`1.0`, cropped in the camera before encoding. The pixel density of `resolution` is kept, so the video shrinks with the region.
+            binning (int [default:`1`]): Divides width and height by `1`, `2`, or `4` in the camera, which picks a binned sensor mode for small outputs.
+            grayscale (bool [default:`False`]): Remove the colour in the camera, so the encoder spends its bitrate on the luminance. Reduces the bitrate only, not the encoder load, since the hardware encoder still encodes the flat chroma planes.
         
         Returns:
             response_dictionary (dict): DETAILS: `file_name`, `duration` 
         """
         self.logger.debug("Send 'start_video' command to camera server and wait for response")
         cmd = {"action": "start_video", 
-               "args": {"resolution": resolution}}
-        response = self.send(cmd)
+               "args": _region_args({"resolution": resolution}, roi, binning, grayscale)}
+        response, request_id = self._send(cmd)
         if response["status"] == "warning": 
             self.logger.warning(f"WARNING: {response['details']['warning_message']}")
             return response
         elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
         
         try:
-            receiver_thread = threading.Thread(target=self._video_receiver_thread, args=(file_name, file_path), daemon=True)
+            receiver_thread = threading.Thread(target=self._video_receiver_thread, args=(file_name, file_path, request_id), daemon=True)
             receiver_thread.start()
             self._video_thread = receiver_thread 
             
@@ -210,63 +1323,678 @@ class CameraDriver():
         self.logger.debug(response["status"])
         return response
 
-    def read_qrcode(self):
-        raise NotImplementedError("'read_qrcode' method not fully implemented")
-        """_missing docstring_"""
-        cmd = {"action": "read_qrcode", "args": {}}
+
+    def iter_frames(self, resolution=(1280, 720), policy="latest", queue_size=FRAME_QUEUE_SIZE, skip=0, pixel_format="rgb24", file_name=None, file_path=".", timeout=None, decoder=None, roi=None, binning=1, grayscale=False):
+        """Starts a video on the camera server and yields its frames decoded into NumPy arrays, until the generator is closed or the video is stopped.
+        The H.264 stream is received and decoded on a background thread while the previous frames are processed, so a frame is ready as soon as its data arrived.
+        Closing the generator (e.g. leaving the `for` loop) stops the video. Decoding needs PyAV (`pip install av`).
+
+        Args:
+            resolution (tuple [default:`(1280, 720)`]): Width and height of the video stream.
+            policy (str [default:`latest`]): `latest` replaces the oldest queued frame, if the frames are processed slower than they arrive, so the newest frame is always delivered.
+                `lossless` delivers every frame and slows the video down instead, until the server drops frames up to the next keyframe.
+            queue_size (int [default:`4`]): Decoded frames queued for the loop. `1` with `latest` gives the lowest latency.
+            skip (int [default:`0`]): Frames left out after every delivered frame, e.g. `1` delivers every second frame. Skipped frames are decoded but not converted.
+            pixel_format (str [default:`rgb24`]): `rgb24`, `bgr24` (both height x width x 3), `gray` (luminance only), or `yuv420p` (planar, 1.5 x height rows).
+            file_name (str [default:`None`]): Also write the received raw H.264 stream to `file_path/file_name.h264`.
+            file_path (str [default:`.`]): Directory of `file_name`.
+            timeout (float [default:`None`]): Raise a `CameraException` after `timeout` seconds without a frame. `None` waits forever.
+            decoder (object [default:`None`]): Decoder with `decode(data)`, `flush()` and `convert(frame)` methods instead of the PyAV `H264Decoder`.
+            roi (tuple [default:`None`]): Region of the field of view, see `start_video`. Cropping in the camera shrinks the frames to decode.
+            binning (int [default:`1`]): Reduction of width and height, see `start_video`.
+            grayscale (bool [default:`False`]): Remove the colour in the camera, see `start_video`. Combine with `pixel_format="gray"`.
+
+        Yields:
+            frame (tuple): `(index, arrival, array)` with the frame number in the video, the `time.perf_counter` arrival time of the frame's last data and the decoded image.
+        """
+        if decoder is None:
+            try:
+                decoder = H264Decoder(pixel_format)
+            except ImportError:
+                raise CameraException("Decoding video frames requires PyAV. Install it with 'pip install av'.")
+        self.logger.debug("Send 'start_video' command to camera server and wait for response")
+        cmd = {"action": "start_video", 
+               "args": _region_args({"resolution": resolution}, roi, binning, grayscale)}
+        response, request_id = self._send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        data_socket = self._data_socket(request_id)
+        full_path = os.path.join(os.path.abspath(file_path), f"{file_name}.h264") if file_name is not None else None
+        try:
+            frame_decoder = FrameDecoder(data_socket, decoder, policy, queue_size, skip, full_path)
+            self._connect_data(data_socket)
+        except Exception as e:
+            data_socket.close()
+            self.stop_video()
+            raise CameraException(e)
+        self._frame_decoder = frame_decoder
+        frame_decoder.start()
+        try:
+            yield from frame_decoder.frames(timeout)
+        except Exception as e:
+            raise CameraException(f"Video decoding failed. DETAILS: {e}")
+        finally:
+            try:
+                self.stop_video()
+            except CameraException as e:
+                self.logger.warning(f"WARNING: Stopping the video failed: {e}")
+            stats = frame_decoder.stop()
+            self.logger.debug(f"Video frames: {stats}")
+
+
+    def frame_stats(self):
+        """Reports the decoding of the video of the running or last `iter_frames`.
+
+        Returns:
+            stats (dict): `bytes` received, frames `decoded`, `skipped`, `dropped` by the `latest` policy and `delivered`, mean decode time per frame `decode_ms`,
+            mean and maximum time from the arrival of a frame to its delivery `latency_ms` and `max_latency_ms`, and a decoding `error`.
+        """
+        if self._frame_decoder is None:
+            raise CameraException("No video was decoded. Call 'iter_frames' first.")
+        return self._frame_decoder.stats()
+
+
+    def start_recording(self, file_name=None, resolution=(1280, 720), roi=None, binning=1, grayscale=False):
+        """Starts recording video into a file on the camera server. The recording shares the server's video encoder with running videos, streams, and the ring buffer.
+
+        Args:
+            file_name (str [default:`video_<timestamp>.mp4`]): Name of the file in the server's recording directory. `.mp4`, `.mkv`, and `.ts` files are muxed into that container, other names get the raw H.264 stream.
+            resolution (tuple [default:`(1280, 720)`]): Width and height of the video. Must match the resolution of other running video consumers.
+            roi (tuple [default:`None`]): Region of the field of view, see `start_video`. Must match other running video consumers.
+            binning (int [default:`1`]): Reduction of width and height, see `start_video`.
+            grayscale (bool [default:`False`]): Remove the colour in the camera, see `start_video`. Must match other running video consumers.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `file_name`, `resolution`
+        """
+        cmd = {"action": "start_recording", 
+               "args": _region_args({"file_name": file_name,
+                                     "resolution": resolution}, roi, binning, grayscale)}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.info(f"Recording to '{response['details']['file_name']}' on the camera server started")
+        return response
+
+
+    def stop_recording(self):
+        """Stops the recording on the camera server.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `sent`, `dropped` (frames written to and skipped for the file)
+        """
+        cmd = {"action": "stop_recording", "args": {}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(response["status"])
+        return response
+
+
+    def video_status(self):
+        """Reports the shared video encoder of the camera server and all video consumers attached to it, including their queue fill and dropped frames.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `resolution` (`None` while no video runs), `frames`, `sinks` with `name`, `queued`, `sent`, `dropped`, `error`
+        """
+        cmd = {"action": "video_status", "args": {}}
+        response = self.send(cmd)
+        if response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        return response
+
+
+    def get_metrics(self, format="json"):
+        """Reports the per-phase timing histograms of all commands the camera server executed since it started (e.g. `queue`, `configure`, `startup`, `focus`, `encode`, `accept`, `send`, `total`).
+
+        Args:
+            format (str [default:`json`]): `json` for `count`, `mean_ms`, `p50_ms`, `p95_ms`, `p99_ms`, and `max_ms` per action and phase, `prometheus` for the Prometheus text format.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `uptime_s`, `actions`, `errors` (`json`), or `text` (`prometheus`)
+        """
+        cmd = {"action": "get_metrics", "args": {"format": format}}
+        response = self.send(cmd)
+        if response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        return response
+
+
+    def client_metrics(self):
+        """Summarizes the client side timings of the last `TIMING_SAMPLES` commands per action: the command `round_trip` and the data `transfer` of captures.
+
+        Returns:
+            metrics (dict): `count`, `mean_ms`, `p50_ms`, `p95_ms`, `p99_ms`, and `max_ms` by action and phase.
+        """
+        metrics = {}
+        for (action, phase), samples in list(self._timings.items()):
+            values = np.array(samples)
+            metrics.setdefault(str(action), {})[phase] = {"count": len(values),
+                                                          "mean_ms": round(float(values.mean()), 3),
+                                                          "p50_ms": round(float(np.percentile(values, 50)), 3),
+                                                          "p95_ms": round(float(np.percentile(values, 95)), 3),
+                                                          "p99_ms": round(float(np.percentile(values, 99)), 3),
+                                                          "max_ms": round(float(values.max()), 3)}
+        return metrics
+
+
+    def start_ring_buffer(self, resolution=(1280, 720), seconds=10.0, max_bytes=64 * 1024 * 1024):
+        """Starts encoding H.264 video on the camera server into an in-memory ring buffer of the last `seconds`. Clips around a trigger event, including the time before it, are fetched with `save_clip`.
+
+        Args:
+            resolution (tuple [default:`(1280, 720)`]): Width and height of the video.
+            seconds (float [default:`10.0`]): Length of video history kept on the server.
+            max_bytes (int [default:`64 MB`]): Memory budget of the ring buffer on the server.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `seconds`, `max_bytes`
+        """
+        cmd = {"action": "start_ring_buffer", 
+               "args": {"resolution": resolution,
+                        "seconds": seconds,
+                        "max_bytes": max_bytes}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(response["status"])
+        return response
+
+
+    def stop_ring_buffer(self):
+        """Stops the ring buffer on the camera server and discards the buffered video.
+
+        Returns:
+            response_dictionary (dict):
+        """
+        cmd = {"action": "stop_ring_buffer", "args": {}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(response["status"])
+        return response
+
+
+    def save_clip(self, file_name, file_path=".", pre_seconds=5.0, post_seconds=5.0):
+        """Cuts a clip from the server's ring buffer around the moment of the call and saves the raw `.h264` data to disk at the given path. The clip starts on a keyframe, so it is decodable on its own.
+
+        Args:
+            file_name (str): Base name for the output file ('.h264' extension will be appended).
+            file_path (str [default:`.`]): Relative or absolute directory where the file will be saved.
+            pre_seconds (float [default:`5.0`]): Seconds of video before the trigger.
+            post_seconds (float [default:`5.0`]): Seconds of video after the trigger. The call returns after this time.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `file_name`, `file_size`, `frames`, `duration_s`, `pre_seconds`
+        """
+        self.logger.debug("Send 'save_clip' command to camera server and wait for response")
+        cmd = {"action": "save_clip", 
+               "args": {"pre_seconds": pre_seconds,
+                        "post_seconds": post_seconds}}
+        response, request_id = self._send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        file_size = response["details"]["file_size"]
+        response["details"]["file_name"] = f"{file_name}.h264"
+        os.makedirs(file_path, exist_ok=True)
+        data_socket = self._data_socket(request_id)
+        try:
+            self._connect_data(data_socket)
+            if self._transfer_buffer is None:
+                self._transfer_buffer = bytearray(TRANSFER_CHUNK_SIZE)
+            with open(os.path.join(file_path, f"{file_name}.h264"), "wb") as f:
+                received = _recv_into_file(data_socket, f, file_size, self._transfer_buffer)
+        except OSError as e:
+            raise CameraException(e)
+        finally:
+            data_socket.close()
+        if received < file_size:
+            raise CameraException(f"Clip transfer ended after {received} of {file_size} bytes.")
+
+        response["status"] = "Clip saved to disk"
+        self.logger.info(response["status"])
+        return response
+
+
+    def _spool_command(self, action, args):
+        """Send a time-lapse or spool command and return the response, arguments that are `None` are left out."""
+        cmd = {"action": action, "args": {key: value for key, value in args.items() if value is not None}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        self.logger.debug(response["status"])
+        return response
+
+
+    def start_timelapse(self, interval=None, cron=None, count=None, until=None, file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0, focus_profile=None, persistent=None, max_bytes=None):
+        """Starts a time-lapse on the camera server, which captures into an on-disk spool on the server at a fixed interval or at cron-like times.
+        The time-lapse keeps running without the client, even while the network is down. Frames are listed with `list_spool` and fetched in bulk with `fetch_spool`.
+
+        Args:
+            interval (float [default:`None`]): Seconds between two captures.
+            cron (str [default:`None`]): Schedule `minute hour day month weekday` in server local time instead of `interval`, e.g. `*/5 6-18 * * 1-5` (every 5 minutes from 6:00 to 18:55 on workdays).
+            count (int [default:`None`]): Number of captures, after which the time-lapse ends.
+            until (float [default:`None`]): Unix timestamp, after which the time-lapse ends.
+            file_format (str [default:`jpeg`]): `jpeg`, `png`, `bmp`, or `gif`.
+            resolution (tuple [default:`(4608, 2592)`]): Width and height of the images.
+            autofocus (bool [default:`True`]): Run the autofocus cycle before every capture. Combine with `focus_profile` to reuse the lens position.
+            focus_length (float [default:`0.0`]): Lens position, only used with `autofocus=False`.
+            focus_profile (str [default:`None`]): Name of a focus profile, see `capture`.
+            persistent (bool [default:`None`]): Keep the camera running between captures. `None` keeps it running for intervals below 10 seconds.
+            max_bytes (int [default:`None`]): New disk quota of the spool (1 GiB by default). The oldest frames are evicted beyond it.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `timelapse`, `spool` (see `timelapse_status`)
+        """
+        return self._spool_command("start_timelapse", {"interval": interval, "cron": cron, "count": count, "until": until,
+                                                       "file_format": file_format, "resolution": resolution, "autofocus": autofocus,
+                                                       "focus_length": focus_length, "focus_profile": focus_profile,
+                                                       "persistent": persistent, "max_bytes": max_bytes})
+
+
+    def stop_timelapse(self):
+        """Stops the time-lapse on the camera server. The spool is kept.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `timelapse`, `spool` (see `timelapse_status`)
+        """
+        return self._spool_command("stop_timelapse", {})
+
+
+    def timelapse_status(self):
+        """Reports the time-lapse and the spool of the camera server.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `running`, `timelapse` (`interval`, `cron`, `count`, `until`, `persistent`, `captured`, `failed`, `missed`, last `error`, `next_at`), `spool` (`frames`, `bytes`, `max_bytes`, `evicted`, `first` and `last` sequence number)
+        """
+        return self._spool_command("timelapse_status", {})
+
+
+    def list_spool(self, first=None, last=None, since=None, until=None, limit=1000):
+        """Lists the frames in the spool of the camera server, optionally within the sequence numbers `first`-`last` and the unix times `since`-`until` (all inclusive).
+
+        Args:
+            first (int [default:`None`]): Lowest sequence number.
+            last (int [default:`None`]): Highest sequence number.
+            since (float [default:`None`]): Earliest unix capture time.
+            until (float [default:`None`]): Latest unix capture time.
+            limit (int [default:`1000`]): Maximum number of frames, at most 10000.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `entries` (`seq`, `timestamp`, `file_name`, `size`, `crc32`), `truncated`, `spool`
+        """
+        return self._spool_command("list_spool", {"first": first, "last": last, "since": since, "until": until, "limit": limit})
+
+
+    def fetch_spool(self, file_path=".", first=None, last=None, since=None, until=None, limit=1000, delete=False):
+        """Fetches frames of the spool selected like in `list_spool` in one streamed tar archive, and saves them to disk under their spool file names.
+        Every frame is checked against the CRC-32 of the spool index.
+
+        Args:
+            file_path (str [default:`.`]): Relative or absolute directory where the frames are saved.
+            first, last, since, until, limit: Selection of frames, see `list_spool`.
+            delete (bool [default:`False`]): Delete the frames from the spool, which were received and verified.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `entries` (see `list_spool`), `truncated`, `size`, `files` saved, `corrupt` and `missing` sequence numbers, `deleted` frames
+        """
+        self.logger.debug("Send 'fetch_spool' command to camera server and wait for response")
+        cmd = {"action": "fetch_spool", 
+               "args": {key: value for key, value in {"first": first, "last": last, "since": since, "until": until, "limit": limit}.items() if value is not None}}
+        response, request_id = self._send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+
+        entries = {entry["file_name"]: entry for entry in response["details"]["entries"]}
+        os.makedirs(file_path, exist_ok=True)
+        files = []
+        verified = []
+        corrupt = []
+        data_socket = self._data_socket(request_id)
+        t_transfer = time.perf_counter()
+        try:
+            self._connect_data(data_socket)
+            while True:
+                header = _recv_exact(data_socket, TAR_BLOCK)
+                if header is None:
+                    raise CameraException("Spool transfer ended before the end of the archive.")
+                if not any(header):
+                    # End of the archive
+                    _recv_exact(data_socket, TAR_BLOCK)
+                    break
+                info = tarfile.TarInfo.frombuf(bytes(header), "utf-8", "surrogateescape")
+                entry = entries.get(info.name)
+                if entry is None or entry["size"] != info.size:
+                    raise CameraException(f"Unexpected member '{info.name}' in the spool archive.")
+                data = _recv_exact(data_socket, info.size + (-info.size % TAR_BLOCK))
+                if data is None:
+                    raise CameraException(f"Spool transfer ended in frame '{info.name}'.")
+                frame = memoryview(data)[:info.size]
+                if zlib.crc32(frame) != entry["crc32"]:
+                    corrupt.append(entry["seq"])
+                    continue
+                with open(os.path.join(file_path, info.name), "wb") as f:
+                    f.write(frame)
+                files.append(info.name)
+                verified.append(entry["seq"])
+        except (OSError, tarfile.TarError) as e:
+            raise CameraException(e)
+        finally:
+            data_socket.close()
+        self._record("fetch_spool", "transfer", t_transfer)
+
+        received = set(verified) | set(corrupt)
+        response["details"]["files"] = files
+        response["details"]["corrupt"] = corrupt
+        response["details"]["missing"] = [entry["seq"] for entry in entries.values() if entry["seq"] not in received]
+        response["details"]["deleted"] = self._spool_command("delete_spool", {"seqs": verified})["details"]["deleted"] if delete and verified else 0
+        if corrupt:
+            self.logger.warning(f"WARNING: {len(corrupt)} spool frames failed the checksum and were not saved")
+        response["status"] = "Spool frames fetched and saved to disk"
+        self.logger.info(response["status"])
+        return response
+
+
+    def delete_spool(self, seqs):
+        """Deletes frames from the spool of the camera server.
+
+        Args:
+            seqs (list): Sequence numbers of the frames.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `deleted` frames, `spool`
+        """
+        return self._spool_command("delete_spool", {"seqs": list(seqs)})
+
+
+    def start_scan(self, mode="qrcode", roi=None, downscale=1, interval=0.0, ttl=2.0, callback=None):
+        """Starts continuous QR code and/or barcode scanning on the camera server. The server decodes its low resolution video stream and pushes every newly seen code, which is available through `iter_codes` and `callback`.
+        Requires a camera server with the framed command protocol.
+
+        Args:
+            mode (str [default:`qrcode`]): `qrcode`, `barcode`, or `all`.
+            roi (tuple [default:`None`]): Region of interest `(x, y, width, height)` as fractions `0.0`-`1.0` of the frame. `None` scans the whole frame.
+            downscale (int [default:`1`]): Integer reduction factor of the region before decoding. Speeds up decoding of large codes.
+            interval (float [default:`0.0`]): Minimum time in seconds between two decoded frames. `0.0` decodes as fast as possible.
+            ttl (float [default:`2.0`]): A code is reported once while it stays in view, and again after it was out of view for `ttl` seconds.
+            callback (callable [default:`None`]): Called with every code dictionary (`type`, `data`, `rect`, `latency_ms`). Runs on the driver's receiver thread and must return quickly.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `mode`, `lores_size`
+        """
+        cmd = {"action": "start_scan", 
+               "args": {"mode": mode,
+                        "roi": roi,
+                        "downscale": downscale,
+                        "interval": interval,
+                        "ttl": ttl}}
+        self._code_callback = callback
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(response["status"])
+        return response
+
+
+    def stop_scan(self):
+        """Stops the continuous code scanning on the camera server. Codes received until then stay available through `iter_codes`.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `mode`, `decoded` and `skipped` frames, decoder `error`
+        """
+        cmd = {"action": "stop_scan", "args": {}}
         response = self.send(cmd)
         if response["status"] == "warning": 
             self.logger.warning(f"WARNING: {response['details']['warning_message']}")
             return response
         elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
         
-        self.logger.debug(f"{response["status"]}: {response["datails"]["qr_str_tuple"]}")
+        self._code_callback = None
+        self.logger.debug(response["status"])
         return response
 
 
-    def read_barcode(self):
-        raise NotImplementedError("'read_barcode' method not implemented")
+    def iter_codes(self, timeout=None):
+        """Yields the codes pushed by the server during `start_scan`, in the order they were seen.
 
+        Args:
+            timeout (float [default:`None`]): Stop iterating after `timeout` seconds without a new code. `None` waits forever.
 
-    def start_stream(self, resolution = (1280, 720), IP_out = None):
+        Yields:
+            code (dict): `type`, `data`, `rect` (`[left, top, width, height]` in pixels of the low resolution stream), `latency_ms` (frame to decoded code)
+        """
+        while True:
+            try:
+                yield self._codes.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+
+    def start_motion(self, zones=None, threshold=12.0, min_area=0.02, cell=16, hold=2.0, alpha=0.05, record=False, callback=None):
+        """Starts motion detection on the camera server. The server compares every frame of its low resolution video stream with a background and pushes a
+        motion event when motion starts and when it ends, which is available through `iter_motion` and `callback`. Optionally every motion event is recorded on the server.
+        Requires a camera server with the framed command protocol.
+
+        Args:
+            zones (list [default:`None`]): Zones `(x, y, width, height)` as fractions `0.0`-`1.0` of the frame, in which motion counts. `None` watches the whole frame.
+            threshold (float [default:`12.0`]): Change of the mean luminance `0`-`255` of a cell, above which the cell changed. Changes of the brightness of the whole frame do not count.
+            min_area (float [default:`0.02`]): Fraction of a zone that must change to start a motion event.
+            cell (int [default:`16`]): Side length of the cells in pixels of the low resolution stream. Smaller cells detect smaller objects.
+            hold (float [default:`2.0`]): A motion event ends `hold` seconds after the last frame with motion.
+            alpha (float [default:`0.05`]): Weight of every frame in the background. Higher values adapt faster to changes of the scene.
+            record (bool [default:`False`]): Record every motion event into a `.mp4` file in the `recordings` directory on the server, from its start until it ends.
+            callback (callable [default:`None`]): Called with every motion event dictionary. Runs on the driver's receiver thread and must return quickly.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `zones`, `lores_size`
+        """
+        cmd = {"action": "start_motion",
+               "args": {"zones": zones,
+                        "threshold": threshold,
+                        "min_area": min_area,
+                        "cell": cell,
+                        "hold": hold,
+                        "alpha": alpha,
+                        "record": record}}
+        self._motion_callback = callback
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(response["status"])
+        return response
+
+
+    def stop_motion(self):
+        """Stops the motion detection on the camera server and a running recording of a motion event. Events received until then stay available through `iter_motion`.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `frames`, `events`, detection time per frame `mean_ms` and `max_ms`, the stopped `recording`
+        """
+        cmd = {"action": "stop_motion", "args": {}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self._motion_callback = None
+        self.logger.debug(response["status"])
+        return response
+
+
+    def iter_motion(self, timeout=None):
+        """Yields the motion events pushed by the server during `start_motion`, in order.
+
+        Args:
+            timeout (float [default:`None`]): Stop iterating after `timeout` seconds without a new event. `None` waits forever.
+
+        Yields:
+            event (dict): `state` (`start` or `end`), the number of the motion `event`, server `timestamp`. Start events hold the changed `area` (fraction of the zone), the indices of the
+            `zones` with motion and the `bbox` `[x, y, width, height]` of the changed cells as fractions of the frame; end events the `duration_s` and `peak_area`.
+            With `record`, start events name the `file_name` and end events hold the stopped `recording`.
+        """
+        while True:
+            try:
+                yield self._motion.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+
+    def read_qrcode(self, timeout=5.0, roi=None, downscale=1):
+        """Reads the QR codes in view of the camera. The server scans its low resolution video stream until the first frame with a readable code.
+
+        Args:
+            timeout (float [default:`5.0`]): Maximum scan time in seconds.
+            roi (tuple [default:`None`]): Region of interest `(x, y, width, height)` as fractions of the frame.
+            downscale (int [default:`1`]): Integer reduction factor of the region before decoding.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `codes` with `type`, `data`, `rect`, `latency_ms`
+        """
+        cmd = {"action": "read_qrcode", 
+               "args": {"timeout": timeout,
+                        "roi": roi,
+                        "downscale": downscale}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(f"{response['status']}: {[code['data'] for code in response['details']['codes']]}")
+        return response
+
+
+    def read_barcode(self, timeout=5.0, roi=None, downscale=1):
+        """Reads the barcodes in view of the camera. See `read_qrcode`.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `codes` with `type`, `data`, `rect`, `latency_ms`
+        """
+        cmd = {"action": "read_barcode", 
+               "args": {"timeout": timeout,
+                        "roi": roi,
+                        "downscale": downscale}}
+        response = self.send(cmd)
+        if response["status"] == "warning": 
+            self.logger.warning(f"WARNING: {response['details']['warning_message']}")
+            return response
+        elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
+        
+        self.logger.debug(f"{response['status']}: {[code['data'] for code in response['details']['codes']]}")
+        return response
+
+
+    def start_stream(self, resolution = (1280, 720), IP_out = None, receive = False, file_name = None, file_path = ".", callback = None, queue_size = PACKET_QUEUE_SIZE, roi = None, binning = 1, grayscale = False):
         """Starts streaming H.264‐encoded video from the external camera (server) to UDP socket.
+        With `receive`, the driver receives the MPEG-TS stream itself on `STREAM_PORT`, counts lost packets from the continuity counters and measures jitter and bitrate (see `stream_stats`).
 
         Args:
             resolution (tuple [default:`(1280, 720)`]): Width and height of the video stream.
             IP_out (str | None): IP adress the UDP stream is directed to. Defaults to client adress.
+            receive (bool [default:`False`]): Receive the stream in the driver. Implied by `file_name` and `callback`. Requires the stream to be directed to this client.
+            file_name (str [default:`None`]): Record the received stream to `file_name.ts` in `file_path`.
+            file_path (str [default:`.`]): Relative or absolute directory of the recording.
+            callback (callable [default:`None`]): Called with the bytes of whole TS packets of every datagram and its arrival time (`time.perf_counter`). Runs on its own thread, datagrams are dropped oldest first if more than `queue_size` wait.
+            queue_size (int [default:`256`]): Datagrams queued for `callback`.
+            roi (tuple [default:`None`]): Region of the field of view, see `start_video`.
+            binning (int [default:`1`]): Reduction of width and height, see `start_video`.
+            grayscale (bool [default:`False`]): Remove the colour in the camera, see `start_video`. Reduces the bitrate only, not the encoder load.
             
         Returns:
-            response_dictionary (dict): DETAILS: `url` 
+            response_dictionary (dict): DETAILS: `url`, `resolution` 
         """
+        # Bind the receiver first, so the first keyframe is not lost
+        receiver = None
+        if (receive or file_name is not None or callback is not None) and self._stream_receiver is None:
+            recording = None if file_name is None else os.path.join(os.path.abspath(file_path), f"{file_name}.ts")
+            receiver = StreamReceiver(self.STREAM_PORT, file_path=recording, callback=callback, queue_size=queue_size)
+            receiver.start()
+
         self.logger.debug("Send 'start_stream' command to camera server and wait for response")
         cmd = {"action": "start_stream", 
-               "args": {"resolution": resolution,
-                        "IP_out": IP_out}}
-        response = self.send(cmd)
+               "args": _region_args({"resolution": resolution,
+                                     "IP_out": IP_out}, roi, binning, grayscale)}
+        try:
+            response = self.send(cmd)
+        except Exception:
+            if receiver is not None: receiver.stop()
+            raise
+        if response["status"] in ("warning", "error") and receiver is not None:
+            receiver.stop()
         if response["status"] == "warning": 
             self.logger.warning(f"WARNING: {response['details']['warning_message']}")
             return response
         elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
         
-        if IP_out != None: IP_out = self.IP
+        if receiver is not None:
+            self._stream_receiver = receiver
+            if file_name is not None: response["details"]["file_name"] = f"{file_name}.ts"
+        # The server streams to the address of this client by default
+        if IP_out == None: IP_out = self.cmd_socket.getsockname()[0]
         response["details"]["url"] = f"udp://{IP_out}:{self.STREAM_PORT}"
         
-        self.logger.info(f"UPD video stream started under: {response["details"]["url"]}`")
+        self.logger.info(f"UPD video stream started under: {response['details']['url']}`")
         return response
 
+
+    def stream_stats(self):
+        """Reports the quality of the UDP stream received since `start_stream` with `receive`.
+
+        Returns:
+            stats (dict): `datagrams`, `bytes`, `packets`, `lost` packets, `loss_events`, `loss_ratio`, `duplicates`, `sync_errors`, `transport_errors`, `queue_dropped` datagrams of the callback queue, `jitter_ms`, `max_gap_ms`, average `bitrate_bps`, `current_bitrate_bps` of the last second, and `duration_s`.
+        """
+        if self._stream_receiver is None:
+            raise CameraException("No stream is received. Call 'start_stream' with 'receive=True' first.")
+        return self._stream_receiver.stats()
+
     def stop_stream(self):
         """Sends a 'stop_video' command to the camera server to end the active video stream.
         
         Returns:
-            response_dictionary (dict):
+            response_dictionary (dict): DETAILS: `receiver` with the final `stream_stats`, if the stream was received by the driver
         """
         cmd = {"action": "stop_stream", "args": {}}
-        response = self.send(cmd)
+        try:
+            response = self.send(cmd)
+        finally:
+            # Also stops a receiver, whose stream had already ended on the server
+            receiver, self._stream_receiver = self._stream_receiver, None
+            stats = receiver.stop() if receiver is not None else None
         if response["status"] == "warning": 
             self.logger.warning(f"WARNING: {response['details']['warning_message']}")
             return response
         elif response["status"] == "error": raise CameraException(response["details"]["error_message"])
         
+        if stats is not None:
+            response["details"]["receiver"] = stats
+        
         self.logger.debug(response["status"])
         return response
     
@@ -0,0 +1,130 @@
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_driver import CameraDriver, CameraException
+
+
+class CameraFleet():
+    def __init__(self, IPs, CMD_PORT=8000, DATA_PORT=8001, STREAM_PORT=8002):
+        """Drives several camera servers in parallel. Every node gets its own `CameraDriver`, and fleet-wide commands are issued to all nodes at once, so they take about as long as the slowest node.
+
+        Args:
+            IPs (list | dict): IP addresses of the camera servers, or a dictionary of `{node_name: IP}`. Node names default to the IP address.
+                A node can also be given as tuple `(IP, CMD_PORT, DATA_PORT, STREAM_PORT)`, where trailing ports may be left out and default to the fleet-wide ports.
+            CMD_PORT (int [default:`8000`]): Command port of all camera servers.
+            DATA_PORT (int [default:`8001`]): Data port of all camera servers.
+            STREAM_PORT (int [default:`8002`]): Stream port of all camera servers.
+        """
+        if not isinstance(IPs, dict):
+            IPs = {(node if isinstance(node, str) else ":".join(str(part) for part in node[:2])): node for node in IPs}
+        self.nodes = {}
+        for name, node in IPs.items():
+            node = (node,) if isinstance(node, str) else tuple(node)
+            self.nodes[name] = node + (CMD_PORT, DATA_PORT, STREAM_PORT)[len(node) - 1:]
+        if not self.nodes:
+            raise CameraException("CameraFleet requires at least one camera server.")
+        self.logger = logging.getLogger("CameraFleet")
+        self._executor = ThreadPoolExecutor(max_workers=len(self.nodes), thread_name_prefix="CameraFleet")
+
+        # Connect to all nodes in parallel, unreachable nodes are reported but do not stop the fleet
+        self.drivers = {}
+        self.unreachable = {}
+        futures = {name: self._executor.submit(CameraDriver, *node) for name, node in self.nodes.items()}
+        for name, future in futures.items():
+            try:
+                self.drivers[name] = future.result()
+            except Exception as e:
+                self.unreachable[name] = str(e)
+                self.logger.warning(f"WARNING: Camera node '{name}' ({self.nodes[name][0]}) is unreachable: {e}")
+        if not self.drivers:
+            raise CameraException(f"No camera server of the fleet is reachable: {self.unreachable}")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """Closes the connections to all camera servers."""
+        for driver in self.drivers.values():
+            driver.close()
+        self._executor.shutdown(wait=False)
+
+
+    def run(self, method, node_args=None, **kwargs):
+        """Calls a `CameraDriver` method on all connected nodes at once and collects the results.
+
+        Args:
+            method (str): Name of the `CameraDriver` method, e.g. `capture`.
+            node_args (dict [default:`None`]): Additional keyword arguments per node name, which override `kwargs` for that node.
+            **kwargs: Keyword arguments passed to the method on every node.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `nodes` with `response`, `latency_s`, and `error` per node name, `duration_s` of the whole fleet command
+        """
+        node_args = node_args or {}
+
+        def call(name, driver):
+            t_start = time.perf_counter()
+            try:
+                response = getattr(driver, method)(**{**kwargs, **node_args.get(name, {})})
+                error = None
+            except Exception as e:
+                response, error = None, str(e)
+            return {"response": response, "latency_s": time.perf_counter() - t_start, "error": error}
+
+        t_start = time.perf_counter()
+        futures = {name: self._executor.submit(call, name, driver) for name, driver in self.drivers.items()}
+        nodes = {name: future.result() for name, future in futures.items()}
+        duration = time.perf_counter() - t_start
+
+        failed = [name for name, result in nodes.items() if result["error"] is not None]
+        for name in failed:
+            self.logger.warning(f"WARNING: '{method}' failed on camera node '{name}': {nodes[name]['error']}")
+        status = f"'{method}' executed on {len(nodes) - len(failed)} of {len(nodes)} camera nodes"
+        self.logger.info(status)
+        return {"status": status,
+                "details": {"nodes": nodes,
+                            "failed": failed,
+                            "duration_s": duration}}
+
+
+    def capture(self, file_name=None, file_path=".", file_format="jpeg", resolution=(4608, 2592), autofocus=True, focus_length=0.0, persistent=False, transfer_mode="disk", synchronize=False, trigger_delay=1.0, focus_profile=None):
+        """Captures an image on all camera nodes at once. Every image is saved as `<file_name>_<node_name>.<file_format>`, characters of the node name that are unsafe in file names are replaced by `_`.
+
+        Args:
+            file_name (str, [default:`picam_<timestamp>`]): Base name of the saved images.
+            file_path, file_format, resolution, autofocus, focus_length, persistent, transfer_mode, focus_profile: See `CameraDriver.capture`. Every node keeps its own lens position per focus profile.
+            synchronize (bool [default:`False`]): Lines up the capture moments of all nodes. Every node prepares and focuses its camera and then waits for a common trigger timestamp. Requires synchronized clocks (e.g. NTP) on all nodes.
+            trigger_delay (float [default:`1.0`]): Seconds from now until the common trigger timestamp. Must cover the camera preparation and autofocus time of the slowest node.
+
+        Returns:
+            response_dictionary (dict): DETAILS: `nodes`, `failed`, `duration_s`, and `trigger_skew_s` (spread of the capture timestamps of all nodes)
+        """
+        if file_name is None: file_name = time.strftime("picam_%Y%m%d_%H%M%S")
+        node_args = {name: {"file_name": f"{file_name}_{re.sub(r'[^A-Za-z0-9._-]', '_', name)}"} for name in self.drivers}
+        kwargs = {"file_path": file_path,
+                  "file_format": file_format,
+                  "resolution": resolution,
+                  "autofocus": autofocus,
+                  "focus_length": focus_length,
+                  "persistent": persistent,
+                  "transfer_mode": transfer_mode}
+        if focus_profile is not None:
+            kwargs["focus_profile"] = focus_profile
+        if synchronize:
+            kwargs["trigger_at"] = time.time() + trigger_delay
+
+        response = self.run("capture", node_args=node_args, **kwargs)
+        timestamps = [result["response"]["details"].get("trigger_timestamp")
+                      for result in response["details"]["nodes"].values()
+                      if result["error"] is None and result["response"]["status"] != "warning"]
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+        response["details"]["trigger_skew_s"] = max(timestamps) - min(timestamps) if timestamps else None
+        return response
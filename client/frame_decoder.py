@@ -0,0 +1,193 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+RECEIVE_SIZE = 64 * 1024                # Bytes read from the data connection at once
+FRAME_QUEUE_SIZE = 4                    # Decoded frames queued for the consumer
+FRAME_POLICIES = ("latest", "lossless")  # `latest` drops the oldest queued frame for a new one, `lossless` holds the decoder back
+PIXEL_FORMATS = ("rgb24", "bgr24", "gray", "yuv420p")
+STOP_POLL = 0.2                         # Seconds between checks for `stop` while a lossless decoder waits for the consumer
+
+
+class H264Decoder:
+    """H.264 decoder of PyAV (`pip install av`). `decode` parses any piece of the Annex B byte stream and returns the frames it completed,
+    `convert` turns a frame into a NumPy array of `pixel_format`. Frames are only converted when they are delivered, skipped frames cost
+    the decoding alone."""
+
+    def __init__(self, pixel_format="rgb24"):
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Unsupported pixel_format '{pixel_format}'. Only {', '.join(PIXEL_FORMATS)} are available.")
+        import av
+        self.pixel_format = pixel_format
+        self._codec = av.CodecContext.create("h264", "r")
+
+    def decode(self, data) -> list:
+        frames = []
+        for packet in self._codec.parse(bytes(data)):
+            frames.extend(self._codec.decode(packet))
+        return frames
+
+    def flush(self) -> list:
+        """Frames still held by the decoder at the end of the stream."""
+        frames = []
+        for packet in self._codec.parse(b""):
+            frames.extend(self._codec.decode(packet))
+        frames.extend(self._codec.decode(None))
+        return frames
+
+    def convert(self, frame):
+        return frame.to_ndarray(format=self.pixel_format)
+
+
+class FrameDecoder:
+    """Receives the H.264 video of a data connection and decodes it into frames on its own thread.
+
+    Decoded frames wait for the consumer in a queue of `queue_size` frames. With the `latest` policy a new frame replaces the oldest queued
+    one, so the consumer always gets the most recent frames and a slow consumer never holds back the video. With `lossless` the decoder
+    waits for the consumer, which in turn slows down the data connection until the server drops frames up to the next keyframe. `skip`
+    frames are left out after every delivered frame; they are decoded, which H.264 needs for the following frames, but not converted.
+    The received stream can be written to `file_path` as raw `.h264` at the same time.
+    """
+
+    def __init__(self, data_socket, decoder, policy="latest", queue_size=FRAME_QUEUE_SIZE, skip=0, file_path=None):
+        """
+        Args:
+            data_socket (socket): Connected data socket or data channel transfer of the video.
+            decoder (H264Decoder): Decoder with `decode`, `flush` and `convert`.
+            policy (str [default:`latest`]): `latest` or `lossless`.
+            queue_size (int [default:`4`]): Decoded frames queued for the consumer.
+            skip (int [default:`0`]): Frames left out after every delivered frame.
+            file_path (str [default:`None`]): Write the received H.264 stream to this file.
+        """
+        if policy not in FRAME_POLICIES:
+            raise ValueError(f"Unsupported policy '{policy}'. Only {', '.join(FRAME_POLICIES)} are available.")
+        if not isinstance(queue_size, int) or queue_size < 1:
+            raise ValueError(f"Invalid queue_size '{queue_size}'. Expected INTEGER: 1<=QUEUE_SIZE.")
+        if not isinstance(skip, int) or skip < 0:
+            raise ValueError(f"Invalid skip '{skip}'. Expected INTEGER: 0<=SKIP.")
+        self.data_socket = data_socket
+        self.decoder = decoder
+        self.policy = policy
+        self.skip = skip
+        self.file_path = file_path
+        self.logger = logging.getLogger("Camera")
+        self.bytes = 0
+        self.decoded = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.error = None
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._stopping = False
+        self._thread = None
+        self._decode_time = 0.0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._decode_thread, name="frame decoder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None) -> dict:
+        """Stop delivering frames and wait until the data connection ended. Returns the final `stats`."""
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.stats()
+
+    def frames(self, timeout=None):
+        """Yield `(index, arrival, frame)` of the decoded frames until the video ends. Raises the error of the decoder thread and
+        `TimeoutError` after `timeout` seconds without a frame."""
+        while True:
+            try:
+                item = self._frames.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No video frame within {timeout} seconds.")
+            if item is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            wait = time.perf_counter() - item[1]
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self.delivered += 1
+            yield item
+
+    def stats(self) -> dict:
+        """`bytes` received, frames `decoded`, `skipped`, `dropped` by the `latest` policy and `delivered`, mean decode time per frame
+        `decode_ms`, and the mean and maximum time from the arrival of a frame's last data to its delivery, `latency_ms` and `max_latency_ms`."""
+        return {"bytes": self.bytes,
+                "decoded": self.decoded,
+                "skipped": self.skipped,
+                "dropped": self.dropped,
+                "delivered": self.delivered,
+                "decode_ms": round(self._decode_time / self.decoded * 1000, 3) if self.decoded else None,
+                "latency_ms": round(self._wait_total / self.delivered * 1000, 3) if self.delivered else None,
+                "max_latency_ms": round(self._wait_max * 1000, 3),
+                "error": None if self.error is None else str(self.error)}
+
+    def _decode_thread(self):
+        file = None
+        try:
+            if self.file_path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+                file = open(self.file_path, "wb")
+            while True:
+                data = self.data_socket.recv(RECEIVE_SIZE)
+                arrival = time.perf_counter()
+                if file is not None:
+                    file.write(data)
+                if not data:
+                    self._deliver(self.decoder.flush(), arrival)
+                    break
+                self.bytes += len(data)
+                t_start = time.perf_counter()
+                frames = self.decoder.decode(data)
+                self._decode_time += time.perf_counter() - t_start
+                self._deliver(frames, arrival)
+        except Exception as e:
+            self.error = e
+            self.logger.warning(f"WARNING: Video decoding failed: {e}")
+        finally:
+            if file is not None:
+                file.close()
+            self.data_socket.close()
+            # The end of the frames must not be dropped
+            self._put(None, lossless=True)
+
+    def _deliver(self, frames, arrival):
+        for frame in frames:
+            index = self.decoded
+            self.decoded += 1
+            if self._stopping or index % (self.skip + 1):
+                self.skipped += 1
+                continue
+            self._put((index, arrival, self.decoder.convert(frame)), self.policy == "lossless")
+
+    def _put(self, item, lossless):
+        while True:
+            try:
+                if lossless:
+                    self._frames.put(item, timeout=STOP_POLL)
+                else:
+                    self._frames.put_nowait(item)
+                return
+            except queue.Full:
+                if lossless:
+                    if self._stopping and item is not None:
+                        self.skipped += 1
+                        return
+                    if self._stopping:
+                        # Nobody reads anymore, make room for the end
+                        self._drop_oldest()
+                    continue
+                self._drop_oldest()
+
+    def _drop_oldest(self):
+        try:
+            self._frames.get_nowait()
+            self.dropped += 1
+        except queue.Empty:
+            pass
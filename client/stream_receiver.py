@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+TS_PACKET = 188                         # Size of MPEG-TS packets, which start with the sync byte
+TS_SYNC = 0x47
+TS_NULL_PID = 0x1FFF                    # Stuffing packets, which carry no continuity counter
+PCR_CLOCK = 27_000_000                  # Ticks per second of the program clock reference
+JITTER_RESET = 1.0                      # Transit time jumps by more seconds restart the jitter estimate, e.g. after a PCR wrap or stream restart
+RECEIVE_BUFFER = 4 * 1024 * 1024        # Requested kernel receive buffer, which absorbs bursts of keyframes
+PACKET_QUEUE_SIZE = 256                 # Datagrams queued for the callback, the oldest are dropped first
+BITRATE_WINDOW = 1.0                    # Seconds over which the current bitrate is measured
+STOP_DRAIN = 0.1                        # Seconds `stop` keeps reading datagrams, which already arrived in the receive buffer
+
+
+class StreamReceiver:
+    """Receives the UDP MPEG-TS stream of `start_stream` and measures its quality.
+
+    Datagrams are split into TS packets, resynchronizing on the sync byte if a datagram does not hold whole packets. The
+    continuity counter of every PID counts lost packets (a lower bound, since it wraps after 16 packets). Jitter is the
+    interarrival jitter of RFC 3550 with the PCR as sender clock, smoothed over 16 samples. The received TS packets can be
+    written to a `.ts` file and handed to a `callback` on its own thread through a bounded queue, so a slow callback drops
+    queued datagrams instead of stalling the socket.
+    """
+
+    def __init__(self, port, host="", file_path=None, callback=None, queue_size=PACKET_QUEUE_SIZE):
+        """
+        Args:
+            port (int): UDP port the stream is sent to, `STREAM_PORT` of the driver.
+            host (str [default:`""`]): Local address to bind, all interfaces by default.
+            file_path (str [default:`None`]): Record the received TS packets to this file.
+            callback (callable [default:`None`]): Called with the bytes of whole TS packets of every datagram and its arrival time (`time.perf_counter`).
+            queue_size (int [default:`256`]): Datagrams queued for `callback`.
+        """
+        self.port = port
+        self.host = host
+        self.file_path = file_path
+        self.callback = callback
+        self.logger = logging.getLogger("Camera")
+        self._socket = None
+        self._file = None
+        self._packets = queue.Queue(maxsize=queue_size)
+        self._running = False
+        self._stop_at = None
+        self._threads = []
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.datagrams = 0
+        self.bytes = 0
+        self.packets = 0
+        self.lost = 0
+        self.loss_events = 0
+        self.duplicates = 0
+        self.sync_errors = 0
+        self.transport_errors = 0
+        self.queue_dropped = 0
+        self.jitter = None
+        self.max_gap = 0.0
+        self._counters = {}
+        self._carry = b""
+        self._last_transit = None
+        self._first_arrival = None
+        self._last_arrival = None
+        self._window_start = None
+        self._window_bytes = 0
+        self._bitrate = None
+
+    def _open(self):
+        """Reset the stats, bind the UDP port and open the recording."""
+        self._reset_stats()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        self._socket.bind((self.host, self.port))
+        if self.file_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+            self._file = open(self.file_path, "wb", buffering=TS_PACKET * 4096)
+
+    def _close(self):
+        self._socket.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def start(self):
+        """Bind the UDP port and start receiving."""
+        if self._running:
+            return
+        self._open()
+        # Wake up regularly to notice `stop`
+        self._socket.settimeout(0.2)
+        self._running = True
+        self._stop_at = None
+        self._threads = [threading.Thread(target=self._receive_thread, name="stream receiver", daemon=True)]
+        if self.callback is not None:
+            self._threads.append(threading.Thread(target=self._callback_thread, name="stream callback", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        self.logger.debug(f"Receiving UDP stream on port {self.port}")
+
+    def stop(self) -> dict:
+        """Stop receiving, close the recording and return the final `stats`."""
+        if self._running:
+            self._running = False
+            self._stop_at = time.perf_counter() + STOP_DRAIN
+            self._threads[0].join()
+            if self.callback is not None:
+                # The callback thread handles the queued datagrams first
+                self._packets.put(None)
+                self._threads[1].join()
+            self._threads = []
+            self._close()
+        return self.stats()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stats(self) -> dict:
+        """Stream quality so far: counts of datagrams, bytes and TS packets, `lost` packets, `loss_ratio`, `jitter_ms`
+        (`None` before two PCRs arrived), the longest gap between datagrams `max_gap_ms`, and the average and current bitrate."""
+        elapsed = (self._last_arrival - self._first_arrival) if self.datagrams > 1 else 0.0
+        expected = self.packets + self.lost
+        return {"datagrams": self.datagrams,
+                "bytes": self.bytes,
+                "packets": self.packets,
+                "lost": self.lost,
+                "loss_events": self.loss_events,
+                "loss_ratio": round(self.lost / expected, 6) if expected else 0.0,
+                "duplicates": self.duplicates,
+                "sync_errors": self.sync_errors,
+                "transport_errors": self.transport_errors,
+                "queue_dropped": self.queue_dropped,
+                "jitter_ms": None if self.jitter is None else round(self.jitter * 1000, 3),
+                "max_gap_ms": round(self.max_gap * 1000, 3),
+                "bitrate_bps": round(self.bytes * 8 / elapsed) if elapsed > 0 else None,
+                "current_bitrate_bps": None if self._bitrate is None else round(self._bitrate),
+                "duration_s": round(elapsed, 3)}
+
+    def _receive_thread(self):
+        while self._stop_at is None or time.perf_counter() < self._stop_at:
+            try:
+                data = self._socket.recv(65536)
+            except socket.timeout:
+                if self._stop_at is not None:
+                    break
+                continue
+            except OSError as e:
+                self.logger.warning(f"WARNING: UDP stream receiver stopped: {e}")
+                break
+            arrival = time.perf_counter()
+            packets = self._receive(data, arrival)
+            if packets and self.callback is not None:
+                while True:
+                    try:
+                        self._packets.put_nowait((packets, arrival))
+                        break
+                    except queue.Full:
+                        try:
+                            self._packets.get_nowait()
+                            self.queue_dropped += 1
+                        except queue.Empty:
+                            pass
+
+    def _callback_thread(self):
+        while True:
+            item = self._packets.get()
+            if item is None:
+                return
+            try:
+                self.callback(*item)
+            except Exception as e:
+                self.logger.warning(f"WARNING: Stream callback failed: {e}")
+
+    def _receive(self, data, arrival) -> bytes:
+        """Count, check and record one datagram. Returns its whole TS packets."""
+        self._count_datagram(len(data), arrival)
+        packets = self._parse(data, arrival)
+        if packets and self._file is not None:
+            self._file.write(packets)
+        return packets
+
+    def _count_datagram(self, size, arrival):
+        self.datagrams += 1
+        self.bytes += size
+        if self._first_arrival is None:
+            self._first_arrival = self._window_start = arrival
+        else:
+            self.max_gap = max(self.max_gap, arrival - self._last_arrival)
+        self._last_arrival = arrival
+        self._window_bytes += size
+        if arrival - self._window_start >= BITRATE_WINDOW:
+            self._bitrate = self._window_bytes * 8 / (arrival - self._window_start)
+            self._window_start = arrival
+            self._window_bytes = 0
+
+    def _parse(self, data, arrival) -> bytes:
+        """Check the TS packets of a datagram, prefixed by the incomplete packet left over from the previous one. Returns the whole packets."""
+        if self._carry:
+            data = self._carry + data
+        runs = []
+        run = position = 0
+        while position + TS_PACKET <= len(data):
+            if data[position] != TS_SYNC:
+                # Lost sync, skip to the next sync byte
+                self.sync_errors += 1
+                runs.append(data[run:position])
+                position = data.find(TS_SYNC, position + 1)
+                if position < 0:
+                    self._carry = b""
+                    return b"".join(runs)
+                run = position
+                continue
+            self._check_packet(data, position, arrival)
+            position += TS_PACKET
+        self._carry = data[position:]
+        if not runs:
+            return data[run:position]
+        runs.append(data[run:position])
+        return b"".join(runs)
+
+    def _check_packet(self, data, position, arrival):
+        self.packets += 1
+        flags = data[position + 1]
+        if flags & 0x80:
+            self.transport_errors += 1
+        pid = ((flags & 0x1F) << 8) | data[position + 2]
+        if pid == TS_NULL_PID:
+            return
+        control = data[position + 3]
+        counter = control & 0x0F
+        adaptation = control & 0x20 and data[position + 4] > 0
+        discontinuity = adaptation and data[position + 5] & 0x80
+        if adaptation and data[position + 5] & 0x10 and data[position + 4] >= 7:
+            self._check_pcr(data, position + 6, arrival)
+
+        # The counter only advances on packets with payload, one duplicate of a packet is allowed
+        if not control & 0x10:
+            return
+        previous = self._counters.get(pid)
+        self._counters[pid] = counter
+        if previous is None or discontinuity:
+            return
+        if counter == previous:
+            self.duplicates += 1
+            return
+        missing = (counter - previous - 1) & 0x0F
+        if missing:
+            self.lost += missing
+            self.loss_events += 1
+
+    def _check_pcr(self, data, position, arrival):
+        """Update the interarrival jitter with the PCR at `position` as send time."""
+        base = int.from_bytes(data[position:position + 4], "big") << 1 | data[position + 4] >> 7
+        pcr = base * 300 + ((data[position + 4] & 0x01) << 8 | data[position + 5])
+        transit = arrival - pcr / PCR_CLOCK
+        if self._last_transit is not None:
+            difference = abs(transit - self._last_transit)
+            if difference > JITTER_RESET:
+                # PCR wrap or stream restart, the transit time of both sides is no longer comparable
+                self._last_transit = transit
+                return
+            self.jitter = difference if self.jitter is None else self.jitter + (difference - self.jitter) / 16
+        self._last_transit = transit
+
+
+class AsyncStreamReceiver(StreamReceiver):
+    """`StreamReceiver` on the asyncio event loop instead of its own threads, for `AsyncCameraDriver`. The `callback` is called
+    on the event loop and must return quickly, `queue_size` is not used."""
+
+    async def start(self):
+        """Bind the UDP port and start receiving on the running event loop."""
+        if self._running:
+            return
+        self._open()
+        self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: _DatagramProtocol(self), sock=self._socket)
+        self._running = True
+        self.logger.debug(f"Receiving UDP stream on port {self.port}")
+
+    def stop(self) -> dict:
+        """Stop receiving, close the recording and return the final `stats`. Datagrams already received by the event loop were counted."""
+        if self._running:
+            self._running = False
+            self._transport.close()
+            self._close()
+        return self.stats()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _datagram(self, data, arrival):
+        packets = self._receive(data, arrival)
+        if packets and self.callback is not None:
+            try:
+                self.callback(packets, arrival)
+            except Exception as e:
+                self.logger.warning(f"WARNING: Stream callback failed: {e}")
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver._datagram(data, time.perf_counter())
+
+    def error_received(self, exc):
+        self.receiver.logger.warning(f"WARNING: UDP stream receiver error: {exc}")
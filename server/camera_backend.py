@@ -0,0 +1,87 @@
+class CameraBackend:
+    """Interface between `CameraServer` and the camera hardware.
+
+    The server only talks to the camera through these methods, always from its single camera thread (callbacks
+    excepted). `Picamera2Backend` drives the Raspberry Pi camera, `FakeCamera` produces synthetic frames and a
+    H.264-like byte stream, so the server runs on any machine.
+    """
+
+    # ======= STILL CAPTURES ======= #
+
+    def create_still_configuration(self, size, pixel_format, lores_size=None, crop=None):
+        """Return a configuration for still captures of the main stream with the given `(width, height)` and pixel format,
+        with a YUV420 low resolution stream of `lores_size` next to it unless it is `None`. `crop` limits all streams to the region
+        `(x, y, width, height)` of the sensor's field of view in fractions `0.0`-`1.0`, which is scaled to the stream sizes; `None` is the whole field of view."""
+        raise NotImplementedError
+
+    def configure(self, config):
+        """Apply a configuration created by `create_still_configuration`. The camera must be stopped."""
+        raise NotImplementedError
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def autofocus_cycle(self) -> bool:
+        """Run one autofocus cycle. Returns `False` if focusing failed."""
+        raise NotImplementedError
+
+    def set_lens_position(self, position: float):
+        """Switch to manual focus at the given lens position (`0.0`-`10.0`)."""
+        raise NotImplementedError
+
+    def lens_position(self) -> float:
+        """Return the current lens position, e.g. where the last autofocus cycle converged, or `None` if the camera does not report it."""
+        raise NotImplementedError
+
+    def capture_file(self, file, format: str):
+        """Capture the next frame and write it encoded as `format` (`jpeg`, `png`, `bmp`, or `gif`) into the open binary `file`."""
+        raise NotImplementedError
+
+    def capture_array(self, name: str = "main"):
+        """Capture the next frame of the stream as NumPy array."""
+        raise NotImplementedError
+
+    def capture_lores(self):
+        """Capture the Y plane of the next frame of the low resolution stream as 2D `uint8` array."""
+        raise NotImplementedError
+
+    # ======= VIDEO ======= #
+
+    def configure_video(self, size, lores_size, crop=None, grayscale=False):
+        """Configure a video main stream of `size` with a YUV420 low resolution stream of `lores_size`. The camera must be stopped.
+        `crop` limits the field of view like in `create_still_configuration`, `grayscale` removes the colour until the camera
+        stops. The encoder still gets the chroma planes, so this lowers the bitrate, not the encoder load.
+
+        Returns:
+            lores_size (tuple): Actual size of the low resolution stream, which may be aligned by the camera.
+        """
+        raise NotImplementedError
+
+    def set_lores_callback(self, callback):
+        """Call `callback(luma)` with the Y plane of every low resolution frame as 2D `uint8` array, or stop with `None`.
+        Applies to every configuration with a low resolution stream, still and video, and stays set across reconfiguration.
+        The array is only valid during the call. The callback runs on the camera's frame thread and must not block."""
+        raise NotImplementedError
+
+    def start_encoder(self, on_frame, on_stream, iperiod: int):
+        """Start a H.264 encoder on the running video configuration, with a keyframe every `iperiod` frames that repeats the sequence headers.
+
+        Args:
+            on_frame (callable): Called with `(frame, keyframe, timestamp)` for every encoded frame from the encoder thread. `frame` is only valid during the call.
+            on_stream (callable): Called with the stream information for muxing outputs (`_add_stream` arguments of Picamera2 outputs) when the encoder starts.
+        """
+        raise NotImplementedError
+
+    def stop_encoder(self):
+        raise NotImplementedError
+
+    def create_output(self, target: str, format: str = None):
+        """Return an output for a file path or URL, which muxes into the container `format` (e.g. `mpegts`, `mp4`) or writes the raw stream if `format` is `None`.
+        The output follows the Picamera2 output interface (`start`, `stop`, `outputframe`, `_add_stream`)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
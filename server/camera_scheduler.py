@@ -0,0 +1,79 @@
+import asyncio
+import contextlib
+import functools
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CameraScheduler:
+    """Arbitrates access to the single Picamera2 instance between sessions.
+
+    Sessions queue for the camera with `access()`. Waiting sessions are served round robin, requests of the same
+    session in FIFO order, so a busy controller cannot starve the others. All blocking camera calls go through
+    `call()`, which runs them on one dedicated camera thread.
+    """
+
+    def __init__(self):
+        self.owner = None
+        self._waiters = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="camera")
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for the camera."""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self, session):
+        """Wait until `session` is granted exclusive access to the camera."""
+        if self.owner is None and not self._waiters:
+            self.owner = session
+            return
+        grant = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(session, deque()).append(grant)
+        try:
+            await grant
+        except asyncio.CancelledError:
+            if grant.done() and not grant.cancelled():
+                self.release(session)
+            else:
+                waiters = self._waiters.get(session)
+                if waiters and grant in waiters:
+                    waiters.remove(grant)
+                    if not waiters:
+                        del self._waiters[session]
+            raise
+
+    def release(self, session):
+        """Give the camera to the next waiting session."""
+        if self.owner is not session:
+            return
+        self.owner = None
+        while self._waiters:
+            waiting_session, waiters = next(iter(self._waiters.items()))
+            grant = waiters.popleft()
+            if waiters:
+                # Sessions with further requests go to the back of the round
+                self._waiters.move_to_end(waiting_session)
+            else:
+                del self._waiters[waiting_session]
+            if not grant.done():
+                self.owner = waiting_session
+                grant.set_result(None)
+                return
+
+    @contextlib.asynccontextmanager
+    async def access(self, session):
+        """Hold the camera for the duration of the `async with` block."""
+        await self.acquire(session)
+        try:
+            yield
+        finally:
+            self.release(session)
+
+    async def call(self, fn, *args, **kwargs):
+        """Run a blocking camera function on the camera thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -4,21 +4,200 @@
 CMD_PORT    = 8000      # TCP port for control commands
 DATA_PORT   = 8001      # TCP port for file transfers
 STREAM_PORT = 8002      # (unused here, reserved for future streaming)
+PROTOCOL_VERSION = 2    # Highest framed command protocol version spoken by this server, 2 adds the data channel
+CONFIG_CACHE_SIZE = 4   # Number of camera configurations kept for persistent (warm) captures
+MAX_BURST_COUNT = 1000  # Upper limit of frames per 'capture_burst' command
+DATA_TIMEOUT = 30.0     # Seconds to wait for the client to open its data connection
+DATA_HELLO_TIMEOUT = 0.25  # Seconds to wait for a data connection to name its session before it is treated as a legacy client
+LISTEN_BACKLOG = 256    # Pending connections per listening port, so hundreds of clients connecting at once are not held back by SYN-ACK retransmits
+RING_MAX_BYTES = 64 * 1024 * 1024  # Default memory budget of the pre-trigger video ring buffer
+VIDEO_IPERIOD = 15      # Frames between keyframes of the shared video encoder, i.e. how fast new video consumers join and the granularity of clip starts
+SINK_QUEUE_SIZE = 60    # Frames queued per video consumer before a slow consumer drops frames up to the next keyframe
+SINK_CLOSE_TIMEOUT = 5.0  # Seconds a stopped video consumer may take to write its queued frames
+RECORDING_DIR = "recordings"  # Directory of video files recorded on the server
+VIDEO_SIZE = (1280, 720)  # Main stream size of the video pipeline, if it is started by a low resolution consumer (e.g. code scanning)
+LORES_SIZE = (640, 360)   # Low resolution stream of the video pipeline, used for code scanning
+SCAN_WORKERS = 1        # Worker processes decoding QR codes and barcodes
+MOTION_FILE_PATTERN = "motion_%Y%m%d_%H%M%S"  # Name of the recordings of motion events in RECORDING_DIR, followed by the event number
+FOCUS_TTL = 600.0       # Seconds a converged lens position of a focus profile is reused before the autofocus cycle runs again
+FOCUS_SHARPNESS_RATIO = 0.8  # Autofocus runs again, if the lores sharpness at the cached lens position drops below this fraction of its reference
+FOCUS_SETTLE_FRAMES = 3 # Frames the lens gets to move to a cached position before the sharpness check
+FOCUS_LORES_WIDTH = 320 # Width of the low resolution stream of still configurations, used for sharpness checks and previews
+MAX_FOCUS_PROFILES = 32 # Focus profiles kept, the least recently used is dropped first
+PREVIEW_MAX_AGE = 0.5   # Default age in seconds up to which previews are served from the last frame and its cached encodings
+PREVIEW_IDLE_TIMEOUT = 10.0  # Seconds without preview requests, after which previews stop and a camera started for them is stopped again
+PREVIEW_QUALITY = 75    # Default JPEG quality of previews
+SPOOL_DIR = "spool"     # Directory of the time-lapse spool on the server
+SPOOL_MAX_BYTES = 1024 * 1024 * 1024  # Default disk quota of the time-lapse spool, the oldest frames are evicted beyond it
+TIMELAPSE_WARM_INTERVAL = 10.0  # Time-lapses with shorter intervals keep the camera running between captures by default
+MAX_SPOOL_LIST = 10000  # Upper limit of frames per 'list_spool' and 'fetch_spool' command
+METRICS_HOST = "127.0.0.1"  # Interface of the Prometheus metrics endpoint
+METRICS_PORT = None     # Local port serving the metrics in Prometheus text format, None disables the endpoint
 #===============================================================================
 
+import asyncio
+import contextlib
 import socket
-import threading
-import json
+import struct
 import io
-import picamera2
-from picamera2.encoders import H264Encoder
-from picamera2.outputs import FileOutput, PyavOutput
-from libcamera import controls
-# from qreader import QReader
+import os
+import argparse
+import numpy as np
 import time
+from collections import OrderedDict
+from camera_backend import CameraBackend
+from camera_scheduler import CameraScheduler
+from code_scanner import CodeScanner, create_decoder_pool
+from focus_cache import FocusCache, focus_sharpness
+from metrics import Metrics, PhaseTimer, serve_prometheus
+from motion_detector import MotionDetector
+from preview import LatestFrame, PreviewCache, encode_jpeg
+from session import RETAIN_TIMEOUT, DataConnection, DataPortDispatcher, Session
+from timelapse import TAR_END, Spool, TimelapseJob, tar_header, tar_padding
+from video_fanout import ConnectionSink, OutputSink, RingSink, VideoFanout
+from video_ring import VideoRing
+
+# Header in front of every frame of a burst transfer: frame index, payload size, capture timestamp (unix seconds)
+FRAME_HEADER = struct.Struct("!IQd")
+# Pixel formats of the main stream, that can be sent as raw arrays
+ARRAY_FORMATS = ("RGB888", "BGR888", "XRGB8888", "XBGR8888", "YUV420")
+# Pixel format of the main stream of the video pipeline, and the memory order of the channels of the formats its frames are converted into
+VIDEO_FORMAT = "XBGR8888"
+CHANNEL_ORDER = {"RGB888": "BGR", "BGR888": "RGB", "XRGB8888": "BGRX", "XBGR8888": "RGBX"}
+# Actions a session may send while it has active video consumers; everything else needs the camera
+VIDEO_ACTIONS = ("hello", "template_action", "capture", "capture_array", "start_video", "stop_video", "start_stream", "stop_stream",
+                 "start_recording", "stop_recording", "start_ring_buffer", "stop_ring_buffer", "save_clip", "video_status",
+                 "start_scan", "stop_scan", "start_motion", "stop_motion", "read_qrcode", "read_barcode", "clear_focus", "get_metrics", "preview", "resume_transfer",
+                 "start_timelapse", "stop_timelapse", "timelapse_status", "list_spool", "fetch_spool", "delete_spool")
+# Formats of the 'preview' command: grayscale JPEG or the raw luminance plane
+PREVIEW_FORMATS = ("jpeg", "raw")
+# Container formats of server side recordings by file extension, everything else is written as raw H.264
+RECORDING_CONTAINERS = {".mp4": "mp4", ".mkv": "matroska", ".ts": "mpegts"}
+
+
+def _region_size(size, roi=None, binning=1):
+    """Size of a stream of `size` cropped to the field of view `roi` and reduced by `binning`: the same pixel density on a smaller region, both even."""
+    width, height = size
+    if roi is not None:
+        width, height = width * roi[2], height * roi[3]
+    return max(2, int(width / binning) // 2 * 2), max(2, int(height / binning) // 2 * 2)
+
+
+def _lores_video_size(size):
+    """Size of the low resolution stream next to a video main stream: `LORES_SIZE`, at most the main stream size."""
+    return min(LORES_SIZE[0], size[0]), min(LORES_SIZE[1], size[1])
+
+
+def _encode_luma(luma: np.ndarray, file, fmt: str):
+    """Encode a grayscale frame as `fmt` (`jpeg`, `png`, `bmp`, or `gif`) with Pillow, which Picamera2 already depends on, into the open binary `file`."""
+    from PIL import Image
+    Image.fromarray(np.ascontiguousarray(luma), "L").save(file, fmt.upper())
+
+
+def _lores_still_size(size):
+    """Size of the low resolution stream next to a still main stream: `FOCUS_LORES_WIDTH` wide (at most the main width) with the aspect ratio of the main stream, both even."""
+    width, height = size
+    lores_width = max(2, min(FOCUS_LORES_WIDTH, width) // 2 * 2)
+    lores_height = max(2, round(lores_width * height / max(width, 1) / 2) * 2)
+    return lores_width, lores_height
+
+
+def _array_payload(array: np.ndarray):
+    """Return a flat byte view of the memory spanned by `array` together with the strides to rebuild it, without copying.
+    Row padding between the rows of a sliced array is part of the payload and skipped again by the strides on the client."""
+    if array.flags.c_contiguous:
+        return memoryview(array).cast("B"), array.strides
+    if array.ndim < 2 or not array[0].flags.c_contiguous or array.strides[0] <= 0:
+        array = np.ascontiguousarray(array)
+        return memoryview(array).cast("B"), array.strides
+    span = (array.shape[0] - 1) * array.strides[0] + array[0].nbytes
+    flat = np.lib.stride_tricks.as_strided(array, shape=(span // array.itemsize,), strides=(array.itemsize,), writeable=False)
+    return memoryview(flat).cast("B"), array.strides
+
+
+def _convert_channels(array: np.ndarray, source: str, target: str) -> np.ndarray:
+    """Reorder the channels of an array of pixel format `source` into pixel format `target`. Dropping trailing channels returns a view, reordering copies."""
+    if source == target:
+        return array
+    order = [CHANNEL_ORDER[source].index(channel) for channel in CHANNEL_ORDER[target]]
+    if order == list(range(len(order))):
+        return array[..., :len(order)]
+    return array[..., order]
+
+
+def create_backend(name: str, fps: float = 30.0) -> CameraBackend:
+    """Create the camera backend `picamera2` (Raspberry Pi camera) or `fake` (synthetic frames, no camera needed).
+    The backends are imported on demand, so the server runs without Picamera2 installed when the fake camera is used."""
+    if name == "picamera2":
+        from picamera2_backend import Picamera2Backend
+        return Picamera2Backend()
+    if name == "fake":
+        from fake_camera import FakeCamera
+        return FakeCamera(fps=fps)
+    raise ValueError(f"Unsupported camera backend '{name}'. Only 'picamera2' and 'fake' are available.")
+
+
+class VideoPipeline:
+    """The camera running in video configuration with a main and a low resolution stream, cropped to the field of view `crop` and optionally without colour.
+    It holds the camera while any user (the shared encoder, code scanners) is attached."""
+
+    def __init__(self, size, crop=None, grayscale=False):
+        self.size = tuple(size)
+        self.crop = crop
+        self.grayscale = grayscale
+        self.users = set()
+
+
+class Recording:
+    """An active video consumer of a session (`video`, `stream`, `recording`, `scan`, or `motion`), which keeps the video pipeline running until it is stopped."""
+
+    def __init__(self, kind: str, sink, data_connection: DataConnection = None):
+        self.kind = kind
+        self.sink = sink
+        self.data_connection = data_connection
+
 
 class CameraServer:
-    def __init__(self, cmd_port: int, data_port: int, STREAM_PORT: int):
+    def __init__(self, cmd_port: int, data_port: int, STREAM_PORT: int, config_cache_size: int = CONFIG_CACHE_SIZE, camera: CameraBackend = None, metrics_port: int = METRICS_PORT, spool_dir: str = SPOOL_DIR):
+        # Camera backend, the Raspberry Pi camera is opened in `start` if none is given
+        self.camera = camera
+        # Camera state for persistent (warm) captures
+        self.config_cache_size = config_cache_size
+        self._config_cache = OrderedDict()
+        self._active_config = None
+        # Converged lens positions of named focus profiles
+        self.focus_cache = FocusCache(FOCUS_TTL, MAX_FOCUS_PROFILES)
+        # Connected sessions by session id
+        self.sessions = {}
+        self.data_dispatcher = DataPortDispatcher(self.sessions, DATA_HELLO_TIMEOUT)
+        self._tasks = set()
+        # Per-phase timing histograms of all actions, optionally served to Prometheus
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        # Video pipeline, holds the camera while the shared encoder or a low resolution consumer is attached
+        self.pipeline = None
+        self.fanout = None
+        self._lores_consumers = []
+        self._lores_size = LORES_SIZE
+        self._video_lock = None
+        self._decoder_pool = None
+        # Recordings of running motion events by detector, started and stopped one at a time
+        self._motion_recordings = {}
+        self._motion_lock = None
+        # Previews from the low resolution stream of any running configuration, with encodings shared between clients
+        self.preview_frame = LatestFrame()
+        self.preview_cache = PreviewCache()
+        self._preview_requested = 0.0
+        self._preview_task = None
+        self._preview_config = None
+        # Pre-trigger video ring buffer, one consumer of the shared encoder
+        self.ring = None
+        self._ring_sink = None
+        # Time-lapse captured on the server into an on-disk spool, which is opened on first use
+        self.spool_dir = spool_dir
+        self.spool = None
+        self.timelapse = None
+        self._timelapse_task = None
         # Socket configuration
         self.CMD_PORT  = cmd_port
         self.DATA_PORT = data_port
@@ -27,301 +206,1795 @@ class CameraServer:
         self.cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.cmd_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.cmd_socket.bind(("", self.CMD_PORT))
-        self.cmd_socket.listen(5)
+        self.cmd_socket.listen(LISTEN_BACKLOG)
         print(f"[Server] Command server listening on port {self.CMD_PORT}")
         # Listening server TCP socket for file transfer
         self.data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.data_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.data_socket.bind(("", self.DATA_PORT))
-        self.data_socket.listen(5)
+        self.data_socket.listen(LISTEN_BACKLOG)
+        self.data_socket.setblocking(False)
 
     def start(self):
-        """Initialize Picamera and start accepting control‐connection requests."""
-        self.camera = picamera2.Picamera2()
+        """Initialize the camera and serve control‐connection requests until interrupted."""
+        if self.camera is None:
+            self.camera = create_backend("picamera2")
+        # Every configuration has a low resolution stream, its frames always go to the lores consumers
+        self.camera.set_lores_callback(self._on_lores)
+        self.scheduler = CameraScheduler()
         try:
-            while True:
-                self.conn, self.addr = self.cmd_socket.accept()
-                thread = threading.Thread(target=self.handle_client, daemon=True)
-                thread.start()
+            asyncio.run(self.serve())
         except KeyboardInterrupt:
             print("\n[Server] Shutting down...")
         finally:
+            self.scheduler.shutdown()
+            if self._decoder_pool is not None:
+                self._decoder_pool.shutdown(cancel_futures=True)
+            self.release_camera()
             self.camera.close()
             self.cmd_socket.close()
+            self.data_socket.close()
+
+
+    async def serve(self):
+        """Accept control connections and data connections on the event loop. Every control connection gets its own `Session`."""
+        self._video_lock = asyncio.Lock()
+        self._motion_lock = asyncio.Lock()
+        cmd_server = await asyncio.start_server(self.handle_client, sock=self.cmd_socket)
+        self._spawn(self._accept_data_connections())
+        if self.metrics_port is not None:
+            await serve_prometheus(self.metrics, METRICS_HOST, self.metrics_port)
+            print(f"[Server] Prometheus metrics on http://{METRICS_HOST}:{self.metrics_port}/metrics")
+        async with cmd_server:
+            await cmd_server.serve_forever()
+
+
+    def _spawn(self, coro):
+        """Run a background task and keep a reference to it until it is done."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+    async def _accept_data_connections(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            sock, addr = await loop.sock_accept(self.data_socket)
+            sock.setblocking(False)
+            self._spawn(self.data_dispatcher.route(DataConnection(sock, addr)))
 
 
-    def handle_client(self):
-        """Handles a JSON‐encoded command from the cmd_socket.
+    async def handle_client(self, reader, writer):
+        """Handles the JSON‐encoded commands of one control connection.
         1. Read a JSON command from the client.
         2. Dispatch to the appropriate action method.
         3. Send back a JSON‐encoded response.
         """
-        client_ip, _ = self.addr
+        session = Session(reader, writer)
+        self.sessions[session.id] = session
+        client_ip = session.addr[0]
         print(f"[Server] Connected from {client_ip}")
 
         try:
             while True:
-                raw = self.conn.recv(2048)
-                if not raw:
-                    # Client closed the connection
-                    break
-
                 try:
-                    cmd_obj = json.loads(raw.decode("utf‐8"))
-                except json.JSONDecodeError:
-                    raise TypeError("Invalid JSON command.")
-
-                action = cmd_obj.get("action")
-                args   = cmd_obj.get("args")
-
-                if action == "template_action":
-                    self.template_action(**args)
-
-                elif action == "capture":
-                    self.capture(**args)
-                    
-                elif action == "start_video":
-                    self.start_video(**args)
-                    
-                elif action == "stop_video":
-                    warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_video' can only be excecuted, if 'start_video' was called before."}}
-                    self.conn.sendall(json.dumps(warn_reply).encode("utf‐8"))
-                    
-                elif action == "read_barcode":
-                    self.read_barcode(**args)
-                    
-                elif action == "read_qrcode":
-                    self.read_qrcode(**args)
-                    
-                elif action == "start_stream":
-                    self.start_stream(**args)
-
-                elif action == "stop_stream":
-                    warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_stream' can only be excecuted, if 'start_start' was called before."}}
-                    self.conn.sendall(json.dumps(warn_reply).encode("utf‐8"))
-
-                else:
-                    raise ValueError(f"Unknown action '{action}'.")
+                    cmd_obj = await session.recv_message()
+                    if cmd_obj is None:
+                        # Client closed the connection
+                        break
+                    session.timer = PhaseTimer()
+                    failed = True
+                    try:
+                        await self.dispatch(session, cmd_obj)
+                        failed = False
+                    finally:
+                        self.metrics.record(cmd_obj.get("action"), session.timer, failed)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    # Report the failed command and keep serving the connection
+                    err = {"status": "error",
+                           "details": {"error_message": str(e)}}
+                    await session.send_message(err)
 
         except Exception as e:
-            err = {"status": "error",
-                   "details": {"error_message": str(e)}}
-            try:
-                self.conn.sendall(json.dumps(err).encode("utf‐8"))
-            except:
-                pass
+            print(f"[Server] Connection with {client_ip} failed: {e}")
 
         finally:
-            self.conn.close()
+            for kind in list(session.recordings):
+                try:
+                    await self._stop_consumer(session, kind)
+                except Exception as e:
+                    print(f"[Server] Stopping the {kind} of {client_ip} failed: {e}")
+            del self.sessions[session.id]
+            session.close()
             print(f"[Server] Connection with {client_ip} closed.")
 
-    # ======= CAMERA METHODS ======= #
 
-    def template_action(self, test_int):
-        cmd_reply = {"status": "template_action executed",
-                 "details": {"test_int": test_int}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
-        
+    async def dispatch(self, session, cmd_obj):
+        """Call the action method requested by a decoded JSON command."""
+        action = cmd_obj.get("action")
+        args   = cmd_obj.get("args") or {}
 
-    def capture(self, file_format, resolution, autofocus, focus_length):
-        """Capture a single still image and transferrs the raw data to the client via data socket.
-        
-        Args:
-            file_format (str): Supported are the following file formats: `jpeg`, `png`, `bmp`, and `gif`.
-            resolution (tuple): Width and height integer duple. Example: `(1280, 720)`
-            autofocus (bool): Triggers standard autofocus cycle of Picamera2. (`True`: 'autofocus on', `False`: 'autofocus off')
-            focus_length (float): Lens position must only set manually, if before `autofocus=False`. Value range between `0.0`-`10.0`. See Picamera2 manual for more information.
+        if session.recordings and action not in VIDEO_ACTIONS:
+            allowed = "', '".join(f"stop_{kind}" for kind in session.recordings)
+            warn_reply = {"status": "warning",
+                          "details": {"warning_message": f"Command '{cmd_obj}' could not be excecuted, because of active action. Allowed action: '{allowed}'"}}
+            await session.send_message(warn_reply)
+
+        elif action == "hello":
+            version = min(int(args.get("protocol") or 0), PROTOCOL_VERSION)
+            await session.send_message({"status": "hello", "details": {"protocol": version, "session": session.id}})
+            session.framed = version >= 1
+            session.protocol = version
+
+        elif action == "template_action":
+            await self.template_action(session, **args)
+
+        elif action == "capture":
+            await self.capture(session, **args)
+            
+        elif action == "release_camera":
+            async with self._camera_access(session):
+                with session.timer.phase("release"):
+                    await self.scheduler.call(self.release_camera)
+            cmd_reply = {"status": "Camera released.", "details": {}}
+            await session.send_message(cmd_reply)
+
+        elif action == "capture_array":
+            await self.capture_array(session, **args)
+
+        elif action == "capture_burst":
+            await self.capture_burst(session, **args)
+
+        elif action == "start_video":
+            await self.start_video(session, **args)
             
+        elif action == "stop_video":
+            if "video" in session.recordings:
+                await self.stop_video(session)
+            else:
+                warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_video' can only be excecuted, if 'start_video' was called before."}}
+                await session.send_message(warn_reply)
+            
+        elif action == "start_ring_buffer":
+            await self.start_ring_buffer(session, **args)
+
+        elif action == "stop_ring_buffer":
+            await self.stop_ring_buffer(session)
+
+        elif action == "save_clip":
+            await self.save_clip(session, **args)
+
+        elif action == "read_barcode":
+            await self.read_barcode(session, **args)
+            
+        elif action == "read_qrcode":
+            await self.read_qrcode(session, **args)
+            
+        elif action == "start_stream":
+            await self.start_stream(session, **args)
+
+        elif action == "stop_stream":
+            if "stream" in session.recordings:
+                await self.stop_stream(session)
+            else:
+                warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_stream' can only be excecuted, if 'start_start' was called before."}}
+                await session.send_message(warn_reply)
+
+        elif action == "start_recording":
+            await self.start_recording(session, **args)
+
+        elif action == "stop_recording":
+            if "recording" in session.recordings:
+                await self.stop_recording(session)
+            else:
+                warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_recording' can only be excecuted, if 'start_recording' was called before."}}
+                await session.send_message(warn_reply)
+
+        elif action == "start_scan":
+            await self.start_scan(session, **args)
+
+        elif action == "stop_scan":
+            if "scan" in session.recordings:
+                await self.stop_scan(session)
+            else:
+                warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_scan' can only be excecuted, if 'start_scan' was called before."}}
+                await session.send_message(warn_reply)
+
+        elif action == "start_motion":
+            await self.start_motion(session, **args)
+
+        elif action == "stop_motion":
+            if "motion" in session.recordings:
+                await self.stop_motion(session)
+            else:
+                warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_motion' can only be excecuted, if 'start_motion' was called before."}}
+                await session.send_message(warn_reply)
+
+        elif action == "preview":
+            await self.preview(session, **args)
+
+        elif action == "clear_focus":
+            await self.clear_focus(session, **args)
+
+        elif action == "resume_transfer":
+            await self.resume_transfer(session, **args)
+
+        elif action == "get_metrics":
+            await self.get_metrics(session, **args)
+
+        elif action == "start_timelapse":
+            await self.start_timelapse(session, **args)
+
+        elif action == "stop_timelapse":
+            await self.stop_timelapse(session)
+
+        elif action == "timelapse_status":
+            await self.timelapse_status(session)
+
+        elif action == "list_spool":
+            await self.list_spool(session, **args)
+
+        elif action == "fetch_spool":
+            await self.fetch_spool(session, **args)
+
+        elif action == "delete_spool":
+            await self.delete_spool(session, **args)
+
+        elif action == "video_status":
+            status = self.fanout.status() if self.fanout is not None else {"resolution": None, "frames": 0, "sinks": []}
+            await session.send_message({"status": "Video status", "details": status})
+
+        else:
+            raise ValueError(f"Unknown action '{action}'.")
+
+    # ======= CAMERA STATE ======= #
+    # The following methods block and must only be called on the camera thread through `self.scheduler.call`.
+
+    def _still_configuration(self, size, pixel_format="BGR888", crop=None):
+        """Return a still configuration for the given main stream size, pixel format and field of view `crop`, with a small low resolution stream next to it for sharpness checks and previews.
+        Already built configurations are kept in a small LRU cache."""
+        key = ("still", tuple(size), pixel_format, crop)
+        if key in self._config_cache:
+            self._config_cache.move_to_end(key)
+        else:
+            self._config_cache[key] = self.camera.create_still_configuration(size, pixel_format, _lores_still_size(size), crop)
+            while len(self._config_cache) > self.config_cache_size:
+                self._config_cache.popitem(last=False)
+        return key, self._config_cache[key]
+
+
+    def acquire_camera(self, size, pixel_format="BGR888", crop=None):
+        """Configure and start the camera for still captures, unless it already runs with identical settings from a previous persistent capture.
+
         Returns:
-            status_dictonary (dict): `details` key provides information regarding `file_name`, `file_size`
+            timings (dict): Time in milliseconds spent on `configure` and `startup` (both `0.0` for a warm camera).
         """
-        # configure camera resolution
-        print("[Server] configure camera resolution")
-        try:
-            width, height = resolution
-        except: 
-            raise TypeError(f"Unsupported resolution argument '{resolution}'. Expected integer TUPLE of format (width, height).")
-        if not isinstance(width, int) or not (0 <= width <= 4608): 
-            raise ValueError(f"Invalid WIDTH resolution value '{width}'. Expected INTEGER: 0<=WIDTH<=4608.")
-        if not isinstance(height, int) or not (0 <= height <= 2592): 
-            raise ValueError(f"Invalid HEIGHT resolution value '{width}'. Expected INTEGER: 0<=HEIGHT<=2592.")
-        
-        self.camera.still_configuration.main.size = (width, height)
-        self.camera.configure("still")
-        
-        # handle camera focus
-        print("[Server] handle camera focus")
+        key, config = self._still_configuration(size, pixel_format, crop)
+        timings = {"configure": 0.0, "startup": 0.0}
+        if self._active_config == key:
+            return timings
+
+        self.release_camera()
+        t_start = time.perf_counter()
+        self.camera.configure(config)
+        t_configured = time.perf_counter()
         self.camera.start()
         time.sleep(0.2)
-        
+        t_started = time.perf_counter()
+        self._active_config = key
+        timings["configure"] = round((t_configured - t_start) * 1000, 3)
+        timings["startup"] = round((t_started - t_configured) * 1000, 3)
+        return timings
+
+
+    def release_camera(self):
+        """Stop a camera that was kept running for persistent captures."""
+        if self._active_config is not None:
+            self.camera.stop()
+            self._active_config = None
+
+
+    def _apply_focus(self, autofocus, focus_length, focus_profile=None):
+        """Run the autofocus cycle or set the manual lens position of the running camera.
+
+        Returns:
+            focus (dict | None): Result of an autofocus with `focus_profile`, see `_apply_focus_profile`.
+        """
         if autofocus == True:
-            self.camera.set_controls({"AfMode": controls.AfModeEnum.Continuous})
+            if focus_profile is not None:
+                return self._apply_focus_profile(focus_profile)
             autofocus_success = self.camera.autofocus_cycle()
             if not autofocus_success:
                 raise RuntimeError("Autofocus cycle failed.")
 
         elif autofocus == False:
             if not isinstance(focus_length, float) or not (0.0 <= focus_length <= 10.0): 
-                raise ValueError(f"Invalid '{width}'. Expected .")
-            self.camera.set_controls({"AfMode": controls.AfModeEnum.Manual, "LensPosition": focus_length})
+                raise ValueError(f"Invalid focus_length '{focus_length}'. Expected FLOAT: 0.0<=FOCUS_LENGTH<=10.0.")
+            self.camera.set_lens_position(focus_length)
             
         else:
             raise ValueError(f"Invalid autofocus argument '{autofocus}'. Expected BOOLEAN.")
-        
-        # capture file
-        print("[Server] capture file")
+        return None
+
+
+    def _apply_focus_profile(self, profile):
+        """Move the lens to the cached position of a focus profile and keep it, while the low resolution stream is still about as sharp as right after
+        the autofocus cycle. Otherwise, and for unknown or expired profiles, run the autofocus cycle and remember its lens position.
+
+        Returns:
+            focus (dict): `profile`, `source` (`cached` or `autofocus`), `lens_position` and the measured `sharpness`.
+        """
+        entry = self.focus_cache.get(profile)
+        if entry is not None:
+            self.camera.set_lens_position(entry.lens_position)
+            for _ in range(FOCUS_SETTLE_FRAMES):
+                luma = self.camera.capture_lores()
+            sharpness = focus_sharpness(luma)
+            if sharpness >= entry.sharpness * FOCUS_SHARPNESS_RATIO:
+                return {"profile": profile, "source": "cached", "lens_position": entry.lens_position, "sharpness": round(sharpness, 3)}
+            print(f"[Server] focus profile '{profile}' lost sharpness ({sharpness:.1f} < {FOCUS_SHARPNESS_RATIO} * {entry.sharpness:.1f}), run autofocus")
+
+        if not self.camera.autofocus_cycle():
+            raise RuntimeError("Autofocus cycle failed.")
+        lens_position = self.camera.lens_position()
+        sharpness = focus_sharpness(self.camera.capture_lores())
+        if lens_position is not None:
+            self.focus_cache.put(profile, lens_position, sharpness)
+        return {"profile": profile, "source": "autofocus", "lens_position": lens_position, "sharpness": round(sharpness, 3)}
+
+
+    def _prepare_still(self, size, autofocus, focus_length, pixel_format="BGR888", focus_profile=None, crop=None):
+        """Start the camera for still captures and handle the camera focus. A camera started for previews now belongs to the capture and keeps running after the previews stop.
+
+        Returns:
+            timings (dict): See `acquire_camera`, plus the time in milliseconds spent on `focus`.
+            focus (dict | None): See `_apply_focus_profile`, `None` without focus profile.
+        """
+        print("[Server] configure camera resolution")
+        self._preview_config = None
+        timings = self.acquire_camera(size, pixel_format, crop)
+        print("[Server] handle camera focus")
+        t_start = time.perf_counter()
+        focus = self._apply_focus(autofocus, focus_length, focus_profile)
+        timings["focus"] = round((time.perf_counter() - t_start) * 1000, 3)
+        return timings, focus
+
+
+    def _release_still(self):
+        """Stop the camera after a capture that is not persistent. While clients poll previews, the camera keeps running for them instead and stops once they are idle."""
+        if self._preview_task is not None:
+            self._preview_config = self._active_config
+        else:
+            self.release_camera()
+
+
+    def _encode_still(self, buffer, fmt, grayscale=False):
+        """Capture and encode the next frame into a reusable buffer. The buffer is overwritten from the start, so its allocation is kept across captures.
+        With `grayscale`, only the luminance plane of the `YUV420` main stream is encoded.
+
+        Returns:
+            file_size (int): Number of valid bytes at the start of the buffer.
+        """
+        buffer.seek(0)
+        if grayscale:
+            _encode_luma(self._capture_luma(), buffer, fmt)
+        else:
+            self.camera.capture_file(buffer, fmt)
+        return buffer.tell()
+
+
+    def _capture_luma(self):
+        """Capture the Y plane of the next frame of a running still configuration with a `YUV420` main stream."""
+        width, height = self._active_config[1]
+        # YUV420: the first `height` rows hold the Y plane
+        return self.camera.capture_array("main")[:height, :width]
+
+
+    def _start_pipeline(self, size, crop=None, grayscale=False):
+        """Configure the camera for video with a low resolution stream next to the main stream and start it."""
+        self.release_camera()
+        # The lores size can be aligned by the camera
+        self._lores_size = self.camera.configure_video(size, _lores_video_size(size), crop, grayscale)
+        self.camera.start()
+
+
+    def _stop_pipeline(self):
+        self.camera.stop()
+
+
+    def _start_encoder(self, fanout):
+        """Start the H.264 encoder of the running pipeline into all sinks of `fanout`.
+        Sequence headers are repeated on every keyframe, so consumers can join the running stream at any keyframe."""
+        self.camera.start_encoder(fanout.outputframe, fanout.add_stream, VIDEO_IPERIOD)
+
+
+    def _on_lores(self, luma):
+        """Hand the luminance plane of every low resolution frame to the lores consumers. Runs on the camera's frame thread, consumers must not block it."""
+        consumers = self._lores_consumers
+        if not consumers:
+            return
+        timestamp = time.monotonic()
+        for consumer in consumers:
+            consumer.submit(luma, timestamp)
+
+    # ======= ARGUMENT VALIDATION ======= #
+
+    def _parse_still_resolution(self, resolution):
+        """Validate a still `resolution` argument and return it as `(width, height)`."""
+        try:
+            width, height = resolution
+        except: 
+            raise TypeError(f"Unsupported resolution argument '{resolution}'. Expected integer TUPLE of format (width, height).")
+        if not isinstance(width, int) or not (0 <= width <= 4608): 
+            raise ValueError(f"Invalid WIDTH resolution value '{width}'. Expected INTEGER: 0<=WIDTH<=4608.")
+        if not isinstance(height, int) or not (0 <= height <= 2592): 
+            raise ValueError(f"Invalid HEIGHT resolution value '{height}'. Expected INTEGER: 0<=HEIGHT<=2592.")
+        return width, height
+
+
+    def _parse_video_resolution(self, resolution):
+        """Validate a video `resolution` argument and return it as `(width, height)`."""
+        try:
+            width, height = resolution
+        except: 
+            raise TypeError(f"Unsupported resolution argument '{resolution}'. Expected integer TUPLE of format (width, height).")
+        if not isinstance(width, int) or not (0 <= width <= 1920): 
+            raise ValueError(f"Invalid WIDTH resolution value '{width}'. Expected INTEGER: 0<=WIDTH<=1920.")
+        if not isinstance(height, int) or not (0 <= height <= 1080): 
+            raise ValueError(f"Invalid HEIGHT resolution value '{height}'. Expected INTEGER: 0<=HEIGHT<=1080.")
+        return width, height
+
+
+    def _parse_region(self, roi, binning, grayscale):
+        """Validate the `roi`, `binning` and `grayscale` arguments, which shrink a stream before it is encoded, and return them as `(roi, binning, grayscale)`."""
+        if roi is not None:
+            try:
+                x, y, w, h = (float(value) for value in roi)
+            except (TypeError, ValueError):
+                raise TypeError(f"Unsupported roi argument '{roi}'. Expected float TUPLE of format (x, y, width, height) or NONE.")
+            if not (0.0 <= x < 1.0 and 0.0 <= y < 1.0 and 0.0 < w <= 1.0 - x and 0.0 < h <= 1.0 - y):
+                raise ValueError(f"Invalid roi '{roi}'. Expected fractions of the field of view: 0.0<=X, 0.0<=Y, 0.0<WIDTH<=1.0-X, 0.0<HEIGHT<=1.0-Y.")
+            # The whole field of view shares configurations and the video pipeline with requests without roi
+            roi = None if (x, y, w, h) == (0.0, 0.0, 1.0, 1.0) else (x, y, w, h)
+        if not isinstance(binning, int) or binning not in (1, 2, 4):
+            raise ValueError(f"Invalid binning '{binning}'. Expected INTEGER: 1, 2, or 4.")
+        if not isinstance(grayscale, bool):
+            raise TypeError(f"Unsupported grayscale argument '{grayscale}'. Expected BOOLEAN.")
+        return roi, binning, grayscale
+
+
+    def _parse_file_format(self, file_format):
+        """Validate a still `file_format` argument and return it in lower case."""
         fmt = file_format.lower()
         if fmt not in ("jpeg", "png", "bmp", "gif"): 
             raise TypeError(f"Unsupported file format '{file_format}'. Only 'jpeg', 'png', 'bmp', and 'gif' are available.")   
-        file_name = time.strftime(f"picam_%Y%m%d_%H%M%S.{fmt}")
-        picture_data = io.BytesIO()
+        return fmt
+
+
+    def _parse_pixel_format(self, pixel_format):
+        """Validate a raw array `pixel_format` argument and return it in upper case."""
+        fmt = str(pixel_format).upper()
+        if fmt not in ARRAY_FORMATS:
+            raise TypeError(f"Unsupported pixel format '{pixel_format}'. Only {', '.join(repr(f) for f in ARRAY_FORMATS)} are available.")
+        return fmt
+
+
+    def _parse_focus_profile(self, focus_profile):
+        """Validate a `focus_profile` argument."""
+        if focus_profile is not None and (not isinstance(focus_profile, str) or not (1 <= len(focus_profile) <= 64)):
+            raise TypeError(f"Unsupported focus_profile argument '{focus_profile}'. Expected STRING of 1-64 characters or NONE.")
+        return focus_profile
+
+    # ======= CAMERA METHODS ======= #
+
+    @contextlib.asynccontextmanager
+    async def _camera_access(self, session):
+        """Hold the camera for the duration of the `async with` block like `scheduler.access`, timing the wait for the camera as `queue` phase."""
+        with session.timer.phase("queue"):
+            await self.scheduler.acquire(session)
+        try:
+            yield
+        finally:
+            self.scheduler.release(session)
+
+
+    @contextlib.asynccontextmanager
+    async def _video_still_access(self, session):
+        """Keep the running video pipeline for the `async with` block, so a still can be taken from its main stream while the shared encoder keeps running.
+        Yields the pipeline, or `None` if no pipeline runs and the capture needs the camera for itself."""
+        user = object()
+        async with self._video_lock:
+            pipeline = self.pipeline
+            if pipeline is not None:
+                pipeline.users.add(user)
+        if pipeline is None:
+            yield None
+            return
+        try:
+            yield pipeline
+        finally:
+            async with self._video_lock:
+                await self._release_pipeline(user)
+
+
+    async def _capture_from_video(self, session, pipeline, trigger_at, phase, fn, *args):
+        """Run the capture function `fn` on the camera thread against the main stream of the running video pipeline, timed as `phase`.
+        The camera is neither reconfigured nor refocused. The gap the shared encoder shows meanwhile is measured and recorded as `video_gap` phase.
+
+        Returns:
+            result: Return value of `fn`.
+            trigger_timestamp (float): Unix time of the capture.
+            video (dict): `resolution` of the video, plus `gap_ms` (longest interval between encoded frames since the capture started) and `frames` (frames encoded meanwhile) while the encoder runs.
+        """
+        if trigger_at is not None:
+            delay = trigger_at - time.time()
+            if delay > 0:
+                with session.timer.phase("trigger_wait"):
+                    await asyncio.sleep(delay)
+        fanout = self.fanout
+        mark = fanout.frames if fanout is not None else 0
+        trigger_timestamp = time.time()
+        with session.timer.phase(phase):
+            result = await self.scheduler.call(fn, *args)
+        video = {"resolution": list(pipeline.size)}
+        if fanout is not None:
+            gap_ms = round(fanout.gap_since(mark) * 1000, 3)
+            video.update(gap_ms=gap_ms, frames=fanout.frames - mark)
+            session.timer.add("video_gap", gap_ms)
+        return result, trigger_timestamp, video
+
+
+    async def template_action(self, session, test_int):
+        cmd_reply = {"status": "template_action executed",
+                 "details": {"test_int": test_int}}
+        await session.send_message(cmd_reply)
         
-        self.camera.capture_file(picture_data, format=fmt)
-        file_size = len(picture_data.getvalue())
 
-        # camera shut-down and return of success dictionary
-        print("[Server] camera shut-down and return of success dictionary")
-        self.camera.stop()
+    async def capture(self, session, file_format, resolution, autofocus, focus_length, persistent=False, trigger_at=None, focus_profile=None, roi=None, binning=1, grayscale=False):
+        """Capture a single still image and transferrs the raw data to the client via data socket.
+        While the video pipeline runs (videos, streams, recordings, ring buffer or scans), the image is taken from the video main stream at the video
+        resolution instead, without refocusing and without interrupting the video. `resolution`, the focus arguments, `persistent`, `roi`, `binning` and `grayscale` do not apply then.
+        
+        Args:
+            file_format (str): Supported are the following file formats: `jpeg`, `png`, `bmp`, and `gif`.
+            resolution (tuple): Width and height integer duple. Example: `(1280, 720)`
+            autofocus (bool): Triggers standard autofocus cycle of Picamera2. (`True`: 'autofocus on', `False`: 'autofocus off')
+            focus_length (float): Lens position must only set manually, if before `autofocus=False`. Value range between `0.0`-`10.0`. See Picamera2 manual for more information.
+            persistent (bool): Keep the camera running after the capture, so following captures with the same resolution skip configuration and startup.
+            trigger_at (float | None): Unix timestamp at which the picture is taken, after the camera was prepared and focused. Lines up captures of several camera nodes with synchronized clocks.
+            focus_profile (str | None): Name of a focus profile. With `autofocus`, the converged lens position is remembered under this name and reused by later captures, until it expires after `FOCUS_TTL` seconds or the sharpness of the low resolution stream drops below `FOCUS_SHARPNESS_RATIO` of its reference.
+            roi (tuple | None): Region `(x, y, width, height)` of the field of view as fractions, cropped by the camera (ScalerCrop). The image keeps the pixel density of `resolution`, so it shrinks with the region.
+            binning (int): Reduce width and height by `1`, `2`, or `4` in the camera, which picks a binned sensor mode for small images.
+            grayscale (bool): Encode the luminance plane only.
+            
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `file_name`, `file_size`, `resolution`, `timings_ms`, `trigger_timestamp`, `focus` (only with `focus_profile`), `video` (only from the running video, see `_capture_from_video`)
+        """
+        width, height = self._parse_still_resolution(resolution)
+        roi, binning, grayscale = self._parse_region(roi, binning, grayscale)
+        width, height = _region_size((width, height), roi, binning)
+        fmt = self._parse_file_format(file_format)
+        focus_profile = self._parse_focus_profile(focus_profile)
+        if trigger_at is not None and not isinstance(trigger_at, (int, float)):
+            raise TypeError(f"Unsupported trigger_at argument '{trigger_at}'. Expected FLOAT unix timestamp or NONE.")
+
+        # While the video pipeline runs, the still is taken from its main stream without interrupting the video
+        video = focus = None
+        async with self._video_still_access(session) as pipeline:
+            if pipeline is not None:
+                print("[Server] capture file from the running video")
+                file_size, trigger_timestamp, video = await self._capture_from_video(session, pipeline, trigger_at, "encode", self._encode_still, session.picture_buffer, fmt)
+        if pipeline is None:
+            async with self._camera_access(session):
+                timings, focus = await self.scheduler.call(self._prepare_still, (width, height), autofocus, focus_length, "YUV420" if grayscale else "BGR888", focus_profile, roi)
+                session.timer.update(timings)
+        
+                if trigger_at is not None:
+                    delay = trigger_at - time.time()
+                    if delay > 0:
+                        with session.timer.phase("trigger_wait"):
+                            await asyncio.sleep(delay)
+
+                # capture file
+                print("[Server] capture file")
+                trigger_timestamp = time.time()
+                with session.timer.phase("encode"):
+                    file_size = await self.scheduler.call(self._encode_still, session.picture_buffer, fmt, grayscale)
+
+                # camera shut-down and return of success dictionary
+                print("[Server] camera shut-down and return of success dictionary")
+                if not persistent:
+                    with session.timer.phase("release"):
+                        await self.scheduler.call(self._release_still)
+
+        file_name = time.strftime(f"picam_%Y%m%d_%H%M%S.{fmt}")
         cmd_reply = {"status": "picture captured, starting transfer...",
                      "details": {"file_name": file_name,
-                                 "file_size": file_size}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
+                                 "file_size": file_size,
+                                 "resolution": video["resolution"] if video is not None else [width, height],
+                                 "trigger_timestamp": trigger_timestamp}}
+        if focus is not None:
+            cmd_reply["details"]["focus"] = focus
+        if video is not None:
+            cmd_reply["details"]["video"] = video
+        await session.send_message(cmd_reply)
         
-        # send file via data socket
+        # send file via the session's data connection
         print(f"[Server] send file via data socket")
-        data_connection, _ = self.data_socket.accept()
+        with session.timer.phase("accept"):
+            data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT, resumable=True)
         print("[Server] data port connected")
-        data_connection.sendall(picture_data.getvalue())
+        try:
+            with session.timer.phase("send"):
+                await data_connection.send_buffer(session.picture_buffer, file_size)
+        finally:
+            data_connection.close()
         print("[Server] file was sent")
 
 
-    def start_video(self, resolution=(1280, 720)):
+    async def capture_array(self, session, resolution=(1280, 720), pixel_format="RGB888", autofocus=True, focus_length=0.0, persistent=False, focus_profile=None, roi=None, binning=1, grayscale=False):
+        """Capture a single frame without image encoding and transfer the raw array buffer to the client via data socket.
+        The reply describes the array with `shape`, `dtype` and `strides`, so the client can rebuild it without copying.
+        While the video pipeline runs, the frame is taken from the video main stream like in `capture`, only RGB pixel formats are available then and `roi`, `binning` and `grayscale` do not apply.
+
+        Args:
+            resolution (tuple): Width and height integer duple. Example: `(1280, 720)`
+            pixel_format (str): Pixel format of the main stream: `RGB888`, `BGR888`, `XRGB8888`, `XBGR8888`, or `YUV420`.
+            autofocus (bool): Triggers standard autofocus cycle of Picamera2.
+            focus_length (float): Lens position must only set manually, if before `autofocus=False`.
+            persistent (bool): Keep the camera running after the capture.
+            focus_profile (str | None): Name of a focus profile, see `capture`.
+            roi (tuple | None): Region of the field of view, see `capture`.
+            binning (int): Reduction of width and height, see `capture`.
+            grayscale (bool): Send the luminance plane as 2D array of pixel format `GRAY` instead of `pixel_format`, a third of the bytes of `RGB888`.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `shape`, `dtype`, `strides`, `size`, `pixel_format`, `timings_ms`, `focus` (only with `focus_profile`), `video` (only from the running video)
+        """
+        width, height = self._parse_still_resolution(resolution)
+        roi, binning, grayscale = self._parse_region(roi, binning, grayscale)
+        width, height = _region_size((width, height), roi, binning)
+        fmt = self._parse_pixel_format(pixel_format)
+        focus_profile = self._parse_focus_profile(focus_profile)
+
+        video = focus = None
+        async with self._video_still_access(session) as pipeline:
+            if pipeline is not None:
+                if fmt not in CHANNEL_ORDER:
+                    raise TypeError(f"Unsupported pixel format '{pixel_format}' during video. Only {', '.join(repr(f) for f in CHANNEL_ORDER)} are available.")
+                print("[Server] capture array from the running video")
+                array, _, video = await self._capture_from_video(session, pipeline, None, "capture", self.camera.capture_array, "main")
+                array = _convert_channels(array, VIDEO_FORMAT, fmt)
+        if pipeline is None:
+            async with self._camera_access(session):
+                timings, focus = await self.scheduler.call(self._prepare_still, (width, height), autofocus, focus_length, "YUV420" if grayscale else fmt, focus_profile, roi)
+                session.timer.update(timings)
+                print("[Server] capture array")
+                with session.timer.phase("capture"):
+                    if grayscale:
+                        array = await self.scheduler.call(self._capture_luma)
+                        fmt = "GRAY"
+                    else:
+                        array = await self.scheduler.call(self.camera.capture_array, "main")
+                if not persistent:
+                    with session.timer.phase("release"):
+                        await self.scheduler.call(self._release_still)
+
+        payload, strides = _array_payload(array)
+        cmd_reply = {"status": "array captured, starting transfer...",
+                     "details": {"shape": list(array.shape),
+                                 "dtype": array.dtype.str,
+                                 "strides": list(strides),
+                                 "size": payload.nbytes,
+                                 "pixel_format": fmt}}
+        if focus is not None:
+            cmd_reply["details"]["focus"] = focus
+        if video is not None:
+            cmd_reply["details"]["video"] = video
+        await session.send_message(cmd_reply)
+
+        print(f"[Server] send array via data socket")
+        with session.timer.phase("accept"):
+            data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT, resumable=True)
+        try:
+            with session.timer.phase("send"):
+                await data_connection.send(payload)
+        finally:
+            data_connection.close()
+        print("[Server] array was sent")
+
+
+    async def capture_burst(self, session, count, interval, file_format, resolution, autofocus, focus_length, persistent=False, focus_profile=None, roi=None, binning=1, grayscale=False):
+        """Capture a sequence of still images from the running camera and stream them to the client over a single data socket connection.
+        Every frame is preceded by a `FRAME_HEADER` (frame index, payload size, capture timestamp). Encoding of the next frame overlaps with sending the previous one.
+
+        Args:
+            count (int): Number of frames to capture. Value range between `1`-`MAX_BURST_COUNT`.
+            interval (float): Minimum time in seconds between the start of two captures. `0.0` captures back to back.
+            file_format (str): Supported are the following file formats: `jpeg`, `png`, `bmp`, and `gif`.
+            resolution (tuple): Width and height integer duple. Example: `(1280, 720)`
+            autofocus (bool): Triggers standard autofocus cycle of Picamera2 once before the first frame.
+            focus_length (float): Lens position must only set manually, if before `autofocus=False`.
+            persistent (bool): Keep the camera running after the burst.
+            focus_profile (str | None): Name of a focus profile, see `capture`.
+            roi (tuple | None): Region of the field of view, see `capture`.
+            binning (int): Reduction of width and height, see `capture`.
+            grayscale (bool): Encode the luminance plane only.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `count`, `file_format`, `resolution`, `timings_ms`, `focus` (only with `focus_profile`)
+        """
+        if not isinstance(count, int) or not (1 <= count <= MAX_BURST_COUNT):
+            raise ValueError(f"Invalid count '{count}'. Expected INTEGER: 1<=COUNT<={MAX_BURST_COUNT}.")
+        if not isinstance(interval, (int, float)) or interval < 0:
+            raise ValueError(f"Invalid interval '{interval}'. Expected FLOAT: 0.0<=INTERVAL.")
+        width, height = self._parse_still_resolution(resolution)
+        roi, binning, grayscale = self._parse_region(roi, binning, grayscale)
+        width, height = _region_size((width, height), roi, binning)
+        fmt = self._parse_file_format(file_format)
+        focus_profile = self._parse_focus_profile(focus_profile)
+
+        async with self._camera_access(session):
+            print("[Server] prepare camera for burst capture")
+            timings, focus = await self.scheduler.call(self._prepare_still, (width, height), autofocus, focus_length, "YUV420" if grayscale else "BGR888", focus_profile, roi)
+            session.timer.update(timings)
+
+            cmd_reply = {"status": "burst capture started, starting transfer...",
+                         "details": {"count": count,
+                                     "file_format": fmt,
+                                     "resolution": [width, height]}}
+            if focus is not None:
+                cmd_reply["details"]["focus"] = focus
+            await session.send_message(cmd_reply)
+
+            print("[Server] send burst via data socket")
+            with session.timer.phase("accept"):
+                data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT)
+            # Three reusable encode buffers: one being filled, up to two waiting to be sent
+            frames = asyncio.Queue(maxsize=2)
+            free_buffers = asyncio.Queue()
+            for _ in range(3):
+                free_buffers.put_nowait(io.BytesIO())
+            transfer_failed = asyncio.Event()
+
+            async def send_frames():
+                while (frame := await frames.get()) is not None:
+                    index, timestamp, picture_data, size = frame
+                    try:
+                        if not transfer_failed.is_set():
+                            with session.timer.phase("send"):
+                                await data_connection.send(FRAME_HEADER.pack(index, size, timestamp))
+                                await data_connection.send_buffer(picture_data, size)
+                    except OSError as e:
+                        # Keep draining, so the capture loop never blocks on a dead connection
+                        print(f"[Server] burst transfer failed: {e}")
+                        transfer_failed.set()
+                    free_buffers.put_nowait(picture_data)
+
+            sender = asyncio.get_running_loop().create_task(send_frames())
+            sent = 0
+            try:
+                next_capture = time.perf_counter()
+                for index in range(count):
+                    if transfer_failed.is_set():
+                        break
+                    delay = next_capture - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_capture = time.perf_counter() + interval
+                    picture_data = await free_buffers.get()
+                    timestamp = time.time()
+                    with session.timer.phase("encode"):
+                        size = await self.scheduler.call(self._encode_still, picture_data, fmt, grayscale)
+                    await frames.put((index, timestamp, picture_data, size))
+                    sent += 1
+            finally:
+                await frames.put(None)
+                await sender
+                data_connection.close()
+                if not persistent:
+                    with session.timer.phase("release"):
+                        await self.scheduler.call(self._release_still)
+        print(f"[Server] burst of {sent} frames was sent")
+
+
+    async def _start_preview(self, session):
+        """Feed the low resolution frames to the preview frame and keep them coming until previews are idle for `PREVIEW_IDLE_TIMEOUT` seconds.
+        An idle camera is started in a still configuration at `VIDEO_SIZE` for the previews. A camera that is busy with a capture is not disturbed."""
+        if self._preview_task is None:
+            # Replaced instead of modified, the camera thread iterates the list without locking
+            self._lores_consumers = self._lores_consumers + [self.preview_frame]
+            self._preview_task = self._spawn(self._stop_idle_preview())
+        if self.pipeline is None and self._active_config is None and self.scheduler.owner is None and not self.scheduler.queued:
+            async with self._camera_access(session):
+                if self.pipeline is None and self._active_config is None:
+                    print("[Server] start camera for previews")
+                    session.timer.update(await self.scheduler.call(self.acquire_camera, VIDEO_SIZE))
+                    self._preview_config = self._active_config
+
+
+    async def _stop_idle_preview(self):
+        while (remaining := self._preview_requested + PREVIEW_IDLE_TIMEOUT - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+        self._lores_consumers = [other for other in self._lores_consumers if other is not self.preview_frame]
+        self._preview_task = None
+        if self._preview_config is not None and self._preview_config == self._active_config:
+            async with self.scheduler.access(self.preview_frame):
+                # Unless a capture took the camera over in the meantime
+                if self._preview_config == self._active_config:
+                    print("[Server] stop camera of idle previews")
+                    await self.scheduler.call(self.release_camera)
+        self._preview_config = None
+
+
+    async def preview(self, session, format="jpeg", quality=PREVIEW_QUALITY, max_age=PREVIEW_MAX_AGE):
+        """Send a small grayscale preview from the low resolution stream, which runs next to the main stream of every configuration, and transfer it to the client via data socket.
+        Previews never reconfigure a running camera. Frames up to `max_age` seconds old are reused together with their encodings, so clients polling at
+        the same time share one encode. While a capture reconfigures the camera, the last frame is sent with its age.
+
+        Args:
+            format (str): `jpeg` for a JPEG image, `raw` for the luminance plane as `uint8` array.
+            quality (int): JPEG quality `1`-`95`.
+            max_age (float): Maximum age in seconds of a reused frame.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `format`, `size`, `shape`, `age_ms`, and `dtype`, `strides` (only `raw`)
+        """
+        if format not in PREVIEW_FORMATS:
+            raise TypeError(f"Unsupported preview format '{format}'. Only {', '.join(repr(f) for f in PREVIEW_FORMATS)} are available.")
+        if not isinstance(quality, int) or not (1 <= quality <= 95):
+            raise ValueError(f"Invalid quality '{quality}'. Expected INTEGER: 1<=QUALITY<=95.")
+        if not isinstance(max_age, (int, float)) or max_age < 0:
+            raise ValueError(f"Invalid max_age '{max_age}'. Expected FLOAT: 0.0<=MAX_AGE.")
+
+        self._preview_requested = time.monotonic()
+        await self._start_preview(session)
+        frame = self.preview_frame
+        # A camera held by a capture may be reconfiguring, then the last frame is sent instead of waiting
+        streaming = self.pipeline is not None or (self._active_config is not None and self.scheduler.owner is None)
+        if frame.age() > max_age and streaming:
+            with session.timer.phase("frame"):
+                await frame.wait_newer(frame.index, 1.0)
+        index, luma, timestamp = frame.index, frame.frame, frame.timestamp
+        if luma is None:
+            warn_reply = {"status": "warning", "details": {"warning_message": "No preview frame available yet, the camera is busy."}}
+            await session.send_message(warn_reply)
+            return
+
+        details = {"format": format,
+                   "shape": list(luma.shape),
+                   "age_ms": round((time.monotonic() - timestamp) * 1000, 3)}
+        if format == "jpeg":
+            with session.timer.phase("encode"):
+                payload = await self.preview_cache.get(index, ("jpeg", quality), lambda: encode_jpeg(luma, quality))
+        else:
+            payload, strides = _array_payload(luma)
+            details["dtype"] = luma.dtype.str
+            details["strides"] = list(strides)
+        details["size"] = len(payload)
+        await session.send_message({"status": "preview captured, starting transfer...", "details": details})
+
+        with session.timer.phase("accept"):
+            data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT, resumable=True)
+        try:
+            with session.timer.phase("send"):
+                await data_connection.send(payload)
+        finally:
+            data_connection.close()
+
+
+    def _check_video_size(self, size, crop=None, grayscale=False):
+        """Raise, if the video pipeline already runs at another resolution than `size`, with another field of view than `crop` or another `grayscale` setting."""
+        if self.pipeline is None:
+            return
+        if self.pipeline.size != tuple(size):
+            raise ValueError(f"Video pipeline already runs at resolution {self.pipeline.size}. All video consumers share one pipeline, stop them first to change the resolution.")
+        if self.pipeline.crop != crop or self.pipeline.grayscale != grayscale:
+            raise ValueError(f"Video pipeline already runs with roi {self.pipeline.crop} and grayscale {self.pipeline.grayscale}. All video consumers share one pipeline, stop them first to change them.")
+
+
+    async def _acquire_pipeline(self, user, size, crop=None, grayscale=False):
+        """Attach `user` to the video pipeline, which is started at main stream `size`, field of view `crop` and `grayscale` if it does not run yet. Called with `self._video_lock` held."""
+        if self.pipeline is None:
+            pipeline = VideoPipeline(size, crop, grayscale)
+            # The pipeline itself is the camera owner, so it runs as long as any consumer of any session is attached
+            await self.scheduler.acquire(pipeline)
+            try:
+                print("[Server] start video pipeline")
+                await self.scheduler.call(self._start_pipeline, pipeline.size, pipeline.crop, pipeline.grayscale)
+            except BaseException:
+                self.scheduler.release(pipeline)
+                raise
+            self.pipeline = pipeline
+        self.pipeline.users.add(user)
+
+
+    async def _release_pipeline(self, user):
+        """Detach `user` from the video pipeline and stop the pipeline with its last user. Called with `self._video_lock` held."""
+        pipeline = self.pipeline
+        pipeline.users.discard(user)
+        if pipeline.users:
+            return
+        self.pipeline = None
+        try:
+            await self.scheduler.call(self._stop_pipeline)
+        finally:
+            self.scheduler.release(pipeline)
+        print("[Server] video pipeline stopped")
+
+
+    async def _attach_consumer(self, size, sink, crop=None, grayscale=False):
+        """Add a sink to the shared video encoder. The encoder is started with the first sink; later sinks join the running encoder, which must run at the same resolution, field of view and grayscale setting."""
+        loop = asyncio.get_running_loop()
+        async with self._video_lock:
+            self._check_video_size(size, crop, grayscale)
+            if self.fanout is None:
+                fanout = VideoFanout(size)
+                await self._acquire_pipeline(fanout, size, crop, grayscale)
+                try:
+                    print("[Server] start shared video encoder")
+                    await self.scheduler.call(self._start_encoder, fanout)
+                except BaseException:
+                    await self._release_pipeline(fanout)
+                    raise
+                self.fanout = fanout
+            try:
+                await loop.run_in_executor(None, self.fanout.add, sink)
+            except BaseException:
+                await loop.run_in_executor(None, sink.close)
+                if not self.fanout.sinks:
+                    await self._stop_encoder()
+                raise
+        print(f"[Server] video consumer '{sink.name}' attached")
+
+
+    async def _detach_consumer(self, sink):
+        """Remove a sink from the shared video encoder, write its queued frames and stop the encoder with the last sink.
+
+        Returns:
+            status (dict): `sent` and `dropped` frames of the sink.
+        """
+        async with self._video_lock:
+            self.fanout.remove(sink)
+            await asyncio.get_running_loop().run_in_executor(None, sink.close, SINK_CLOSE_TIMEOUT)
+            if not self.fanout.sinks:
+                await self._stop_encoder()
+        print(f"[Server] video consumer '{sink.name}' detached")
+        status = sink.status()
+        return {"sent": status["sent"], "dropped": status["dropped"]}
+
+
+    async def _stop_encoder(self):
+        """Stop the shared video encoder and detach it from the video pipeline."""
+        fanout, self.fanout = self.fanout, None
+        try:
+            await self.scheduler.call(self.camera.stop_encoder)
+        finally:
+            await self._release_pipeline(fanout)
+        print("[Server] shared video encoder stopped")
+
+
+    async def _attach_lores_consumer(self, consumer):
+        """Feed the low resolution frames of the video pipeline to `consumer`, starting the pipeline at `VIDEO_SIZE` if it does not run yet."""
+        async with self._video_lock:
+            await self._acquire_pipeline(consumer, VIDEO_SIZE if self.pipeline is None else self.pipeline.size)
+            # Replaced instead of modified, the camera thread iterates the list without locking
+            self._lores_consumers = self._lores_consumers + [consumer]
+
+
+    async def _detach_lores_consumer(self, consumer):
+        async with self._video_lock:
+            self._lores_consumers = [other for other in self._lores_consumers if other is not consumer]
+            await self._release_pipeline(consumer)
+        consumer.close()
+
+
+    def _scanner(self, mode, on_codes, roi, downscale, interval=0.0, ttl=2.0):
+        """Create a code scanner. The decoder worker processes are started with the first scanner and kept for all following ones."""
+        if self._decoder_pool is None:
+            self._decoder_pool = create_decoder_pool(SCAN_WORKERS)
+        return CodeScanner(mode, on_codes, self._decoder_pool, roi, downscale, interval, ttl)
+
+
+    async def _stop_consumer(self, session, kind):
+        """Detach the session's video consumer of `kind` and close its data connection."""
+        recording = session.recordings.pop(kind)
+        try:
+            if kind == "scan":
+                await self._detach_lores_consumer(recording.sink)
+                return recording.sink.status()
+            if kind == "motion":
+                await self._detach_lores_consumer(recording.sink)
+                status = recording.sink.status()
+                async with self._motion_lock:
+                    status["recording"] = await self._stop_motion_recording(recording.sink)
+                return status
+            return await self._detach_consumer(recording.sink)
+        finally:
+            if recording.data_connection is not None:
+                recording.data_connection.close()
+
+
+    async def _warn_active(self, session, kind):
+        """Reply with a warning and return `True`, if the session already runs a video consumer of `kind`."""
+        if kind not in session.recordings:
+            return False
+        warn_reply = {"status": "warning", "details": {"warning_message": f"Command 'start_{kind}' was already called. Call 'stop_{kind}' first."}}
+        await session.send_message(warn_reply)
+        return True
+
+
+    async def start_video(self, session, resolution=(1280, 720), roi=None, binning=1, grayscale=False):
         """Start streaming H.264‐encoded video over the data socket. The stream continues until the server recives the `stop_video` command.
+        The video is a consumer of the shared encoder, which holds the camera while any consumer runs; stills are taken from the video meanwhile, other camera commands wait until all are stopped.
 
         Args:
             resolution (tuple): Width and height of the video recording. Example: `(1280, 720)`
+            roi (tuple | None): Region `(x, y, width, height)` of the field of view as fractions, cropped by the camera. The video keeps the pixel density of `resolution`, so it shrinks with the region.
+            binning (int): Reduce width and height by `1`, `2`, or `4` in the camera.
+            grayscale (bool): Remove the colour in the camera (saturation `0`), so the encoder spends its bits on the luminance. This reduces the bitrate only,
+                not the encoder load: the hardware encoder takes YUV420 frames and still encodes the now flat chroma planes.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `resolution`
         """
         print("[Server] configure camera resolution, format, and encoder")
-        try:
-            width, height = resolution
-        except: 
-            raise TypeError(f"Unsupported resolution argument '{resolution}'. Expected integer TUPLE of format (width, height).")
-        if not isinstance(width, int) or not (0 <= width <= 1920): 
-            raise ValueError(f"Invalid WIDTH resolution value '{width}'. Expected INTEGER: 0<=WIDTH<=1920.")
-        if not isinstance(height, int) or not (0 <= height <= 1080): 
-            raise ValueError(f"Invalid HEIGHT resolution value '{width}'. Expected INTEGER: 0<=HEIGHT<=1080.")
-
-        self.camera.video_configuration.main.size = (width, height)
-        encoder = H264Encoder()
-        self.camera.configure("video")
+        width, height = self._parse_video_resolution(resolution)
+        roi, binning, grayscale = self._parse_region(roi, binning, grayscale)
+        width, height = _region_size((width, height), roi, binning)
+        self._check_video_size((width, height), roi, grayscale)
+        if await self._warn_active(session, "video"):
+            return
 
-        cmd_reply = {"status": "Video recording started...", "details": {}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
+        cmd_reply = {"status": "Video recording started...", "details": {"resolution": [width, height]}}
+        await session.send_message(cmd_reply)
         
         # Send file via data socket in real time data stream
         print(f"[Server] connect to TCP data socket")
-        data_connection, _ = self.data_socket.accept()
+        with session.timer.phase("accept"):
+            data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT)
         print("[Server] stream the video output in real time to connected data socket")
-        data_stream = data_connection.makefile("wb")
-        print("[Server] start recording")
-        self.camera.start_recording(encoder, FileOutput(data_stream))
-        
-        # Continue streaming until stop command is recieved
-        while True:
-            raw = self.conn.recv(2048)
-            cmd_obj = json.loads(raw.decode("utf‐8"))
-            if cmd_obj.get("action") != "stop_video": 
-                warn_reply = {"status": "warning",
-                              "details": {"warning_message": f"Command '{cmd_obj}' could not be excecuted, because of active action. Allowed action: 'stop_video'"}}
-                self.conn.sendall(json.dumps(warn_reply).encode("utf‐8"))
-                continue
-            break
-        
-        self.camera.stop_recording()
-        cmd_reply = {"status": "Video successfully recorded and data socket closed", "details": {}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
+        sink = ConnectionSink(f"video {data_connection.addr[0]}:{data_connection.addr[1]}", data_connection, SINK_QUEUE_SIZE)
+        try:
+            with session.timer.phase("attach"):
+                await self._attach_consumer((width, height), sink, roi, grayscale)
+        except BaseException:
+            data_connection.close()
+            raise
+        session.recordings["video"] = Recording("video", sink, data_connection)
+
+
+    async def stop_video(self, session):
+        """Stop the active video recording of the session and close its data connection.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `sent` and `dropped` frames
+        """
+        with session.timer.phase("detach"):
+            status = await self._stop_consumer(session, "video")
+        cmd_reply = {"status": "Video successfully recorded and data socket closed", "details": status}
+        await session.send_message(cmd_reply)
         print(f"[Server] {cmd_reply['status']}")   
 
 
-    def read_barcode(self):
-        raise NotImplementedError("'read_barcode' method not implemented")
+    async def start_recording(self, session, file_name=None, resolution=(1280, 720), roi=None, binning=1, grayscale=False):
+        """Record the shared video stream into a file in `RECORDING_DIR` on the server, until `stop_recording` is called.
+        Files ending on `.mp4`, `.mkv`, or `.ts` are muxed into that container, all other files hold the raw H.264 stream.
+
+        Args:
+            file_name (str | None): Name of the video file without directories. Defaults to `video_<timestamp>.mp4`.
+            resolution (tuple): Width and height of the video. Example: `(1280, 720)`
+            roi (tuple | None): Region of the field of view, see `start_video`.
+            binning (int): Reduction of width and height, see `start_video`.
+            grayscale (bool): Remove the colour, see `start_video`.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `file_name`, `resolution`
+        """
+        width, height = self._parse_video_resolution(resolution)
+        roi, binning, grayscale = self._parse_region(roi, binning, grayscale)
+        width, height = _region_size((width, height), roi, binning)
+        if file_name is None:
+            file_name = time.strftime("video_%Y%m%d_%H%M%S.mp4")
+        if not isinstance(file_name, str) or not file_name or os.path.basename(file_name) != file_name or file_name in (".", ".."):
+            raise ValueError(f"Invalid file_name '{file_name}'. Expected STRING file name without directories.")
+        if await self._warn_active(session, "recording"):
+            return
+
+        os.makedirs(RECORDING_DIR, exist_ok=True)
+        path = os.path.join(RECORDING_DIR, file_name)
+        container = RECORDING_CONTAINERS.get(os.path.splitext(file_name)[1].lower())
+        output = self.camera.create_output(path, container)
+        sink = OutputSink(f"file {file_name}", output, SINK_QUEUE_SIZE)
+        with session.timer.phase("attach"):
+            await self._attach_consumer((width, height), sink, roi, grayscale)
+        session.recordings["recording"] = Recording("recording", sink)
+        cmd_reply = {"status": "Recording started.", "details": {"file_name": file_name, "resolution": [width, height]}}
+        await session.send_message(cmd_reply)
+
+
+    async def stop_recording(self, session):
+        """Stop the server side recording of the session and close its file.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `sent` and `dropped` frames
+        """
+        with session.timer.phase("detach"):
+            status = await self._stop_consumer(session, "recording")
+        cmd_reply = {"status": "Recording stopped.", "details": status}
+        await session.send_message(cmd_reply)
+
+
+    async def start_ring_buffer(self, session, resolution=(1280, 720), seconds=10.0, max_bytes=RING_MAX_BYTES):
+        """Start keeping the shared H.264 video stream in an in-memory ring buffer of the last `seconds`, from which clips are cut with `save_clip`.
+        The ring buffer keeps the encoder running until `stop_ring_buffer` is called by any session, and keeps running if the starting session disconnects.
+
+        Args:
+            resolution (tuple): Width and height of the video. Example: `(1280, 720)`
+            seconds (float): Length of video history kept in memory.
+            max_bytes (int): Memory budget of the ring buffer, older frames are dropped first when it is exceeded.
+        """
+        width, height = self._parse_video_resolution(resolution)
+        if not isinstance(seconds, (int, float)) or seconds <= 0:
+            raise ValueError(f"Invalid seconds '{seconds}'. Expected FLOAT: 0.0<SECONDS.")
+        if not isinstance(max_bytes, int) or max_bytes <= 0:
+            raise ValueError(f"Invalid max_bytes '{max_bytes}'. Expected INTEGER: 0<MAX_BYTES.")
+        if self.ring is not None:
+            warn_reply = {"status": "warning", "details": {"warning_message": "Ring buffer is already running. Call 'stop_ring_buffer' first."}}
+            await session.send_message(warn_reply)
+            return
+
+        ring = VideoRing(seconds, max_bytes)
+        sink = RingSink("ring buffer", ring, SINK_QUEUE_SIZE)
+        self.ring, self._ring_sink = ring, sink
+        try:
+            print("[Server] start ring buffer recording")
+            with session.timer.phase("attach"):
+                await self._attach_consumer((width, height), sink)
+        except BaseException:
+            self.ring = self._ring_sink = None
+            raise
+        cmd_reply = {"status": "Ring buffer started.",
+                     "details": {"seconds": seconds, "max_bytes": max_bytes}}
+        await session.send_message(cmd_reply)
+
+
+    async def stop_ring_buffer(self, session):
+        """Stop the ring buffer and discard the buffered video."""
+        if self.ring is None:
+            warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_ring_buffer' can only be excecuted, if 'start_ring_buffer' was called before."}}
+            await session.send_message(warn_reply)
+            return
+        sink, self.ring, self._ring_sink = self._ring_sink, None, None
+        await self._detach_consumer(sink)
+        cmd_reply = {"status": "Ring buffer stopped.", "details": {}}
+        await session.send_message(cmd_reply)
+
+
+    async def save_clip(self, session, pre_seconds=5.0, post_seconds=5.0):
+        """Cut a clip from the ring buffer around the moment this command arrives and transfer the raw H.264 data to the client via data socket.
+        The clip starts on the last keyframe before `pre_seconds` ago and ends `post_seconds` after the trigger.
+
+        Args:
+            pre_seconds (float): Seconds of video before the trigger.
+            post_seconds (float): Seconds of video after the trigger.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `file_size`, `frames`, `duration_s`, `pre_seconds`
+        """
+        trigger = time.monotonic()
+        if self.ring is None:
+            warn_reply = {"status": "warning", "details": {"warning_message": "Command 'save_clip' can only be excecuted, if 'start_ring_buffer' was called before."}}
+            await session.send_message(warn_reply)
+            return
+        if not isinstance(pre_seconds, (int, float)) or pre_seconds < 0:
+            raise ValueError(f"Invalid pre_seconds '{pre_seconds}'. Expected FLOAT: 0.0<=PRE_SECONDS.")
+        if not isinstance(post_seconds, (int, float)) or post_seconds < 0:
+            raise ValueError(f"Invalid post_seconds '{post_seconds}'. Expected FLOAT: 0.0<=POST_SECONDS.")
+
+        ring = self.ring
+        end = trigger + post_seconds
+        with session.timer.phase("post_wait"):
+            await asyncio.get_running_loop().run_in_executor(None, ring.wait_until, end, post_seconds + 5.0)
+        frames = ring.clip(trigger - pre_seconds, end)
+        if not frames:
+            raise RuntimeError("Ring buffer does not hold a keyframe for the requested clip yet.")
+
+        file_size = sum(len(data) for _, _, data in frames)
+        cmd_reply = {"status": "clip extracted, starting transfer...",
+                     "details": {"file_size": file_size,
+                                 "frames": len(frames),
+                                 "duration_s": round(frames[-1][0] - frames[0][0], 3),
+                                 "pre_seconds": round(max(0.0, trigger - frames[0][0]), 3)}}
+        await session.send_message(cmd_reply)
+
+        with session.timer.phase("accept"):
+            data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT, resumable=True)
+        try:
+            with session.timer.phase("send"):
+                for _, _, data in frames:
+                    await data_connection.send(data)
+        finally:
+            data_connection.close()
+        print("[Server] clip was sent")
+
+
+    async def start_scan(self, session, mode="qrcode", roi=None, downscale=1, interval=0.0, ttl=2.0):
+        """Continuously decode QR codes and/or barcodes in the low resolution stream and push every new code to the client as `codes` event.
+        Decoding runs in a worker process, so it never blocks the camera or the video consumers. Scanning joins a running video pipeline,
+        otherwise it starts one at `VIDEO_SIZE`.
+
+        Args:
+            mode (str): `qrcode`, `barcode`, or `all`.
+            roi (tuple | None): Region of interest `(x, y, width, height)` as fractions of the frame. `None` scans the whole frame.
+            downscale (int): Integer reduction factor applied to the region before decoding.
+            interval (float): Minimum time in seconds between two decoded frames. `0.0` decodes as fast as the worker can.
+            ttl (float): A code is reported again, after it was out of view for `ttl` seconds.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `mode`, `lores_size`
+        """
+        if not session.framed:
+            warn_reply = {"status": "warning", "details": {"warning_message": "Command 'start_scan' pushes events and requires the framed command protocol. Use 'read_qrcode' or 'read_barcode' instead."}}
+            await session.send_message(warn_reply)
+            return
+        if await self._warn_active(session, "scan"):
+            return
+
+        loop = asyncio.get_running_loop()
+        def on_codes(codes):
+            loop.call_soon_threadsafe(self._spawn, session.send_event("codes", {"codes": codes}))
+
+        scanner = await loop.run_in_executor(None, self._scanner, mode, on_codes, roi, downscale, interval, ttl)
+        with session.timer.phase("attach"):
+            await self._attach_lores_consumer(scanner)
+        session.recordings["scan"] = Recording("scan", scanner)
+        cmd_reply = {"status": "Scanning started.", "details": {"mode": mode, "lores_size": list(self._lores_size)}}
+        await session.send_message(cmd_reply)
+
+
+    async def stop_scan(self, session):
+        """Stop the continuous code scanning of the session.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `decoded` and `skipped` frames and a decoder `error`
+        """
+        with session.timer.phase("detach"):
+            status = await self._stop_consumer(session, "scan")
+        cmd_reply = {"status": "Scanning stopped.", "details": status}
+        await session.send_message(cmd_reply)
+
+
+    async def start_motion(self, session, zones=None, threshold=12.0, min_area=0.02, cell=16, hold=2.0, alpha=0.05, record=False):
+        """Detect motion in the low resolution stream and push a `motion` event to the client, when motion starts and when it ends.
+        Detection differences a grid of cell means against a background on the camera's frame thread and keeps up with the full frame rate.
+        Detection joins a running video pipeline, otherwise it starts one at `VIDEO_SIZE`.
+
+        Args:
+            zones (list | None): Zones `(x, y, width, height)` as fractions of the frame, in which motion counts. `None` watches the whole frame.
+            threshold (float): Change of the mean luminance `0`-`255` of a cell, above which the cell changed.
+            min_area (float): Fraction of a zone that must change to start a motion event.
+            cell (int): Side length of the cells in pixels of the low resolution stream.
+            hold (float): A motion event ends `hold` seconds after the last frame with motion.
+            alpha (float): Weight of every frame in the background, higher values adapt faster to changes of the scene.
+            record (bool): Record every motion event into a file in `RECORDING_DIR` on the server, from its start until it ends. The `file_name` is part of the events.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `zones`, `lores_size`
+        """
+        if not session.framed:
+            warn_reply = {"status": "warning", "details": {"warning_message": "Command 'start_motion' pushes events and requires the framed command protocol."}}
+            await session.send_message(warn_reply)
+            return
+        if not isinstance(record, bool):
+            raise TypeError(f"Unsupported record argument '{record}'. Expected BOOLEAN.")
+        if await self._warn_active(session, "motion"):
+            return
+
+        loop = asyncio.get_running_loop()
+        def on_motion(event):
+            loop.call_soon_threadsafe(self._spawn, self._motion_event(session, detector, event, record))
+
+        detector = MotionDetector(on_motion, zones, threshold, min_area, cell, hold, alpha)
+        with session.timer.phase("attach"):
+            await self._attach_lores_consumer(detector)
+        session.recordings["motion"] = Recording("motion", detector)
+        cmd_reply = {"status": "Motion detection started.", "details": {"zones": [list(zone) for zone in detector.zones], "lores_size": list(self._lores_size)}}
+        await session.send_message(cmd_reply)
+
+
+    async def stop_motion(self, session):
+        """Stop the motion detection of the session and a running recording of a motion event.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `frames`, `events`, the detection time per frame `mean_ms` and `max_ms`, and the stopped `recording`
+        """
+        with session.timer.phase("detach"):
+            status = await self._stop_consumer(session, "motion")
+        cmd_reply = {"status": "Motion detection stopped.", "details": status}
+        await session.send_message(cmd_reply)
+
+
+    async def _motion_event(self, session, detector, event, record):
+        """Start or stop the recording of a motion event and push the event to the client. Events of a detector are handled in order."""
+        async with self._motion_lock:
+            if record and not detector.closed:
+                try:
+                    if event["state"] == "start":
+                        event["file_name"] = await self._start_motion_recording(detector, event["event"])
+                    else:
+                        event["recording"] = await self._stop_motion_recording(detector)
+                except Exception as e:
+                    print(f"[Server] WARNING: Recording of motion event failed: {e}")
+                    event["error"] = str(e)
+        await session.send_event("motion", event)
+
+
+    async def _start_motion_recording(self, detector, number):
+        """Record the shared video stream at the size of the running pipeline into a file in `RECORDING_DIR`. Called with the motion lock held."""
+        file_name = f"{time.strftime(MOTION_FILE_PATTERN)}_{number:04d}.mp4"
+        os.makedirs(RECORDING_DIR, exist_ok=True)
+        output = self.camera.create_output(os.path.join(RECORDING_DIR, file_name), RECORDING_CONTAINERS[".mp4"])
+        sink = OutputSink(f"motion {file_name}", output, SINK_QUEUE_SIZE)
+        await self._attach_consumer(self.pipeline.size, sink, self.pipeline.crop, self.pipeline.grayscale)
+        self._motion_recordings[detector] = (sink, file_name)
+        return file_name
+
+
+    async def _stop_motion_recording(self, detector):
+        """Stop the recording of the running motion event of `detector`. Called with the motion lock held.
+
+        Returns:
+            status (dict | None): `file_name`, `sent` and `dropped` frames of the recording, `None` if none runs.
+        """
+        recording = self._motion_recordings.pop(detector, None)
+        if recording is None:
+            return None
+        sink, file_name = recording
+        return {"file_name": file_name, **await self._detach_consumer(sink)}
+
+
+    async def _read_codes(self, session, mode, timeout, roi, downscale):
+        """Scan the low resolution stream until the first code is decoded or `timeout` seconds passed."""
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ValueError(f"Invalid timeout '{timeout}'. Expected FLOAT: 0.0<TIMEOUT.")
+        loop = asyncio.get_running_loop()
+        found = loop.create_future()
+        def on_codes(codes):
+            loop.call_soon_threadsafe(lambda: found.done() or found.set_result(codes))
+
+        scanner = await loop.run_in_executor(None, self._scanner, mode, on_codes, roi, downscale)
+        await self._attach_lores_consumer(scanner)
+        try:
+            with session.timer.phase("scan"):
+                codes = await asyncio.wait_for(found, timeout)
+        except asyncio.TimeoutError:
+            codes = []
+        finally:
+            await self._detach_lores_consumer(scanner)
+        return codes
+
+
+    async def read_barcode(self, session, timeout=5.0, roi=None, downscale=1):
+        """Read the barcodes in view of the camera. See `read_qrcode`."""
+        codes = await self._read_codes(session, "barcode", timeout, roi, downscale)
+        if not codes:
+            cmd_reply = {"status": "warning", 
+                         "details": {"warning_message": "No readable barcode detected."}}
+        else:
+            cmd_reply = {"status": "Barcode[s] successfully read.", 
+                         "details": {"codes": codes}}
+        await session.send_message(cmd_reply)
 
                 
-    def read_qrcode(self):
-        raise NotImplementedError("'read_qrcode' method not fully implemented")
-        print("[Server] configure camera")
-        read_config = self.camera.create_still_configuration()
-        self.camera = self.camera.configure(read_config)
-        self.camera.start()
-        time.sleep(1)
-        print("[Server] take picture")
-        rgb_array = self.camera.capture_array()
-        print("[Server] import qreader")
-        qreader = QReader()
-        print("[Server] analyze picture")
-        qr_str_tuple = qreader.detect_and_decode(rgb_array)
-        print("[Server] send back to client")
-        if qr_str_tuple == ():
+    async def read_qrcode(self, session, timeout=5.0, roi=None, downscale=1):
+        """Read the QR codes in view of the camera. Scans the low resolution stream until the first frame with a readable code, at most for `timeout` seconds.
+
+        Args:
+            timeout (float): Maximum scan time in seconds.
+            roi (tuple | None): Region of interest `(x, y, width, height)` as fractions of the frame.
+            downscale (int): Integer reduction factor applied to the region before decoding.
+
+        Returns:
+            status_dictonary (dict): `details` key provides `codes` with `type`, `data`, `rect`, and `latency_ms` of every code
+        """
+        codes = await self._read_codes(session, "qrcode", timeout, roi, downscale)
+        if not codes:
             cmd_reply = {"status": "warning", 
                          "details": {"warning_message": "No readable QR code detected."}}
         else:
             cmd_reply = {"status": "QR-code[s] successfully read.", 
-                         "details": {"qr_str_tuple": qr_str_tuple}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
+                         "details": {"codes": codes}}
+        await session.send_message(cmd_reply)
 
       
-    def start_stream(self, resolution=(1280, 720), IP_out = None):
+    async def start_stream(self, session, resolution=(1280, 720), IP_out = None, roi=None, binning=1, grayscale=False):
         """Start streaming H.264 over UDP to the client’s STREAM_PORT. Continues until a 'stop_stream' command arrives on the control socket.
         
         Args:
             resolution (tuple): Width and height of the video stream. Example: `(1280, 720)`
             IP_out (str | None): IP adress the UDP stream is directed to. Defaults to client adress.
+            roi (tuple | None): Region of the field of view, see `start_video`.
+            binning (int): Reduction of width and height, see `start_video`.
+            grayscale (bool): Remove the colour, see `start_video`. Reduces the bitrate only, not the encoder load.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `url`, `resolution`
         """
         print("[Server] configure camera for UDP stream")
-        try:
-            width, height = resolution
-        except:
-            raise TypeError(f"Unsupported resolution argument '{resolution}'. Expected integer TUPLE (width, height).")
-        if not isinstance(width, int) or not (0 <= width <= 1920):
-            raise ValueError(f"Invalid WIDTH '{width}'. Expected INTEGER 0<=WIDTH<=1920.")
-        if not isinstance(height, int) or not (0 <= height <= 1080):
-            raise ValueError(f"Invalid HEIGHT '{height}'. Expected INTEGER 0<=HEIGHT<=1080.")
-
-        # Configure Picamera2 for video stream
-        self.camera.video_configuration.main.size = (width, height)
-        encoder = H264Encoder()
-        self.camera.configure("video")
-
-        # Create PyavOutput for sending MPEG-TS, build UDP URL and inform client that streaming started
+        width, height = self._parse_video_resolution(resolution)
+        roi, binning, grayscale = self._parse_region(roi, binning, grayscale)
+        width, height = _region_size((width, height), roi, binning)
+
+        # Create an output for sending MPEG-TS, build UDP URL and inform client that streaming started
         if IP_out == None: 
-            udp_url = f"udp://{self.addr[0]}:{self.STREAM_PORT}"
-            IP_out = self.addr[0]
+            udp_url = f"udp://{session.addr[0]}:{self.STREAM_PORT}"
+            IP_out = session.addr[0]
         else:
             udp_url = f"udp://{IP_out}:{self.STREAM_PORT}"
             IP_out = "<server_ip>"
+
+        if await self._warn_active(session, "stream"):
+            return
+
         print(f"[Server] streaming over UDP to {udp_url}")
-        output = PyavOutput(udp_url, format="mpegts")
-        self.camera.start_recording(encoder, output)
+        # Live viewers prefer a fresh picture, a stalled stream skips the queued frames
+        sink = OutputSink(udp_url, self.camera.create_output(udp_url, "mpegts"), SINK_QUEUE_SIZE, drop_policy="queued")
+        with session.timer.phase("attach"):
+            await self._attach_consumer((width, height), sink, roi, grayscale)
+        session.recordings["stream"] = Recording("stream", sink)
         cmd_reply = {"status": "Stream started over UDP stream socket.", 
-                     "details": {"url": f"udp://{IP_out}:{self.STREAM_PORT}"}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
+                     "details": {"url": f"udp://{IP_out}:{self.STREAM_PORT}",
+                                 "resolution": [width, height]}}
+        await session.send_message(cmd_reply)
 
-        # Continue streaming until stop command is recieved
-        while True:
-            raw = self.conn.recv(2048)
-            cmd_obj = json.loads(raw.decode("utf‐8"))
-            if cmd_obj.get("action") != "stop_stream":
-                warn_reply = {"status": "warning",
-                              "details": {"warning_message": (f"Command '{cmd_obj}' cannot be executed. Allowed action: 'stop_stream'.")}}
-                self.conn.sendall(json.dumps(warn_reply).encode("utf‐8"))
-                continue
-            break
-
-        self.camera.stop_recording()
-        cmd_reply = {"status": "UDP stream stopped.", "details": {}}
-        self.conn.sendall(json.dumps(cmd_reply).encode("utf‐8"))
+
+    async def clear_focus(self, session, focus_profile=None):
+        """Forget the cached lens position of a focus profile, or of all profiles, so the next capture with it runs the autofocus cycle."""
+        focus_profile = self._parse_focus_profile(focus_profile)
+        # The cache belongs to the camera thread
+        await self.scheduler.call(self.focus_cache.clear, focus_profile)
+        cmd_reply = {"status": "Focus profile cleared." if focus_profile is not None else "All focus profiles cleared.",
+                     "details": {"focus_profile": focus_profile}}
+        await session.send_message(cmd_reply)
+
+
+    async def resume_transfer(self, session, transfer, offset=0):
+        """Send the rest of a transfer that was interrupted, because the data channel broke. The client reconnects its channel first.
+        Captures, arrays, previews and clips can be resumed for `RETAIN_TIMEOUT` seconds, streamed transfers (bursts, videos) can not.
+
+        Args:
+            transfer (int): Id of the interrupted transfer, which is the id of the request it answered.
+            offset (int): Number of bytes the client already received.
+
+        Returns:
+            status_dictonary (dict): `details` key provides information regarding `transfer`, `offset` and `size`
+        """
+        payload = session.retained(transfer)
+        if payload is None:
+            raise ValueError(f"Transfer '{transfer}' can not be resumed. Only interrupted captures, arrays, previews and clips are kept for {RETAIN_TIMEOUT:g} seconds.")
+        if not isinstance(offset, int) or not (0 <= offset <= len(payload)):
+            raise ValueError(f"Invalid offset '{offset}'. Expected INTEGER: 0<=OFFSET<={len(payload)}.")
+        cmd_reply = {"status": "Transfer resumed.", "details": {"transfer": transfer, "offset": offset, "size": len(payload)}}
+        await session.send_message(cmd_reply)
+
+        with session.timer.phase("accept"):
+            data_connection = await session.open_transfer(DATA_TIMEOUT, transfer, offset=offset)
+        try:
+            with session.timer.phase("send"):
+                await data_connection.send(memoryview(payload)[offset:])
+        except OSError as e:
+            # The payload stays retained, the client resumes again after reconnecting
+            raise RuntimeError(f"Resuming transfer '{transfer}' failed: {e}")
+        finally:
+            data_connection.close()
+        print(f"[Server] transfer {transfer} resumed at {offset} of {len(payload)} bytes")
+
+
+    async def get_metrics(self, session, format="json"):
+        """Report the per-phase timing histograms of all actions since the server started.
+
+        Args:
+            format (str): `json` for count, mean and percentiles per action and phase, `prometheus` for the Prometheus text format.
+
+        Returns:
+            status_dictonary (dict): `details` key provides `uptime_s`, `actions` and `errors` per action, or the Prometheus `text`
+        """
+        if format == "json":
+            details = self.metrics.snapshot()
+        elif format == "prometheus":
+            details = {"text": self.metrics.prometheus()}
+        else:
+            raise ValueError(f"Unsupported metrics format '{format}'. Only 'json' and 'prometheus' are available.")
+        await session.send_message({"status": "Metrics", "details": details})
+
+
+    async def _open_spool(self):
+        if self.spool is None:
+            self.spool = await asyncio.get_running_loop().run_in_executor(None, Spool, self.spool_dir, SPOOL_MAX_BYTES)
+        return self.spool
+
+
+    def _parse_spool_range(self, first, last, since, until, limit):
+        """Validate the selection of spool frames by sequence number, unix time and count."""
+        for name, value in (("first", first), ("last", last), ("limit", limit)):
+            if value is not None and (not isinstance(value, int) or value < 0):
+                raise ValueError(f"Invalid {name} '{value}'. Expected INTEGER: 0<={name.upper()} or NONE.")
+        for name, value in (("since", since), ("until", until)):
+            if value is not None and not isinstance(value, (int, float)):
+                raise TypeError(f"Unsupported {name} argument '{value}'. Expected FLOAT unix timestamp or NONE.")
+        if limit is None or limit > MAX_SPOOL_LIST:
+            raise ValueError(f"Invalid limit '{limit}'. Expected INTEGER: 0<=LIMIT<={MAX_SPOOL_LIST}.")
+
+
+    async def _timelapse_capture(self, job, timer):
+        """Take one time-lapse frame like `capture`, from the running video if there is one.
+
+        Returns:
+            data (bytes): Encoded frame.
+            timestamp (float): Unix time of the capture.
+        """
+        settings = job.capture
+        async with self._video_still_access(job) as pipeline:
+            if pipeline is not None:
+                timestamp = time.time()
+                with timer.phase("encode"):
+                    size = await self.scheduler.call(self._encode_still, job.buffer, settings["file_format"])
+        if pipeline is None:
+            # The job queues for the camera like a session
+            with timer.phase("queue"):
+                await self.scheduler.acquire(job)
+            try:
+                timings, _ = await self.scheduler.call(self._prepare_still, settings["resolution"], settings["autofocus"], settings["focus_length"], focus_profile=settings["focus_profile"])
+                timer.update(timings)
+                timestamp = time.time()
+                with timer.phase("encode"):
+                    size = await self.scheduler.call(self._encode_still, job.buffer, settings["file_format"])
+                if not job.persistent:
+                    with timer.phase("release"):
+                        await self.scheduler.call(self._release_still)
+            finally:
+                self.scheduler.release(job)
+        job.buffer.seek(0)
+        return job.buffer.read(size), timestamp
+
+
+    async def _run_timelapse(self, job):
+        """Capture the frames of a time-lapse into the spool until its schedule ends or it is stopped. Every capture is recorded in the metrics as `timelapse` action."""
+        loop = asyncio.get_running_loop()
+        try:
+            while job.next_at is not None:
+                delay = job.next_at - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                timer = PhaseTimer()
+                failed = True
+                try:
+                    data, timestamp = await self._timelapse_capture(job, timer)
+                    with timer.phase("spool"):
+                        await loop.run_in_executor(None, self.spool.add, data, timestamp, job.capture["file_format"])
+                    job.captured += 1
+                    failed = False
+                except Exception as e:
+                    # A failed frame does not end the time-lapse, e.g. a full disk may be cleared by fetching the spool
+                    job.failed += 1
+                    job.error = str(e)
+                    print(f"[Server] time-lapse capture failed: {e}")
+                finally:
+                    self.metrics.record("timelapse", timer, failed)
+                job.schedule(time.time())
+            print(f"[Server] time-lapse finished after {job.captured} frames")
+        finally:
+            job.next_at = None
+            if job.persistent and self._active_config is not None:
+                # In the background, the camera may be held by other sessions or a video
+                self._spawn(self._release_timelapse(job))
+
+
+    async def _release_timelapse(self, job):
+        """Stop the camera, which a persistent time-lapse kept running."""
+        async with self.scheduler.access(job):
+            await self.scheduler.call(self._release_still)
+
+
+    async def start_timelapse(self, session, interval=None, cron=None, count=None, until=None, file_format="jpeg", resolution=(4608, 2592),
+                              autofocus=True, focus_length=0.0, focus_profile=None, persistent=None, max_bytes=None):
+        """Start capturing still images on the server at a fixed interval or at cron-like times into the spool in `spool_dir`. The time-lapse runs
+        on the server until its `count` or `until` is reached or `stop_timelapse` is called, independent of the session. The frames are listed with
+        `list_spool` and transferred in bulk with `fetch_spool`.
+
+        Args:
+            interval (float | None): Seconds between two captures. Captures are aligned to the start, ticks missed because a capture took longer are skipped.
+            cron (str | None): Cron-like schedule `minute hour day month weekday` in server local time instead of `interval`, e.g. `*/5 6-18 * * 1-5`.
+            count (int | None): Number of captures, after which the time-lapse ends. `None` for no limit.
+            until (float | None): Unix timestamp, after which the time-lapse ends. `None` for no limit.
+            file_format (str): `jpeg`, `png`, `bmp`, or `gif`.
+            resolution (tuple): Width and height of the images. Frames taken while a video runs have the video resolution, see `capture`.
+            autofocus (bool): Run the autofocus cycle before every capture, use a `focus_profile` to reuse the lens position.
+            focus_length (float): Lens position, only used with `autofocus=False`.
+            focus_profile (str | None): Name of a focus profile, see `capture`.
+            persistent (bool | None): Keep the camera running between captures. `None` keeps it running for intervals below `TIMELAPSE_WARM_INTERVAL` seconds.
+            max_bytes (int | None): New disk quota of the spool, the oldest frames are evicted beyond it. `None` keeps the quota.
+
+        Returns:
+            status_dictonary (dict): `details` key provides the `timelapse` status and the `spool` status, see `timelapse_status`
+        """
+        if (interval is None) == (cron is None):
+            raise ValueError("Expected either 'interval' or 'cron'.")
+        if interval is not None and (not isinstance(interval, (int, float)) or interval <= 0):
+            raise ValueError(f"Invalid interval '{interval}'. Expected FLOAT: 0.0<INTERVAL.")
+        if count is not None and (not isinstance(count, int) or count < 1):
+            raise ValueError(f"Invalid count '{count}'. Expected INTEGER: 1<=COUNT or NONE.")
+        if until is not None and not isinstance(until, (int, float)):
+            raise TypeError(f"Unsupported until argument '{until}'. Expected FLOAT unix timestamp or NONE.")
+        if max_bytes is not None and (not isinstance(max_bytes, int) or max_bytes < 1):
+            raise ValueError(f"Invalid max_bytes '{max_bytes}'. Expected INTEGER: 1<=MAX_BYTES or NONE.")
+        width, height = self._parse_still_resolution(resolution)
+        fmt = self._parse_file_format(file_format)
+        focus_profile = self._parse_focus_profile(focus_profile)
+        if self._timelapse_task is not None and not self._timelapse_task.done():
+            warn_reply = {"status": "warning", "details": {"warning_message": "Time-lapse is already running. Call 'stop_timelapse' first."}}
+            await session.send_message(warn_reply)
+            return
+
+        spool = await self._open_spool()
+        if max_bytes is not None:
+            spool.max_bytes = max_bytes
+        if persistent is None:
+            persistent = interval is not None and interval < TIMELAPSE_WARM_INTERVAL
+        job = TimelapseJob(interval, cron, count, until, start=time.time(), persistent=persistent,
+                           file_format=fmt, resolution=(width, height), autofocus=autofocus, focus_length=focus_length, focus_profile=focus_profile)
+        # Schedules the first capture and raises on a cron expression that never matches
+        job.schedule(job.start)
+        self.timelapse = job
+        self._timelapse_task = self._spawn(self._run_timelapse(job))
+        print(f"[Server] time-lapse started ({'every ' + str(interval) + ' s' if interval is not None else cron})")
+        cmd_reply = {"status": "Time-lapse started.", "details": {"timelapse": job.status(), "spool": spool.status()}}
+        await session.send_message(cmd_reply)
+
+
+    async def stop_timelapse(self, session):
+        """Stop the running time-lapse. The spool is kept.
+
+        Returns:
+            status_dictonary (dict): `details` key provides the final `timelapse` status and the `spool` status
+        """
+        task = self._timelapse_task
+        if task is None or task.done():
+            warn_reply = {"status": "warning", "details": {"warning_message": "Command 'stop_timelapse' can only be excecuted, if 'start_timelapse' is running."}}
+            await session.send_message(warn_reply)
+            return
+        task.cancel()
+        with session.timer.phase("detach"):
+            await asyncio.gather(task, return_exceptions=True)
+        cmd_reply = {"status": "Time-lapse stopped.", "details": {"timelapse": self.timelapse.status(), "spool": self.spool.status()}}
+        await session.send_message(cmd_reply)
+        print(f"[Server] {cmd_reply['status']}")
+
+
+    async def timelapse_status(self, session):
+        """Report the time-lapse and the spool.
+
+        Returns:
+            status_dictonary (dict): `details` key provides `running`, the `timelapse` (`interval`, `cron`, `count`, `until`, `captured`, `failed`, `missed`, last `error`, `next_at`)
+                and the `spool` (`frames`, `bytes`, `max_bytes`, `evicted`, `first` and `last` sequence number)
+        """
+        spool = await self._open_spool()
+        running = self._timelapse_task is not None and not self._timelapse_task.done()
+        cmd_reply = {"status": "Time-lapse status",
+                     "details": {"running": running,
+                                 "timelapse": self.timelapse.status() if self.timelapse is not None else None,
+                                 "spool": spool.status()}}
+        await session.send_message(cmd_reply)
+
+
+    async def list_spool(self, session, first=None, last=None, since=None, until=None, limit=1000):
+        """List the frames in the spool, optionally within the sequence numbers `first`-`last` and the unix times `since`-`until` (all inclusive).
+
+        Returns:
+            status_dictonary (dict): `details` key provides `entries` (`seq`, `timestamp`, `file_name`, `size`, `crc32`) of at most `limit` frames, `truncated` if there are more, and the `spool` status
+        """
+        self._parse_spool_range(first, last, since, until, limit)
+        spool = await self._open_spool()
+        entries = spool.entries(first, last, since, until, limit + 1)
+        cmd_reply = {"status": "Spool listed.",
+                     "details": {"entries": [entry.to_dict() for entry in entries[:limit]],
+                                 "truncated": len(entries) > limit,
+                                 "spool": spool.status()}}
+        await session.send_message(cmd_reply)
+
+
+    async def fetch_spool(self, session, first=None, last=None, since=None, until=None, limit=1000):
+        """Transfer the frames selected like in `list_spool` as one streamed tar archive via data socket. Reading the next frame from disk overlaps with sending the previous one.
+        The selected frames are pinned until the transfer ended, so frames deleted or evicted in the meantime are still sent and the reply announces exactly the
+        archive that follows. The spool is not changed, fetched frames are deleted with `delete_spool`.
+
+        Returns:
+            status_dictonary (dict): `details` key provides the `entries` in the archive (see `list_spool`), `truncated`, and the archive `size` in bytes
+        """
+        self._parse_spool_range(first, last, since, until, limit)
+        spool = await self._open_spool()
+        loop = asyncio.get_running_loop()
+        entries = await loop.run_in_executor(None, spool.pin, first, last, since, until, limit + 1)
+        truncated = len(entries) > limit
+        if truncated:
+            spool.unpin(entries[limit:])
+            entries = entries[:limit]
+        try:
+            size = sum(len(tar_header(entry)) + entry.size + len(tar_padding(entry.size)) for entry in entries) + len(TAR_END)
+            cmd_reply = {"status": "spool selected, starting transfer...",
+                         "details": {"entries": [entry.to_dict() for entry in entries],
+                                     "truncated": truncated,
+                                     "size": size}}
+            await session.send_message(cmd_reply)
+
+            def read(entry):
+                with open(spool.path(entry), "rb") as f:
+                    data = f.read()
+                if len(data) != entry.size:
+                    raise OSError(f"Spool frame '{entry.file_name}' has {len(data)} bytes instead of {entry.size}.")
+                return data
+
+            with session.timer.phase("accept"):
+                data_connection = await self.data_dispatcher.accept_data(session, DATA_TIMEOUT)
+            pending = loop.run_in_executor(None, read, entries[0]) if entries else None
+            try:
+                with session.timer.phase("send"):
+                    for index, entry in enumerate(entries):
+                        # A frame that can not be read aborts the transfer, the archive would no longer match the reply
+                        data = await pending
+                        pending = loop.run_in_executor(None, read, entries[index + 1]) if index + 1 < len(entries) else None
+                        await data_connection.send(tar_header(entry))
+                        await data_connection.send(data)
+                        await data_connection.send(tar_padding(entry.size))
+                    await data_connection.send(TAR_END)
+            finally:
+                if pending is not None:
+                    await asyncio.gather(pending, return_exceptions=True)
+                data_connection.close()
+        finally:
+            await loop.run_in_executor(None, spool.unpin, entries)
+        print(f"[Server] {len(entries)} spool frames were sent")
+
+
+    async def delete_spool(self, session, seqs):
+        """Delete frames from the spool, e.g. after the client fetched and verified them.
+
+        Args:
+            seqs (list): Sequence numbers of the frames to delete. Unknown numbers are ignored.
+
+        Returns:
+            status_dictonary (dict): `details` key provides the number of `deleted` frames and the `spool` status
+        """
+        if not isinstance(seqs, list) or not all(isinstance(seq, int) for seq in seqs):
+            raise TypeError(f"Unsupported seqs argument '{seqs}'. Expected LIST of INTEGER sequence numbers.")
+        spool = await self._open_spool()
+        deleted = await asyncio.get_running_loop().run_in_executor(None, spool.delete, seqs)
+        cmd_reply = {"status": "Spool frames deleted.", "details": {"deleted": deleted, "spool": spool.status()}}
+        await session.send_message(cmd_reply)
+
+
+    async def stop_stream(self, session):
+        """Stop the active UDP stream of the session."""
+        with session.timer.phase("detach"):
+            status = await self._stop_consumer(session, "stream")
+        cmd_reply = {"status": "UDP stream stopped.", "details": status}
+        await session.send_message(cmd_reply)
         print(f"[Server] {cmd_reply['status']}")
     
 if __name__ == "__main__":
-    server = CameraServer(CMD_PORT, DATA_PORT, STREAM_PORT)
-    server.start()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Camera server for the Raspberry Pi camera module.")
+    parser.add_argument("--backend", choices=("picamera2", "fake"), default="picamera2", help="Camera backend, 'fake' runs without a camera on synthetic frames.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate of the fake camera.")
+    parser.add_argument("--cmd-port", type=int, default=CMD_PORT)
+    parser.add_argument("--data-port", type=int, default=DATA_PORT)
+    parser.add_argument("--stream-port", type=int, default=STREAM_PORT)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help=f"Serve the metrics in Prometheus text format on {METRICS_HOST}:<port>.")
+    parser.add_argument("--spool-dir", default=SPOOL_DIR, help="Directory of the time-lapse spool.")
+    args = parser.parse_args()
+
+    server = CameraServer(args.cmd_port, args.data_port, args.stream_port, camera=create_backend(args.backend, args.fps), metrics_port=args.metrics_port, spool_dir=args.spool_dir)
+    server.start()
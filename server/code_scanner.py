@@ -0,0 +1,183 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# zbar symbol types decoded by the scan modes
+SCAN_SYMBOLS = {"qrcode": ("QRCODE",),
+                "barcode": ("EAN13", "EAN8", "UPCA", "UPCE", "CODE128", "CODE39", "CODE93", "I25", "CODABAR", "DATABAR")}
+SCAN_SYMBOLS["all"] = SCAN_SYMBOLS["qrcode"] + SCAN_SYMBOLS["barcode"]
+
+
+def decode_codes(image: np.ndarray, symbols: tuple) -> list:
+    """Decode all codes of the given symbol types in a grayscale image with zbar. Runs in the scanner worker process.
+
+    Returns:
+        codes (list): `{"type", "data", "rect"}` dictionaries, `rect` as `[left, top, width, height]` in image pixels.
+    """
+    from pyzbar import pyzbar
+    codes = pyzbar.decode(image, symbols=[getattr(pyzbar.ZBarSymbol, symbol) for symbol in symbols])
+    return [{"type": code.type,
+             "data": code.data.decode("utf-8", errors="replace"),
+             "rect": [code.rect.left, code.rect.top, code.rect.width, code.rect.height]} for code in codes]
+
+
+def _load_decoder():
+    # Import zbar when the worker process starts, not with the first frame
+    from pyzbar import pyzbar
+
+
+def create_decoder_pool(workers: int = 1) -> ProcessPoolExecutor:
+    """Start the worker processes that decode the frames of all scanners.
+    The workers are fresh interpreters instead of forks of the multi-threaded camera server, and load zbar right away."""
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    for _ in range(workers):
+        pool.submit(_load_decoder)
+    return pool
+
+
+def crop_frame(frame: np.ndarray, roi=None, downscale: int = 1) -> np.ndarray:
+    """Cut the region of interest from a frame and keep every `downscale`-th pixel in both directions.
+
+    Args:
+        roi (tuple | None): `(x, y, width, height)` as fractions `0.0`-`1.0` of the frame size. `None` keeps the whole frame.
+        downscale (int): Integer reduction factor.
+
+    Returns:
+        image (np.ndarray): Contiguous copy of the selected pixels, which no longer references the camera buffer.
+    """
+    if roi is not None:
+        height, width = frame.shape[:2]
+        x, y, w, h = roi
+        frame = frame[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)]
+    return np.ascontiguousarray(frame[::downscale, ::downscale])
+
+
+class TTLCache:
+    """Set of keys that expire `ttl` seconds after they were last seen.
+    A code that stays in view keeps its entry alive and is reported once, it is reported again after being out of view for `ttl` seconds."""
+
+    def __init__(self, ttl: float, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._seen = {}
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add(self, key) -> bool:
+        """Mark `key` as seen now. Returns `True` if it was not seen within the last `ttl` seconds."""
+        now = self.clock()
+        for old in [old for old, seen in self._seen.items() if now - seen > self.ttl]:
+            del self._seen[old]
+        new = key not in self._seen
+        self._seen[key] = now
+        return new
+
+
+class CodeScanner:
+    """Continuous QR code and barcode decoding of camera frames in a worker process of `pool`.
+
+    `submit` is called with every low resolution frame and never blocks: while the worker still decodes a frame,
+    new frames are skipped, so decoding always works on the newest frame and never slows down the camera.
+    Decoded codes are de-duplicated by a `TTLCache` and handed to `on_codes` on a worker callback thread.
+    The scanner has no camera dependency and can be fed with synthetic frames.
+    """
+
+    def __init__(self, mode: str, on_codes, pool: ProcessPoolExecutor, roi=None, downscale: int = 1, interval: float = 0.0, ttl: float = 2.0, decoder=decode_codes):
+        if mode not in SCAN_SYMBOLS:
+            raise ValueError(f"Unsupported scan mode '{mode}'. Only {', '.join(repr(m) for m in SCAN_SYMBOLS)} are available.")
+        if roi is not None:
+            try:
+                x, y, w, h = (float(value) for value in roi)
+            except (TypeError, ValueError):
+                raise TypeError(f"Unsupported roi argument '{roi}'. Expected float TUPLE of format (x, y, width, height) or NONE.")
+            if not (0.0 <= x < 1.0 and 0.0 <= y < 1.0 and 0.0 < w <= 1.0 - x and 0.0 < h <= 1.0 - y):
+                raise ValueError(f"Invalid roi '{roi}'. Expected fractions of the frame: 0.0<=X, 0.0<=Y, 0.0<WIDTH<=1.0-X, 0.0<HEIGHT<=1.0-Y.")
+            roi = (x, y, w, h)
+        if not isinstance(downscale, int) or not (1 <= downscale <= 8):
+            raise ValueError(f"Invalid downscale '{downscale}'. Expected INTEGER: 1<=DOWNSCALE<=8.")
+        if not isinstance(interval, (int, float)) or interval < 0:
+            raise ValueError(f"Invalid interval '{interval}'. Expected FLOAT: 0.0<=INTERVAL.")
+        if not isinstance(ttl, (int, float)) or ttl < 0:
+            raise ValueError(f"Invalid ttl '{ttl}'. Expected FLOAT: 0.0<=TTL.")
+        self.mode = mode
+        self.symbols = SCAN_SYMBOLS[mode]
+        self.on_codes = on_codes
+        self.pool = pool
+        self.roi = roi
+        self.downscale = downscale
+        self.interval = interval
+        self.decoder = decoder
+        self.cache = TTLCache(ttl)
+        self.decoded = 0
+        self.skipped = 0
+        self.error = None
+        self._busy = False
+        self._closed = False
+        self._next_submit = 0.0
+        self._lock = threading.Lock()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode,
+                    "decoded": self.decoded,
+                    "skipped": self.skipped,
+                    "error": self.error}
+
+    def submit(self, frame: np.ndarray, timestamp: float = None) -> bool:
+        """Hand a grayscale frame to the worker process. Returns `False` if the frame was skipped."""
+        now = time.monotonic()
+        timestamp = now if timestamp is None else timestamp
+        with self._lock:
+            if self._closed or self._busy or now < self._next_submit:
+                self.skipped += 1
+                return False
+            self._busy = True
+            self._next_submit = now + self.interval
+        image = crop_frame(frame, self.roi, self.downscale)
+        origin = (0, 0) if self.roi is None else (int(self.roi[0] * frame.shape[1]), int(self.roi[1] * frame.shape[0]))
+        try:
+            future = self.pool.submit(self.decoder, image, self.symbols)
+        except RuntimeError:
+            # The pool was shut down in the meantime
+            with self._lock:
+                self._busy = False
+                self.skipped += 1
+            return False
+        future.add_done_callback(lambda future: self._decoded(future, timestamp, origin))
+        return True
+
+    def _decoded(self, future, timestamp, origin):
+        with self._lock:
+            self._busy = False
+            if self._closed or future.cancelled():
+                return
+        try:
+            codes = future.result()
+        except Exception as e:
+            with self._lock:
+                first_error = self.error is None
+                self.error = str(e)
+            if first_error:
+                print(f"[Server] code decoding failed: {e}")
+            return
+        with self._lock:
+            self.decoded += 1
+        now = time.monotonic()
+        new = [code for code in codes if self.cache.add((code["type"], code["data"]))]
+        if new:
+            for code in new:
+                # Back to pixels of the full frame
+                left, top, width, height = (value * self.downscale for value in code["rect"])
+                code["rect"] = [left + origin[0], top + origin[1], width, height]
+                code["latency_ms"] = round((now - timestamp) * 1000, 3)
+            self.on_codes(new)
+
+    def close(self):
+        """Stop decoding. Results of a frame that is still being decoded are discarded."""
+        with self._lock:
+            self._closed = True
@@ -0,0 +1,323 @@
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from camera_backend import CameraBackend
+
+
+# Encoded size per pixel of synthetic still images, and the magic bytes they start with
+STILL_FORMATS = {"jpeg": (0.25, b"\xff\xd8\xff\xe0"),
+                 "png": (1.5, b"\x89PNG\r\n\x1a\n"),
+                 "bmp": (3.0, b"BM"),
+                 "gif": (1.0, b"GIF89a")}
+# Channels of raw arrays per pixel format, YUV420 is handled separately
+ARRAY_CHANNELS = {"RGB888": 3, "BGR888": 3, "XRGB8888": 4, "XBGR8888": 4}
+# Annex B start code and NAL unit headers of the synthetic H.264 stream
+START_CODE = b"\x00\x00\x00\x01"
+NAL_SPS, NAL_PPS, NAL_IDR, NAL_P = b"\x67", b"\x68", b"\x65", b"\x41"
+# Payload of a UDP datagram, as 7 MPEG-TS packets
+UDP_PAYLOAD = 1316
+# MPEG-TS packet size, and the PIDs of the program map table and the video stream of the synthetic transport stream
+TS_PACKET = 188
+TS_PID_PMT, TS_PID_VIDEO = 0x1000, 0x100
+
+
+def test_pattern(index: int, width: int, height: int) -> np.ndarray:
+    """Grey gradient with a bright vertical bar moving by 4 pixels per frame."""
+    frame = np.tile(np.linspace(16, 160, width, dtype=np.uint8), (height, 1))
+    bar = (index * 4) % width
+    frame[:, bar:bar + 8] = 235
+    return frame
+
+
+def _crc32_mpeg2(data: bytes) -> int:
+    """CRC-32/MPEG-2 checksum, which ends the sections of the MPEG-TS program tables."""
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) & 0xFFFFFFFF if crc & 0x80000000 else (crc << 1) & 0xFFFFFFFF
+    return crc
+
+
+def _psi_section(table_id: int, body: bytes) -> bytes:
+    """Program table section with `body` after the section header, as payload of a single packet with pointer field."""
+    header = bytes((table_id, 0xB0 | ((len(body) + 9) >> 8), (len(body) + 9) & 0xFF, 0x00, 0x01, 0xC1, 0x00, 0x00))
+    section = header + body
+    return b"\x00" + section + struct.pack("!I", _crc32_mpeg2(section))
+
+
+# Program association table (program 1 at `TS_PID_PMT`) and program map table (H.264 on `TS_PID_VIDEO`, which carries the PCR)
+TS_PAT = _psi_section(0x00, struct.pack("!HH", 1, 0xE000 | TS_PID_PMT))
+TS_PMT = _psi_section(0x02, struct.pack("!HH", 0xE000 | TS_PID_VIDEO, 0xF000) + struct.pack("!BHH", 0x1B, 0xE000 | TS_PID_VIDEO, 0xF000))
+
+
+class TransportStreamMuxer:
+    """Minimal MPEG-TS muxer for the synthetic H.264 stream. Every frame becomes one PES packet on `TS_PID_VIDEO` with its
+    presentation timestamp and a PCR in the first TS packet, keyframes are preceded by the program tables. Continuity
+    counters run per PID like in a real multiplex, so receivers can detect lost packets."""
+
+    def __init__(self):
+        self._counters = {}
+
+    def _packet(self, pid: int, payload: bytes, start: bool, pcr: int = None) -> bytes:
+        """One TS packet with `payload`, which fits into it. Free space and the PCR (27 MHz) go into the adaptation field."""
+        counter = self._counters.get(pid, 0)
+        self._counters[pid] = (counter + 1) & 0x0F
+        pid_field = (0x4000 if start else 0) | pid
+        room = TS_PACKET - 4 - len(payload)
+        if pcr is None and room == 0:
+            return struct.pack("!BHB", 0x47, pid_field, 0x10 | counter) + payload
+        if pcr is not None:
+            base = (pcr // 300) & 0x1FFFFFFFF
+            field = b"\x10" + struct.pack("!IH", base >> 1, ((base & 1) << 15) | 0x7E00 | (pcr % 300))
+        else:
+            field = b"\x00" if room > 1 else b""
+        field += b"\xff" * (room - 1 - len(field))
+        return struct.pack("!BHBB", 0x47, pid_field, 0x30 | counter, room - 1) + field + payload
+
+    def mux(self, frame, keyframe: bool, timestamp: int) -> bytes:
+        """TS packets of one encoded frame with `timestamp` in microseconds."""
+        packets = []
+        if keyframe:
+            packets.append(self._packet(0, TS_PAT.ljust(TS_PACKET - 4, b"\xff"), True))
+            packets.append(self._packet(TS_PID_PMT, TS_PMT.ljust(TS_PACKET - 4, b"\xff"), True))
+        pts = (timestamp * 9 // 100) & 0x1FFFFFFFF
+        pes = (b"\x00\x00\x01\xe0\x00\x00\x80\x80\x05"
+               + bytes((0x21 | (pts >> 29) & 0x0E, (pts >> 22) & 0xFF, 0x01 | (pts >> 14) & 0xFE, (pts >> 7) & 0xFF, 0x01 | (pts << 1) & 0xFE))
+               + bytes(frame))
+        # The first packet loses 8 payload bytes to the adaptation field with the PCR
+        first = TS_PACKET - 12
+        packets.append(self._packet(TS_PID_VIDEO, pes[:first], True, pcr=timestamp * 27))
+        for start in range(first, len(pes), TS_PACKET - 4):
+            packets.append(self._packet(TS_PID_VIDEO, pes[start:start + TS_PACKET - 4], False))
+        return b"".join(packets)
+
+
+class FakeOutput:
+    """Output of the fake camera. Writes the stream to a file, or sends it in UDP datagrams to `udp://<host>:<port>` targets.
+    With `format` `mpegts` the stream is muxed into a transport stream first, other formats write the raw stream."""
+
+    def __init__(self, target: str, format: str = None):
+        self.target = target
+        self.recording = False
+        self._file = None
+        self._socket = None
+        self._muxer = TransportStreamMuxer() if format == "mpegts" else None
+
+    def _add_stream(self, encoder_stream, *args, **kwargs):
+        pass
+
+    def start(self):
+        url = urlparse(self.target)
+        if url.scheme == "udp":
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._address = (url.hostname, url.port)
+        else:
+            self._file = open(self.target, "wb")
+        self.recording = True
+
+    def stop(self):
+        self.recording = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if not self.recording:
+            return
+        if self._muxer is not None:
+            frame = self._muxer.mux(frame, keyframe, timestamp or 0)
+        if self._file is not None:
+            self._file.write(frame)
+        else:
+            view = memoryview(frame)
+            for start in range(0, len(view), UDP_PAYLOAD):
+                self._socket.sendto(view[start:start + UDP_PAYLOAD], self._address)
+
+
+class FakeCamera(CameraBackend):
+    """Synthetic camera, which runs the server without a Raspberry Pi.
+
+    While started, a frame thread ticks at `fps`. Every tick renders `pattern(index, width, height)` into the low
+    resolution stream and, while the encoder runs, emits one frame of a H.264-like byte stream: Annex B start codes,
+    a keyframe (SPS, PPS, IDR) every `iperiod` frames and P-frames in between, sized for `bitrate` bits per second.
+    Still captures wait for the next frame tick like a real sensor and return data of the size typical for the format.
+    Configuration and autofocus take fixed simulated times. The low resolution stream of still configurations is blurred
+    the further the lens is away from `focus_target`, where the autofocus cycle converges.
+    """
+
+    def __init__(self, fps: float = 30.0, bitrate: int = 8_000_000, configure_time: float = 0.05, autofocus_time: float = 0.0, pattern=test_pattern):
+        if fps <= 0:
+            raise ValueError(f"Invalid fps '{fps}'. Expected FLOAT: 0.0<FPS.")
+        self.fps = fps
+        self.bitrate = bitrate
+        self.configure_time = configure_time
+        self.autofocus_time = autofocus_time
+        self.pattern = pattern
+        self.focus_target = 1.0
+        self._lens_position = None
+        self._config = None
+        self._video = None
+        self._lores_callback = None
+        self._encoder = None
+        self._payloads = {}
+        self._arrays = {}
+        self._frame_index = 0
+        self._tick = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def create_still_configuration(self, size, pixel_format, lores_size=None, crop=None):
+        return {"size": tuple(size), "format": pixel_format, "lores": None if lores_size is None else tuple(lores_size), "crop": crop}
+
+    def configure(self, config):
+        if self._running:
+            raise RuntimeError("Camera must be stopped before configuring")
+        time.sleep(self.configure_time)
+        self._config = config
+        self._video = None
+
+    def configure_video(self, size, lores_size, crop=None, grayscale=False):
+        if self._running:
+            raise RuntimeError("Camera must be stopped before configuring")
+        time.sleep(self.configure_time)
+        self._config = {"size": tuple(size), "format": "XBGR8888", "crop": crop, "grayscale": grayscale}
+        self._video = tuple(lores_size)
+        return self._video
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="fake camera", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join()
+        self._thread = None
+
+    def autofocus_cycle(self) -> bool:
+        time.sleep(self.autofocus_time)
+        self._lens_position = self.focus_target
+        return True
+
+    def set_lens_position(self, position):
+        self._lens_position = position
+
+    def lens_position(self):
+        return self._lens_position
+
+    def _next_frame(self):
+        """Wait for the next frame tick of the running camera."""
+        if not self._running:
+            raise RuntimeError("Camera is not running")
+        with self._tick:
+            index = self._frame_index
+            if not self._tick.wait_for(lambda: self._frame_index != index, timeout=1.0):
+                raise RuntimeError("Camera frame timed out")
+
+    def capture_file(self, file, format):
+        self._next_frame()
+        key = (self._config["size"], format)
+        if key not in self._payloads:
+            width, height = self._config["size"]
+            bytes_per_pixel, magic = STILL_FORMATS[format]
+            size = max(int(width * height * bytes_per_pixel), len(magic))
+            self._payloads[key] = magic + bytes(range(256)) * ((size - len(magic)) // 256) + bytes((size - len(magic)) % 256)
+        file.write(self._payloads[key])
+
+    def capture_array(self, name="main"):
+        self._next_frame()
+        key = (self._config["size"], self._config["format"])
+        if key not in self._arrays:
+            width, height = self._config["size"]
+            luma = self.pattern(self._frame_index, width, height)
+            if self._config["format"] == "YUV420":
+                self._arrays[key] = np.vstack([luma, np.full((height // 2, width), 128, dtype=np.uint8)])
+            else:
+                self._arrays[key] = np.repeat(luma[:, :, None], ARRAY_CHANNELS[self._config["format"]], axis=2)
+        return self._arrays[key].copy()
+
+    def capture_lores(self):
+        if not self._config.get("lores"):
+            raise RuntimeError("Configuration has no low resolution stream")
+        self._next_frame()
+        # Still captures show a static scene, like arrays of `capture_array`
+        return self._blurred(self.pattern(0, *self._config["lores"]))
+
+    def _blurred(self, luma):
+        """Blur `luma` by the distance of the lens to `focus_target`."""
+        # Box blur along the rows, one pixel wider per 0.1 of defocus
+        defocus = abs((self._lens_position if self._lens_position is not None else 0.0) - self.focus_target)
+        width = 1 + int(defocus * 10)
+        if width > 1:
+            kernel = np.ones(width, dtype=np.float32) / width
+            luma = np.apply_along_axis(np.convolve, 1, luma.astype(np.float32), kernel, "same").astype(np.uint8)
+        return luma
+
+    def set_lores_callback(self, callback):
+        self._lores_callback = callback
+
+    def start_encoder(self, on_frame, on_stream, iperiod):
+        if self._video is None or not self._running:
+            raise RuntimeError("Encoder requires a running video configuration")
+        width, height = self._config["size"]
+        on_stream("video", "h264", width=width, height=height)
+        # Average frame size matches the bitrate with keyframes four times the size of P-frames
+        average = self.bitrate / 8 / self.fps
+        p_size = int(average * iperiod / (iperiod + 3))
+        self._encoder = (on_frame, iperiod, self._frame_index, p_size)
+
+    def stop_encoder(self):
+        self._encoder = None
+
+    def create_output(self, target, format=None):
+        return FakeOutput(target, format)
+
+    def _encoded_frame(self, count, iperiod, p_size):
+        """Frame `count` of the synthetic H.264 stream, with the frame number behind the NAL header."""
+        number = struct.pack("!I", count)
+        if count % iperiod == 0:
+            headers = START_CODE + NAL_SPS + b"\x42\xc0\x28" + number + START_CODE + NAL_PPS + b"\xce\x3c\x80"
+            return headers + START_CODE + NAL_IDR + number + b"\xaa" * (4 * p_size), True
+        return START_CODE + NAL_P + number + b"\xaa" * p_size, False
+
+    def _run(self):
+        period = 1 / self.fps
+        next_tick = time.perf_counter()
+        while self._running:
+            with self._tick:
+                self._frame_index += 1
+                index = self._frame_index
+                self._tick.notify_all()
+
+            callback = self._lores_callback
+            lores = self._video or self._config.get("lores")
+            if callback is not None and lores is not None:
+                callback(self.pattern(index, *lores))
+            encoder = self._encoder
+            # A tick before the encoder started is not encoded
+            if encoder is not None and index > encoder[2]:
+                on_frame, iperiod, first, p_size = encoder
+                count = index - first - 1
+                frame, keyframe = self._encoded_frame(count, iperiod, p_size)
+                on_frame(frame, keyframe, int(count * period * 1_000_000))
+
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind, drop the missed ticks like a sensor would
+                next_tick = time.perf_counter()
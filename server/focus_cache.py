@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def focus_sharpness(luma: np.ndarray) -> float:
+    """Sharpness of a grayscale image as mean squared gradient between neighbouring pixels. Defocus blurs edges and lowers it."""
+    image = luma.astype(np.float32)
+    dx = np.diff(image, axis=1)
+    dy = np.diff(image, axis=0)
+    return float(np.mean(dx * dx) + np.mean(dy * dy))
+
+
+class FocusEntry:
+    """Converged lens position of a focus profile and the sharpness measured right after the autofocus cycle."""
+
+    def __init__(self, lens_position: float, sharpness: float, created: float):
+        self.lens_position = lens_position
+        self.sharpness = sharpness
+        self.created = created
+
+
+class FocusCache:
+    """Last converged lens position per named focus profile, e.g. one per inspection fixture.
+
+    Entries expire `ttl` seconds after their autofocus cycle, reusing an entry does not extend it. At most `max_profiles`
+    entries are kept, the least recently used profile is dropped first.
+    """
+
+    def __init__(self, ttl: float, max_profiles: int, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_profiles = max_profiles
+        self.clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, profile: str) -> FocusEntry:
+        """Return the entry of `profile`, or `None` if there is none or it expired."""
+        entry = self._entries.get(profile)
+        if entry is None:
+            return None
+        if self.clock() - entry.created > self.ttl:
+            del self._entries[profile]
+            return None
+        self._entries.move_to_end(profile)
+        return entry
+
+    def put(self, profile: str, lens_position: float, sharpness: float):
+        self._entries[profile] = FocusEntry(lens_position, sharpness, self.clock())
+        self._entries.move_to_end(profile)
+        while len(self._entries) > self.max_profiles:
+            self._entries.popitem(last=False)
+
+    def clear(self, profile: str = None):
+        """Forget one profile, or all profiles if `profile` is `None`."""
+        if profile is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(profile, None)
@@ -0,0 +1,149 @@
+import asyncio
+import contextlib
+import time
+from bisect import bisect_left
+
+
+# Upper bounds in milliseconds of the histogram buckets, roughly logarithmic from 0.1 ms to 30 s
+BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0, 5000.0, 10000.0, 30000.0)
+# Distinct action labels kept, further unknown actions are counted as `other`
+MAX_ACTIONS = 64
+
+
+class Histogram:
+    """Counts of durations in the fixed `BUCKETS_MS` buckets. Observing is one bisect and three additions, percentiles are estimated from the buckets."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def quantile(self, q: float) -> float:
+        """Estimate the `q` quantile (`0.0`-`1.0`) by linear interpolation inside its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS_MS[index - 1] if index > 0 else 0.0
+                upper = BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {"count": self.count,
+                "mean_ms": round(self.sum / self.count, 3) if self.count else 0.0,
+                "p50_ms": round(self.quantile(0.50), 3),
+                "p95_ms": round(self.quantile(0.95), 3),
+                "p99_ms": round(self.quantile(0.99), 3),
+                "max_ms": round(self.max, 3)}
+
+
+class PhaseTimer:
+    """Phase timings in milliseconds of the command a session currently executes. Repeated phases (e.g. `encode` of every burst frame) add up."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+
+    def add(self, phase: str, value_ms: float):
+        self.timings[phase] = round(self.timings.get(phase, 0.0) + value_ms, 3)
+
+    def update(self, timings: dict):
+        """Add phase timings measured elsewhere, e.g. on the camera thread."""
+        for phase, value_ms in timings.items():
+            self.add(phase, value_ms)
+
+    @contextlib.contextmanager
+    def phase(self, phase: str):
+        """Time the `with` block as `phase`."""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, (time.perf_counter() - t_start) * 1000)
+
+    def elapsed(self) -> float:
+        """Milliseconds since the command was received."""
+        return round((time.perf_counter() - self.start) * 1000, 3)
+
+
+class Metrics:
+    """Histograms of the phase timings of all server actions, by action and phase, plus error counts per action.
+    Only the event loop records into it, so no locking is needed."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {}
+        self.errors = {}
+
+    def _label(self, action) -> str:
+        action = action if isinstance(action, str) else "unknown"
+        if action not in self.errors and len(self.errors) >= MAX_ACTIONS:
+            return "other"
+        return action
+
+    def record(self, action, timer: PhaseTimer, failed: bool = False):
+        """Record the phases of a finished command together with its `total` duration."""
+        action = self._label(action)
+        self.errors[action] = self.errors.get(action, 0) + int(failed)
+        phases = self.histograms.setdefault(action, {})
+        for phase, value_ms in timer.timings.items():
+            phases.setdefault(phase, Histogram()).observe(value_ms)
+        phases.setdefault("total", Histogram()).observe(timer.elapsed())
+
+    def snapshot(self) -> dict:
+        return {"uptime_s": round(time.time() - self.started, 3),
+                "actions": {action: {phase: histogram.snapshot() for phase, histogram in phases.items()}
+                            for action, phases in self.histograms.items()},
+                "errors": {action: count for action, count in self.errors.items() if count}}
+
+    def prometheus(self) -> str:
+        """Render the histograms in the Prometheus text exposition format, with durations in seconds."""
+        lines = ["# HELP camera_server_phase_seconds Duration of the phases of camera server actions.",
+                 "# TYPE camera_server_phase_seconds histogram"]
+        for action, phases in self.histograms.items():
+            for phase, histogram in phases.items():
+                labels = f'action="{action}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'camera_server_phase_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'camera_server_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"camera_server_phase_seconds_sum{{{labels}}} {histogram.sum / 1000:.6f}")
+                lines.append(f"camera_server_phase_seconds_count{{{labels}}} {histogram.count}")
+        lines += ["# HELP camera_server_errors_total Commands that failed with an error reply.",
+                  "# TYPE camera_server_errors_total counter"]
+        lines += [f'camera_server_errors_total{{action="{action}"}} {count}' for action, count in self.errors.items()]
+        return "\n".join(lines) + "\n"
+
+
+async def serve_prometheus(metrics: Metrics, host: str, port: int):
+    """Serve `metrics` in the Prometheus text format over plain HTTP on `host:port` for every request path."""
+    async def handle(reader, writer):
+        try:
+            # Request line and headers up to the blank line, the request itself does not matter
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            body = metrics.prometheus().encode("utf-8")
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,170 @@
+import threading
+import time
+
+import numpy as np
+
+
+# Pixels per cell side that estimate the mean of a cell, instead of all pixels of the cell
+CELL_SAMPLES = 4
+
+
+def parse_zone(zone) -> tuple:
+    """Validate a zone `(x, y, width, height)` given as fractions `0.0`-`1.0` of the frame."""
+    try:
+        x, y, w, h = (float(value) for value in zone)
+    except (TypeError, ValueError):
+        raise TypeError(f"Unsupported zone '{zone}'. Expected float TUPLE of format (x, y, width, height).")
+    if not (0.0 <= x < 1.0 and 0.0 <= y < 1.0 and 0.0 < w <= 1.0 - x and 0.0 < h <= 1.0 - y):
+        raise ValueError(f"Invalid zone '{zone}'. Expected fractions of the frame: 0.0<=X, 0.0<=Y, 0.0<WIDTH<=1.0-X, 0.0<HEIGHT<=1.0-Y.")
+    return (x, y, w, h)
+
+
+class MotionDetector:
+    """Motion detection on the low resolution stream by differencing a grid of cell means against a background.
+
+    Every frame is reduced to cells of `cell` x `cell` pixels, whose mean is estimated from `CELL_SAMPLES` x `CELL_SAMPLES`
+    pixels each, so a 640x360 frame costs about 14k pixel reads instead of 230k. A cell changed, if its mean differs from
+    the background by more than `threshold` after the median change of all cells is removed, so exposure and lighting changes
+    of the whole frame are not motion. Motion starts when the changed cells cover `min_area` of any zone and ends `hold` seconds
+    after the last frame with motion. The background follows the scene with the exponential weight `alpha` per frame.
+
+    `submit` runs on the camera's frame thread; `on_event` is called there with every `start` and `end` event and must not block.
+    The detector has no camera dependency and can be fed with synthetic frames.
+    """
+
+    def __init__(self, on_event, zones=None, threshold: float = 12.0, min_area: float = 0.02, cell: int = 16, hold: float = 2.0, alpha: float = 0.05):
+        if zones is not None and (not isinstance(zones, (list, tuple)) or not zones):
+            raise TypeError(f"Unsupported zones argument '{zones}'. Expected LIST of (x, y, width, height) tuples or NONE.")
+        if not isinstance(threshold, (int, float)) or not (0 < threshold < 255):
+            raise ValueError(f"Invalid threshold '{threshold}'. Expected FLOAT: 0.0<THRESHOLD<255.0.")
+        if not isinstance(min_area, (int, float)) or not (0 < min_area <= 1):
+            raise ValueError(f"Invalid min_area '{min_area}'. Expected FLOAT: 0.0<MIN_AREA<=1.0.")
+        if not isinstance(cell, int) or not (CELL_SAMPLES <= cell <= 128):
+            raise ValueError(f"Invalid cell '{cell}'. Expected INTEGER: {CELL_SAMPLES}<=CELL<=128.")
+        if not isinstance(hold, (int, float)) or hold < 0:
+            raise ValueError(f"Invalid hold '{hold}'. Expected FLOAT: 0.0<=HOLD.")
+        if not isinstance(alpha, (int, float)) or not (0 < alpha <= 1):
+            raise ValueError(f"Invalid alpha '{alpha}'. Expected FLOAT: 0.0<ALPHA<=1.0.")
+        self.on_event = on_event
+        self.zones = [parse_zone(zone) for zone in zones] if zones is not None else [(0.0, 0.0, 1.0, 1.0)]
+        self.threshold = threshold
+        self.min_area = min_area
+        self.cell = cell
+        self.hold = hold
+        self.alpha = alpha
+        self.frames = 0
+        self.events = 0
+        self.active = False
+        self.area = 0.0
+        self.closed = False
+        self._shape = None
+        self._background = None
+        self._started_at = None
+        self._last_motion = None
+        self._peak = 0.0
+        self._cost_total = 0.0
+        self._cost_max = 0.0
+        self._lock = threading.Lock()
+
+    def _setup(self, shape):
+        """Prepare the grid and zone masks of frames of `shape`."""
+        height, width = shape[:2]
+        rows, cols = height // self.cell, width // self.cell
+        if not rows or not cols:
+            raise ValueError(f"Frame of {width}x{height} pixels is smaller than one cell of {self.cell} pixels.")
+        self._shape = (height, width)
+        self._step = self.cell // CELL_SAMPLES
+        self._samples = self.cell // self._step
+        self._grid = (rows, cols)
+        # A cell belongs to a zone, if its center lies inside
+        ys = (np.arange(rows) + 0.5) * self.cell / height
+        xs = (np.arange(cols) + 0.5) * self.cell / width
+        masks = np.stack([((ys >= y) & (ys < y + h))[:, None] & ((xs >= x) & (xs < x + w))[None, :] for x, y, w, h in self.zones])
+        cells = masks.sum(axis=(1, 2))
+        if not cells.all():
+            raise ValueError(f"Zone {self.zones[int(np.argmin(cells))]} does not cover the center of any {self.cell} pixel cell.")
+        self._masks = masks
+        # Changed cells per zone are one matrix product
+        self._zone_matrix = masks.reshape(len(self.zones), -1).astype(np.float32) / cells[:, None]
+        self._background = None
+
+    def _cell_means(self, frame: np.ndarray) -> np.ndarray:
+        rows, cols = self._grid
+        samples = frame[:rows * self.cell:self._step, :cols * self.cell:self._step]
+        sums = samples.reshape(rows, self._samples, cols, self._samples).sum(axis=(1, 3), dtype=np.uint32)
+        return sums.astype(np.float32) * (1.0 / (self._samples * self._samples))
+
+    def status(self) -> dict:
+        return {"frames": self.frames,
+                "events": self.events,
+                "active": self.active,
+                "area": round(self.area, 4),
+                "grid": None if self._shape is None else [self._grid[1], self._grid[0]],
+                "mean_ms": round(self._cost_total / self.frames * 1000, 3) if self.frames else None,
+                "max_ms": round(self._cost_max * 1000, 3)}
+
+    def submit(self, frame: np.ndarray, timestamp: float = None) -> bool:
+        """Check a grayscale frame for motion. Returns `True` if the frame shows motion."""
+        t_start = time.perf_counter()
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            if self.closed:
+                return False
+            if frame.shape[:2] != self._shape:
+                self._setup(frame.shape)
+            means = self._cell_means(frame)
+            if self._background is None:
+                self._background = means
+                self.frames += 1
+                return False
+
+            change = means - self._background
+            change -= np.median(change)
+            changed = np.abs(change) > self.threshold
+            areas = self._zone_matrix @ changed.ravel().astype(np.float32)
+            self._background += self.alpha * (means - self._background)
+            self.area = float(areas.max())
+            motion = self.area >= self.min_area
+
+            event = None
+            if motion:
+                self._last_motion = timestamp
+                self._peak = max(self._peak, self.area)
+                if not self.active:
+                    self.active = True
+                    self.events += 1
+                    self._started_at = timestamp
+                    self._peak = self.area
+                    event = {"state": "start",
+                             "event": self.events,
+                             "timestamp": time.time(),
+                             "area": round(self.area, 4),
+                             "zones": [int(index) for index in np.flatnonzero(areas >= self.min_area)],
+                             "bbox": self._bbox(changed)}
+            elif self.active and timestamp - self._last_motion >= self.hold:
+                self.active = False
+                event = {"state": "end",
+                         "event": self.events,
+                         "timestamp": time.time(),
+                         "duration_s": round(self._last_motion - self._started_at, 3),
+                         "peak_area": round(self._peak, 4)}
+            self.frames += 1
+            cost = time.perf_counter() - t_start
+            self._cost_total += cost
+            self._cost_max = max(self._cost_max, cost)
+        if event is not None:
+            self.on_event(event)
+        return motion
+
+    def _bbox(self, changed: np.ndarray) -> list:
+        """Bounding box `[x, y, width, height]` of the changed cells inside the zones, as fractions of the frame."""
+        rows, cols = np.nonzero(changed & self._masks.any(axis=0))
+        height, width = self._shape
+        top, left = rows.min() * self.cell, cols.min() * self.cell
+        bottom, right = (rows.max() + 1) * self.cell, (cols.max() + 1) * self.cell
+        return [round(left / width, 4), round(top / height, 4), round((right - left) / width, 4), round((bottom - top) / height, 4)]
+
+    def close(self):
+        """Stop detecting. A running motion event ends without an `end` event."""
+        with self._lock:
+            self.closed = True
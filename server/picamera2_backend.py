@@ -0,0 +1,120 @@
+import picamera2
+from libcamera import controls
+from picamera2.encoders import H264Encoder
+from picamera2.outputs import FileOutput, Output, PyavOutput
+
+from camera_backend import CameraBackend
+
+
+class CallbackOutput(Output):
+    """Picamera2 output, which hands encoded frames from the encoder thread to plain callbacks."""
+
+    def __init__(self, on_frame, on_stream):
+        super().__init__()
+        self.on_frame = on_frame
+        self.on_stream = on_stream
+
+    def _add_stream(self, encoder_stream, *args, **kwargs):
+        self.on_stream(encoder_stream, *args, **kwargs)
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if self.recording and not audio:
+            self.on_frame(frame, keyframe, timestamp)
+
+
+class Picamera2Backend(CameraBackend):
+    """Raspberry Pi camera driven by Picamera2."""
+
+    def __init__(self):
+        self.camera = picamera2.Picamera2()
+        self._lores_size = None
+        self._lores_callback = None
+        self._saturation = None
+
+    def _crop_controls(self, crop):
+        """ScalerCrop of the field of view `crop`, in pixels of the sensor. Always set, so a crop of a previous configuration does not stay."""
+        x0, y0, width, height = self.camera.camera_properties["ScalerCropMaximum"]
+        x, y, w, h = crop if crop is not None else (0.0, 0.0, 1.0, 1.0)
+        return {"ScalerCrop": (x0 + int(x * width), y0 + int(y * height), int(w * width), int(h * height))}
+
+    def create_still_configuration(self, size, pixel_format, lores_size=None, crop=None):
+        lores = {"size": tuple(lores_size), "format": "YUV420"} if lores_size is not None else None
+        return self.camera.create_still_configuration(main={"size": tuple(size), "format": pixel_format}, lores=lores, controls=self._crop_controls(crop))
+
+    def configure(self, config):
+        self.camera.configure(config)
+        lores = self.camera.camera_config.get("lores")
+        self._lores_size = None if lores is None else tuple(lores["size"])
+
+    def start(self):
+        self.camera.start()
+
+    def stop(self):
+        self.camera.stop()
+        if self._saturation is not None:
+            # Saturation of the camera before a grayscale video, applied with the next start
+            self.camera.set_controls({"Saturation": self._saturation})
+            self._saturation = None
+
+    def autofocus_cycle(self) -> bool:
+        self.camera.set_controls({"AfMode": controls.AfModeEnum.Continuous})
+        return self.camera.autofocus_cycle()
+
+    def set_lens_position(self, position):
+        self.camera.set_controls({"AfMode": controls.AfModeEnum.Manual, "LensPosition": position})
+
+    def lens_position(self):
+        return self.camera.capture_metadata().get("LensPosition")
+
+    def capture_file(self, file, format):
+        self.camera.capture_file(file, format=format)
+
+    def capture_array(self, name="main"):
+        return self.camera.capture_array(name)
+
+    def capture_lores(self):
+        width, height = self.camera.camera_config["lores"]["size"]
+        # YUV420: the first `height` rows hold the Y plane
+        return self.camera.capture_array("lores")[:height, :width]
+
+    def configure_video(self, size, lores_size, crop=None, grayscale=False):
+        config = self.camera.video_configuration
+        config.main.size = tuple(size)
+        config.enable_lores()
+        config.lores.size = tuple(lores_size)
+        self.camera.configure("video")
+        # Applied when the camera starts; a small main stream lets libcamera pick a binned sensor mode
+        video_controls = self._crop_controls(crop)
+        if grayscale:
+            # The H.264 encoder only takes YUV420, the chroma planes are still encoded but flat
+            if self._saturation is None:
+                self._saturation = self.camera.controls.make_dict().get("Saturation", self.camera.camera_controls["Saturation"][2])
+            video_controls["Saturation"] = 0.0
+        self.camera.set_controls(video_controls)
+        self._lores_size = tuple(self.camera.camera_config["lores"]["size"])
+        return self._lores_size
+
+    def set_lores_callback(self, callback):
+        self._lores_callback = callback
+        self.camera.post_callback = None if callback is None else self._post_callback
+
+    def _post_callback(self, request):
+        callback = self._lores_callback
+        if callback is None or self._lores_size is None:
+            return
+        width, height = self._lores_size
+        with picamera2.MappedArray(request, "lores") as mapped:
+            # YUV420: the first `height` rows hold the Y plane
+            callback(mapped.array[:height, :width])
+
+    def start_encoder(self, on_frame, on_stream, iperiod):
+        self.camera.start_encoder(H264Encoder(repeat=True, iperiod=iperiod), CallbackOutput(on_frame, on_stream))
+
+    def stop_encoder(self):
+        self.camera.stop_encoder()
+
+    def create_output(self, target, format=None):
+        return PyavOutput(target, format=format) if format else FileOutput(target)
+
+    def close(self):
+        self.camera.close()
@@ -0,0 +1,94 @@
+import asyncio
+import io
+import threading
+import time
+
+import numpy as np
+
+
+def encode_jpeg(luma: np.ndarray, quality: int) -> bytes:
+    """Encode a grayscale frame as JPEG with Pillow, which Picamera2 already depends on."""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.fromarray(luma, "L").save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class LatestFrame:
+    """Low resolution consumer, which keeps a copy of the newest luminance frame for previews.
+    `submit` copies into a buffer that is replaced, not overwritten, so readers keep a consistent frame without locking.
+    Coroutines waiting for a newer frame are woken up on their event loop, no thread is blocked while they wait."""
+
+    def __init__(self):
+        self.frame = None
+        self.timestamp = None
+        self.index = 0
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    def submit(self, frame: np.ndarray, timestamp: float = None):
+        copy = np.array(frame, copy=True)
+        with self._lock:
+            self.frame = copy
+            self.timestamp = time.monotonic() if timestamp is None else timestamp
+            self.index += 1
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The event loop was closed in the meantime
+                pass
+
+    def age(self) -> float:
+        """Seconds since the newest frame was taken, `inf` without any frame."""
+        return float("inf") if self.timestamp is None else time.monotonic() - self.timestamp
+
+    async def wait_newer(self, index: int, timeout: float) -> bool:
+        """Wait until a frame newer than `index` arrived. Returns `False` on timeout."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self.index > index:
+                return True
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def close(self):
+        pass
+
+
+class PreviewCache:
+    """Encoded previews of the newest frame, shared by all clients.
+
+    Encodings are keyed by frame index, format and quality. Clients asking for the same frame at the same time wait
+    for one encode in the executor instead of encoding it once each. Only encodings of the newest frame are kept.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._encodings = {}
+
+    async def get(self, index: int, key, encode):
+        """Return `encode()` for frame `index` and `key`, running it at most once per frame and key."""
+        if index != self._index:
+            self._index = index
+            self._encodings = {}
+        future = self._encodings.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, encode)
+            self._encodings[key] = future
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Failed encodes are retried by the next request
+            if self._encodings.get(key) is future:
+                del self._encodings[key]
+            raise
@@ -0,0 +1,379 @@
+import asyncio
+import io
+import json
+import secrets
+import socket
+import struct
+import time
+import traceback
+from collections import OrderedDict, deque
+
+from metrics import PhaseTimer
+
+
+# Length prefix of framed command messages
+MESSAGE_HEADER = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+# Header of every chunk on a data channel: transfer id, offset of the chunk in its transfer and chunk length. A chunk of length 0 ends the transfer.
+CHUNK_HEADER = struct.Struct("!IQI")
+CHUNK_SIZE = 256 * 1024
+# Interrupted transfers kept per session for `resume_transfer`, and for how many seconds
+MAX_RETAINED_TRANSFERS = 4
+RETAIN_TIMEOUT = 60.0
+
+
+class DataConnection:
+    """A TCP connection on the data port, driven by the event loop through its raw non-blocking socket.
+    Sending goes through `loop.sock_sendall`, so buffers are transmitted from a `memoryview` without copying them."""
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.loop = asyncio.get_running_loop()
+
+    async def recv_exact(self, size):
+        """Receive exactly `size` bytes. Returns `None` if the connection was closed before."""
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            n = await self.loop.sock_recv_into(self.sock, view[received:])
+            if n == 0:
+                return None
+            received += n
+        return buffer
+
+    async def send(self, data):
+        await self.loop.sock_sendall(self.sock, data)
+
+    async def send_buffer(self, buffer: io.BytesIO, size: int):
+        """Send the first `size` bytes of an encode buffer through a memoryview, without copying the data."""
+        with buffer.getbuffer() as view, view[:size] as payload:
+            await self.loop.sock_sendall(self.sock, payload)
+
+    def send_threadsafe(self, data):
+        """Send data from a thread outside of the event loop (e.g. the Picamera2 encoder thread) and block until it was written."""
+        asyncio.run_coroutine_threadsafe(self.send(data), self.loop).result()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ChannelTransfer:
+    """One transfer on the data channel of a session, with the interface of `DataConnection`.
+
+    The transfer is tagged with the id of the request it answers and split into chunks of `CHUNK_SIZE`, so transfers of the
+    same session (e.g. a capture during a video) interleave on the channel. If the channel breaks during a resumable transfer,
+    the transfer keeps taking the data and is retained by the session on `close`, so the client can fetch the rest with
+    `resume_transfer` once it reconnected the channel.
+    """
+
+    def __init__(self, session, transfer_id: int, resumable: bool, offset: int = 0):
+        self.session = session
+        self.id = transfer_id
+        self.resumable = resumable
+        self.offset = offset
+        self.addr = session.channel.addr
+        self.loop = asyncio.get_running_loop()
+        self.interrupted = False
+        # References to everything sent, only copied if the transfer has to be retained
+        self._parts = []
+
+    async def _send(self, view):
+        if not self.interrupted:
+            try:
+                await self.session.send_chunks(self.id, self.offset, view)
+            except OSError as e:
+                if not self.resumable:
+                    raise
+                print(f"[Server] transfer {self.id} interrupted at {self.offset} bytes, it can be resumed: {e}")
+                self.interrupted = True
+                # The finished frames of the failed send still reference the chunks, which export the caller's encode buffer
+                traceback.clear_frames(e.__traceback__)
+        self.offset += len(view)
+
+    async def send(self, data):
+        view = memoryview(data).cast("B")
+        if self.resumable:
+            self._parts.append(view)
+        await self._send(view)
+
+    async def send_buffer(self, buffer: io.BytesIO, size: int):
+        """Send the first `size` bytes of an encode buffer through a memoryview, without copying the data."""
+        if self.resumable:
+            self._parts.append((buffer, size))
+        with buffer.getbuffer() as view, view[:size] as payload:
+            await self._send(payload)
+
+    def send_threadsafe(self, data):
+        """Send data from a thread outside of the event loop (e.g. the Picamera2 encoder thread) and block until it was written."""
+        asyncio.run_coroutine_threadsafe(self.send(data), self.loop).result()
+
+    def close(self):
+        """End the transfer. An interrupted transfer is retained instead, the encode buffers it was given are copied, as their owners reuse them."""
+        if self.interrupted:
+            payload = bytearray()
+            for part in self._parts:
+                if isinstance(part, tuple):
+                    buffer, size = part
+                    with buffer.getbuffer() as view, view[:size] as data:
+                        payload += data
+                else:
+                    payload += part
+            self.session.retain(self.id, payload)
+        else:
+            self.loop.create_task(self.session.end_transfer(self.id))
+        self._parts = []
+
+
+class Session:
+    """State of one control connection: its message framing, the data connections that belong to it and its active video consumers.
+
+    A connection starts in legacy mode, where one `read` is expected to hold exactly one bare JSON object.
+    After the client negotiated a protocol version with the `hello` action, every message is sent as a
+    4-byte big-endian length prefix followed by the JSON payload, so commands can be pipelined and
+    replies of any size arrive intact. Replies echo the `id` of the request they answer.
+    Every reply carries the phase timings of its command so far as `timings_ms` in its `details`.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.id = secrets.token_hex(8)
+        self.reader = reader
+        self.writer = writer
+        self.addr = writer.get_extra_info("peername")
+        self.framed = False
+        self.protocol = 0
+        self.request_id = None
+        self.timer = PhaseTimer()
+        self.recordings = {}
+        self.picture_buffer = io.BytesIO()
+        self._data_connections = asyncio.Queue()
+        self._send_lock = asyncio.Lock()
+        # Long-lived data channel, once the client opened one all transfers of the session go through it
+        self.channel = None
+        self.channel_mode = False
+        self._channel_ready = asyncio.Event()
+        self._channel_lock = asyncio.Lock()
+        self._retained = OrderedDict()
+
+    async def recv_message(self):
+        """Read the next command from the connection. Returns `None` if the client closed the connection."""
+        if self.framed:
+            try:
+                header = await self.reader.readexactly(MESSAGE_HEADER.size)
+                (size,) = MESSAGE_HEADER.unpack(header)
+                if size > MAX_MESSAGE_SIZE:
+                    raise ConnectionError(f"Command of {size} bytes exceeds the maximum message size of {MAX_MESSAGE_SIZE} bytes.")
+                raw = await self.reader.readexactly(size)
+            except asyncio.IncompleteReadError:
+                return None
+        else:
+            raw = await self.reader.read(2048)
+            if not raw:
+                return None
+
+        try:
+            cmd_obj = json.loads(raw.decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.request_id = None
+            raise TypeError("Invalid JSON command.")
+        if not isinstance(cmd_obj, dict):
+            self.request_id = None
+            raise TypeError("Invalid JSON command. Expected an OBJECT with 'action' and 'args' keys.")
+        self.request_id = cmd_obj.get("id")
+        return cmd_obj
+
+    async def send_message(self, reply: dict, request_id=None):
+        """Send a reply for the command that was read last, or for `request_id` if given."""
+        if request_id is None:
+            request_id = self.request_id
+            if isinstance(reply.get("details"), dict):
+                reply["details"]["timings_ms"] = {**self.timer.timings, "reply": self.timer.elapsed()}
+        if request_id is not None:
+            reply = {"id": request_id, **reply}
+        payload = json.dumps(reply).encode("utf-8")
+        async with self._send_lock:
+            if self.framed:
+                self.writer.write(MESSAGE_HEADER.pack(len(payload)) + payload)
+            else:
+                self.writer.write(payload)
+            await self.writer.drain()
+
+    async def send_event(self, event: str, details: dict):
+        """Push an unsolicited `{"event": ..., "details": ...}` message to a client speaking the framed protocol.
+        Events are best effort: an event for a client that disconnected in the meantime is dropped."""
+        payload = json.dumps({"event": event, "details": details}).encode("utf-8")
+        async with self._send_lock:
+            try:
+                self.writer.write(MESSAGE_HEADER.pack(len(payload)) + payload)
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+
+    def attach_data(self, connection: DataConnection):
+        """Hand a data connection to this session."""
+        self._data_connections.put_nowait(connection)
+
+    async def accept_data(self, timeout: float) -> DataConnection:
+        """Wait for the client to open its data connection."""
+        try:
+            return await asyncio.wait_for(self._data_connections.get(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Client did not open a data connection within {timeout} seconds.")
+
+    def attach_channel(self, connection: DataConnection):
+        """Make `connection` the data channel of this session, replacing a previous channel."""
+        previous, self.channel = self.channel, connection
+        self.channel_mode = True
+        self._channel_ready.set()
+        if previous is not None:
+            asyncio.get_running_loop().create_task(self._retire_channel(previous))
+
+    async def _retire_channel(self, channel: DataConnection):
+        """Close a replaced channel. A send that is still pending on it must fail first, closing the socket under it would leave it waiting forever."""
+        try:
+            channel.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        async with self._channel_lock:
+            channel.close()
+
+    def _drop_channel(self, channel: DataConnection):
+        """Close a broken channel. Transfers wait for the client to reconnect it."""
+        if self.channel is channel:
+            self.channel = None
+            self._channel_ready.clear()
+        channel.close()
+
+    async def open_transfer(self, timeout: float, transfer_id=None, resumable: bool = False, offset: int = 0) -> ChannelTransfer:
+        """Start a transfer on the data channel, tagged with `transfer_id` or the id of the current request, waiting for a broken channel to be reconnected."""
+        if transfer_id is None:
+            transfer_id = self.request_id
+        if not isinstance(transfer_id, int) or not (0 <= transfer_id < 2 ** 32):
+            raise TypeError(f"Transfers on the data channel require integer request ids, got '{transfer_id}'.")
+        try:
+            await asyncio.wait_for(self._channel_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Client did not reconnect its data channel within {timeout} seconds.")
+        return ChannelTransfer(self, transfer_id, resumable, offset)
+
+    async def send_chunks(self, transfer_id: int, offset: int, view: memoryview):
+        """Send `view` as chunks of the transfer `transfer_id`, starting at `offset`. Chunks of other transfers may be sent in between."""
+        for start in range(0, len(view), CHUNK_SIZE):
+            chunk = view[start:start + CHUNK_SIZE]
+            async with self._channel_lock:
+                channel = self.channel
+                if channel is None:
+                    raise ConnectionError("Data channel is not connected.")
+                try:
+                    await channel.send(CHUNK_HEADER.pack(transfer_id, offset + start, len(chunk)))
+                    await channel.send(chunk)
+                except OSError:
+                    # A partly sent chunk leaves the channel unusable
+                    self._drop_channel(channel)
+                    raise
+
+    async def end_transfer(self, transfer_id: int):
+        async with self._channel_lock:
+            channel = self.channel
+            if channel is None:
+                return
+            try:
+                await channel.send(CHUNK_HEADER.pack(transfer_id, 0, 0))
+            except OSError:
+                self._drop_channel(channel)
+
+    def retain(self, transfer_id: int, payload: bytes):
+        """Keep the complete payload of an interrupted transfer for `RETAIN_TIMEOUT` seconds."""
+        self._retained[transfer_id] = (payload, time.monotonic() + RETAIN_TIMEOUT)
+        while len(self._retained) > MAX_RETAINED_TRANSFERS:
+            self._retained.popitem(last=False)
+
+    def retained(self, transfer_id) -> bytes:
+        """Payload of a retained transfer, or `None` if there is none or it expired."""
+        now = time.monotonic()
+        for expired in [key for key, (_, deadline) in self._retained.items() if deadline < now]:
+            del self._retained[expired]
+        entry = self._retained.get(transfer_id)
+        return None if entry is None else entry[0]
+
+    def close(self):
+        while not self._data_connections.empty():
+            self._data_connections.get_nowait().close()
+        if self.channel is not None:
+            self.channel.close()
+        self._retained.clear()
+        self.writer.close()
+
+
+class DataPortDispatcher:
+    """Routes connections on the data port to the session they belong to.
+
+    Clients that negotiated the framed protocol identify a data connection with a framed `{"session": <id>}`
+    message right after connecting. Connections that stay silent come from legacy clients and are handed to
+    the longest waiting legacy session, right away if no framed client can be opening a data connection at the
+    moment. Since protocol version 2, clients open one long-lived data channel per session with
+    `{"session": <id>, "channel": true}`, which then carries all transfers of the session.
+    """
+
+    def __init__(self, sessions: dict, hello_timeout: float):
+        self.sessions = sessions
+        self.hello_timeout = hello_timeout
+        self._legacy_waiters = deque()
+        self._framed_waiters = 0
+
+    async def accept_data(self, session: Session, timeout: float, resumable: bool = False) -> DataConnection:
+        """Wait for the data connection of `session`, or start a transfer on its data channel. Only transfers on the channel can be `resumable`.
+        Clients of protocol version 2 open their channel right after `hello`, a command may overtake it, so their transfers wait for the channel."""
+        if session.channel_mode or session.protocol >= 2:
+            return await session.open_transfer(timeout, resumable=resumable)
+        if session.framed:
+            self._framed_waiters += 1
+            try:
+                return await session.accept_data(timeout)
+            finally:
+                self._framed_waiters -= 1
+        self._legacy_waiters.append(session)
+        try:
+            return await session.accept_data(timeout)
+        finally:
+            if session in self._legacy_waiters:
+                self._legacy_waiters.remove(session)
+
+    def _hello_expected(self) -> bool:
+        """Whether a framed client may open a data connection right now: a framed session of protocol version 1 waits for one, or a
+        session of protocol version 2 has not opened its data channel yet or reconnects it."""
+        if self._framed_waiters:
+            return True
+        return any(session.protocol >= 2 and not session._channel_ready.is_set() for session in self.sessions.values())
+
+    async def route(self, connection: DataConnection):
+        if self._legacy_waiters and not self._hello_expected():
+            self._legacy_waiters.popleft().attach_data(connection)
+            return
+        try:
+            header = await asyncio.wait_for(connection.recv_exact(MESSAGE_HEADER.size), self.hello_timeout)
+        except asyncio.TimeoutError:
+            header = None
+            if self._legacy_waiters:
+                self._legacy_waiters.popleft().attach_data(connection)
+                return
+        if header is not None:
+            (size,) = MESSAGE_HEADER.unpack(header)
+            raw = await connection.recv_exact(min(size, 1024))
+            try:
+                hello = json.loads(raw.decode("utf-8"))
+                session = self.sessions.get(hello.get("session"))
+            except (AttributeError, json.JSONDecodeError, UnicodeDecodeError):
+                session = None
+            if session is not None:
+                if hello.get("channel"):
+                    session.attach_channel(connection)
+                else:
+                    session.attach_data(connection)
+                return
+        print(f"[Server] Data connection from {connection.addr[0]} does not belong to any session, closed.")
+        connection.close()
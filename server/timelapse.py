@@ -0,0 +1,348 @@
+import io
+import json
+import math
+import os
+import tarfile
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+# Name of the index file in the spool directory
+SPOOL_INDEX = "index.jsonl"
+# Ranges of the cron fields: minute, hour, day of month, month, day of week (0 and 7 are Sunday)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# Minutes, hours, days or months the cron search advances before it gives up on an expression that never matches (e.g. `0 0 30 2 *`)
+CRON_MAX_STEPS = 100_000
+# A tick of an interval job may start up to this fraction of the interval late, later ticks are skipped as missed
+TICK_TOLERANCE = 0.5
+# Tar block size, members and the end of the archive are padded to it
+TAR_BLOCK = 512
+
+
+class CronSchedule:
+    """Cron-like schedule of the five fields `minute hour day month weekday` in local time.
+
+    Every field is `*`, a number, a range `a-b`, a list `a,b`, or a step `*/n` or `a-b/n`. Like cron, a day matches
+    if either the day of month or the weekday matches, when both are restricted.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split() if isinstance(expression, str) else []
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}'. Expected 5 fields: minute hour day month weekday.")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (self._parse(field, bounds) for field, bounds in zip(fields, CRON_FIELDS))
+        # Weekday 7 is Sunday as well, Python counts from Monday
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field, bounds):
+        low, high = bounds
+        values = set()
+        for part in field.split(","):
+            spec, _, step = part.partition("/")
+            try:
+                step = int(step) if step else 1
+                if spec == "*":
+                    start, end = low, high
+                elif "-" in spec:
+                    start, end = (int(value) for value in spec.split("-", 1))
+                else:
+                    start = end = int(spec)
+            except ValueError:
+                raise ValueError(f"Invalid cron field '{field}'.")
+            if step < 1 or not (low <= start <= end <= high):
+                raise ValueError(f"Invalid cron field '{field}'. Expected values {low}-{high}.")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, t):
+        day = t.day in self.days
+        weekday = t.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next(self, after: float) -> float:
+        """Unix time of the first matching minute after `after`."""
+        t = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(CRON_MAX_STEPS):
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t.timestamp()
+        raise ValueError(f"Cron expression '{self.expression}' never matches.")
+
+
+class TimelapseJob:
+    """Capture times of a time-lapse, at a fixed `interval` in seconds or at the times of a `cron` schedule, optionally limited
+    to `count` captures and to times up to the unix time `until`. Interval ticks are aligned to the start, ticks that
+    are already over by more than `TICK_TOLERANCE` of the interval when the previous capture finished are skipped as `missed`.
+    `capture` holds the capture settings, `persistent` keeps the camera running between captures."""
+
+    def __init__(self, interval=None, cron=None, count=None, until=None, start=None, persistent=False, **capture):
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron is not None else None
+        self.count = count
+        self.until = until
+        self.start = start
+        self.persistent = persistent
+        self.capture = capture
+        self.captured = 0
+        self.failed = 0
+        self.missed = 0
+        self.error = None
+        self.next_at = None
+        self.buffer = io.BytesIO()
+        self._tick = -1
+        self._last = None
+
+    def schedule(self, now: float) -> float:
+        """Unix time of the next capture, `None` once `count` or `until` is reached."""
+        if self.count is not None and self.captured + self.failed >= self.count:
+            self.next_at = None
+            return None
+        if self.cron is not None:
+            due = self.cron.next(max(now, self._last or now))
+        else:
+            tick = max(self._tick + 1, math.ceil((now - self.start) / self.interval - TICK_TOLERANCE))
+            self.missed += tick - self._tick - 1
+            self._tick = tick
+            due = self.start + tick * self.interval
+        self._last = due
+        self.next_at = None if self.until is not None and due > self.until else due
+        return self.next_at
+
+    def status(self) -> dict:
+        return {"interval": self.interval,
+                "cron": self.cron.expression if self.cron is not None else None,
+                "count": self.count,
+                "until": self.until,
+                "persistent": self.persistent,
+                "captured": self.captured,
+                "failed": self.failed,
+                "missed": self.missed,
+                "error": self.error,
+                "next_at": self.next_at}
+
+
+class SpoolEntry:
+    """One captured frame in the spool."""
+
+    __slots__ = ("seq", "timestamp", "file_name", "size", "crc32")
+
+    def __init__(self, seq: int, timestamp: float, file_name: str, size: int, crc32: int):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.file_name = file_name
+        self.size = size
+        self.crc32 = crc32
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "timestamp": self.timestamp, "file_name": self.file_name, "size": self.size, "crc32": self.crc32}
+
+
+class Spool:
+    """On-disk store of time-lapse frames in `directory` with an index of sequence number, timestamp, size and CRC-32 per frame.
+
+    The index is an append-only JSON lines file with one record per added frame and one per deleted frame, so adding a
+    frame writes one line instead of the whole index. It is compacted when it is loaded and when deleted records
+    outnumber the frames. Frames are written to a temporary file and renamed, so a crash never leaves a partial frame
+    behind a valid index record. When the frames exceed `max_bytes`, the oldest are evicted. Frames pinned for a transfer
+    leave the index when they are evicted or deleted, but keep their file until they are unpinned. All methods are thread safe.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evicted = 0
+        self._entries = {}
+        self._next_seq = 1
+        self._deleted = 0
+        self._pins = {}
+        self._unlinked = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _index_path(self):
+        return os.path.join(self.directory, SPOOL_INDEX)
+
+    def _load(self):
+        """Read the index, drop records whose frame file is missing or has another size, and compact the index."""
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn last line of a crash
+                        continue
+                    if "delete" in record:
+                        self._entries.pop(record["delete"], None)
+                    else:
+                        entry = SpoolEntry(record["seq"], record["timestamp"], record["file_name"], record["size"], record["crc32"])
+                        self._entries[entry.seq] = entry
+                        self._next_seq = max(self._next_seq, entry.seq + 1)
+        except FileNotFoundError:
+            pass
+        for seq, entry in list(self._entries.items()):
+            try:
+                if os.path.getsize(self.path(entry)) == entry.size:
+                    continue
+            except OSError:
+                pass
+            del self._entries[seq]
+        self.bytes = sum(entry.size for entry in self._entries.values())
+        self._compact()
+
+    def _compact(self):
+        """Rewrite the index with the records of the current frames only."""
+        temporary = self._index_path() + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry.to_dict()) + "\n")
+        os.replace(temporary, self._index_path())
+        self._deleted = 0
+
+    def _append(self, records):
+        with open(self._index_path(), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def path(self, entry: SpoolEntry) -> str:
+        return os.path.join(self.directory, entry.file_name)
+
+    def add(self, data, timestamp: float, extension: str) -> SpoolEntry:
+        """Store an encoded frame taken at unix time `timestamp`, evicting the oldest frames if the quota is exceeded."""
+        size = len(data)
+        if size > self.max_bytes:
+            raise ValueError(f"Frame of {size} bytes exceeds the spool quota of {self.max_bytes} bytes.")
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+        file_name = f"{seq:08d}_{datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S_%f')}.{extension}"
+        entry = SpoolEntry(seq, timestamp, file_name, size, zlib.crc32(data))
+        temporary = self.path(entry) + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, self.path(entry))
+        with self._lock:
+            evicted = []
+            while self._entries and self.bytes + size > self.max_bytes:
+                evicted.append(self._entries.pop(next(iter(self._entries))))
+                self.bytes -= evicted[-1].size
+            self._entries[seq] = entry
+            self.bytes += size
+            self.evicted += len(evicted)
+            self._remove(evicted, [entry.to_dict()])
+        return entry
+
+    def delete(self, seqs) -> int:
+        """Delete the frames with the given sequence numbers. Returns the number of deleted frames, unknown numbers are ignored."""
+        with self._lock:
+            deleted = [self._entries.pop(seq) for seq in seqs if seq in self._entries]
+            self.bytes -= sum(entry.size for entry in deleted)
+            self._remove(deleted)
+        return len(deleted)
+
+    def _remove(self, entries, records=()):
+        """Delete the files of `entries` and record it in the index together with further `records`. Called with the lock held."""
+        for entry in entries:
+            if entry.seq in self._pins:
+                # Removed by `unpin`
+                self._unlinked[entry.seq] = entry
+                continue
+            try:
+                os.remove(self.path(entry))
+            except FileNotFoundError:
+                pass
+        self._deleted += len(entries)
+        if self._deleted > max(len(self._entries), 1024):
+            self._compact()
+        elif entries or records:
+            self._append([{"delete": entry.seq} for entry in entries] + list(records))
+
+    def entries(self, first=None, last=None, since=None, until=None, limit=None) -> list:
+        """Frames in order of their sequence numbers, optionally within the sequence numbers `first`-`last` and the unix times `since`-`until` (all inclusive)."""
+        with self._lock:
+            entries = list(self._entries.values())
+        selected = []
+        for entry in entries:
+            if (first is not None and entry.seq < first) or (last is not None and entry.seq > last):
+                continue
+            if (since is not None and entry.timestamp < since) or (until is not None and entry.timestamp > until):
+                continue
+            selected.append(entry)
+            if limit is not None and len(selected) >= limit:
+                break
+        return selected
+
+    def pin(self, first=None, last=None, since=None, until=None, limit=None) -> list:
+        """Select frames like `entries` and keep their files until `unpin`, even if they are evicted or deleted meanwhile.
+        Frames whose file is missing or has another size are left out."""
+        entries = self.entries(first, last, since, until, limit)
+        with self._lock:
+            # Frames removed since the selection are gone
+            entries = [entry for entry in entries if entry.seq in self._entries]
+            for entry in entries:
+                self._pins[entry.seq] = self._pins.get(entry.seq, 0) + 1
+        pinned = []
+        for entry in entries:
+            try:
+                if os.path.getsize(self.path(entry)) == entry.size:
+                    pinned.append(entry)
+                    continue
+            except OSError:
+                pass
+            self.unpin([entry])
+        return pinned
+
+    def unpin(self, entries):
+        """Release frames of `pin`, deleting the files of those that were evicted or deleted while pinned."""
+        with self._lock:
+            for entry in entries:
+                self._pins[entry.seq] -= 1
+                if self._pins[entry.seq]:
+                    continue
+                del self._pins[entry.seq]
+                if self._unlinked.pop(entry.seq, None) is not None:
+                    try:
+                        os.remove(self.path(entry))
+                    except FileNotFoundError:
+                        pass
+
+    def status(self) -> dict:
+        with self._lock:
+            seqs = list(self._entries)
+            return {"frames": len(seqs),
+                    "bytes": self.bytes,
+                    "max_bytes": self.max_bytes,
+                    "evicted": self.evicted,
+                    "first": seqs[0] if seqs else None,
+                    "last": seqs[-1] if seqs else None}
+
+
+def tar_header(entry: SpoolEntry) -> bytes:
+    """Tar member header of a spool frame. The frame data follows, padded to `TAR_BLOCK`."""
+    info = tarfile.TarInfo(entry.file_name)
+    info.size = entry.size
+    info.mtime = int(entry.timestamp)
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.USTAR_FORMAT)
+
+
+def tar_padding(size: int) -> bytes:
+    return b"\0" * (-size % TAR_BLOCK)
+
+
+# End of a tar archive: two zero blocks
+TAR_END = b"\0" * (2 * TAR_BLOCK)
@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import deque
+
+from session import DataConnection
+from video_ring import VideoRing
+
+
+# Drop policies of a sink whose queue is full
+DROP_POLICIES = ("newest", "queued")
+# Intervals between encoded frames kept for measuring gaps in the video
+FRAME_INTERVALS = 256
+
+
+class VideoSink:
+    """Consumer of the shared video encoder with its own bounded frame queue and sender thread.
+
+    The encoder thread only appends to the queue, so a slow consumer never stalls the encoder or the other sinks.
+    When the queue is full, the sink drops frames until the next keyframe, so the consumer always resumes on a
+    decodable frame. `drop_policy` selects which frames go: `newest` keeps the queued frames and discards the
+    incoming ones (no gap inside the queued video, for recordings), `queued` discards the whole queue (lowest
+    latency, for live viewers). A new sink also starts on the next keyframe.
+    """
+
+    def __init__(self, name: str, max_queue: int, drop_policy: str = "newest"):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unsupported drop policy '{drop_policy}'. Only {', '.join(repr(p) for p in DROP_POLICIES)} are available.")
+        if max_queue < 1:
+            raise ValueError(f"Invalid queue size '{max_queue}'. Expected INTEGER: 1<=MAX_QUEUE.")
+        self.name = name
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.sent = 0
+        self.dropped = 0
+        self.error = None
+        self._queue = deque()
+        self._synced = False
+        self._joined = False
+        self._closed = False
+        self._changed = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"sink {name}", daemon=True)
+
+    def status(self) -> dict:
+        with self._changed:
+            return {"name": self.name,
+                    "queued": len(self._queue),
+                    "sent": self.sent,
+                    "dropped": self.dropped,
+                    "error": self.error}
+
+    def start(self, streams):
+        """Open the consumer with the stream information of the running encoder and start the sender thread."""
+        self.open(streams)
+        self._thread.start()
+
+    def put(self, frame: bytes, keyframe: bool, timestamp):
+        """Queue a frame. Called from the encoder thread and never blocks on the consumer."""
+        with self._changed:
+            if self._closed or self.error is not None:
+                return
+            if len(self._queue) >= self.max_queue:
+                if self.drop_policy == "queued":
+                    self.dropped += len(self._queue)
+                    self._queue.clear()
+                self._synced = False
+            if not self._synced:
+                if not keyframe or len(self._queue) >= self.max_queue:
+                    # Frames before the first keyframe are not part of the sink's video yet
+                    self.dropped += self._joined
+                    return
+                self._synced = self._joined = True
+            self._queue.append((frame, keyframe, timestamp))
+            self._changed.notify()
+
+    def close(self, timeout: float = None):
+        """Stop accepting frames, let the sender thread write the queued ones and close the consumer."""
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        elif self._thread.ident is None:
+            self.shutdown()
+
+    def _run(self):
+        try:
+            while True:
+                with self._changed:
+                    self._changed.wait_for(lambda: self._queue or self._closed)
+                    if not self._queue:
+                        return
+                    frame, keyframe, timestamp = self._queue.popleft()
+                try:
+                    self.write(frame, keyframe, timestamp)
+                except Exception as e:
+                    print(f"[Server] video sink '{self.name}' failed: {e}")
+                    with self._changed:
+                        self.error = str(e)
+                        self.dropped += len(self._queue)
+                        self._queue.clear()
+                    return
+                self.sent += 1
+        finally:
+            self.shutdown()
+
+    # Consumer specific methods, called on the sender thread (`open` on the thread that adds the sink)
+
+    def open(self, streams):
+        pass
+
+    def write(self, frame: bytes, keyframe: bool, timestamp):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class OutputSink(VideoSink):
+    """Sink that feeds a Picamera2 output, e.g. a `PyavOutput` for MPEG-TS over UDP or a `FileOutput`."""
+
+    def __init__(self, name: str, output, max_queue: int, drop_policy: str = "newest"):
+        super().__init__(name, max_queue, drop_policy)
+        self.output = output
+
+    def open(self, streams):
+        self.output.start()
+        # Outputs that mux the video (PyavOutput) must learn about the encoder's streams first
+        for args, kwargs in streams:
+            self.output._add_stream(*args, **kwargs)
+
+    def write(self, frame, keyframe, timestamp):
+        self.output.outputframe(frame, keyframe, timestamp)
+
+    def shutdown(self):
+        self.output.stop()
+
+
+class ConnectionSink(VideoSink):
+    """Sink that sends the raw H.264 stream over a session's data connection."""
+
+    def __init__(self, name: str, connection: DataConnection, max_queue: int, drop_policy: str = "newest"):
+        super().__init__(name, max_queue, drop_policy)
+        self.connection = connection
+
+    def write(self, frame, keyframe, timestamp):
+        self.connection.send_threadsafe(frame)
+
+
+class RingSink(VideoSink):
+    """Sink that keeps the most recent video in a `VideoRing`."""
+
+    def __init__(self, name: str, ring: VideoRing, max_queue: int):
+        super().__init__(name, max_queue, "newest")
+        self.ring = ring
+
+    def write(self, frame, keyframe, timestamp):
+        self.ring.append(frame, keyframe)
+
+
+class VideoFanout:
+    """One running video encoder, whose frames are distributed to any number of sinks.
+
+    The encoder output copies every frame once and hands the same bytes to all sinks. Sinks can be added and
+    removed while the encoder runs; the stream information the encoder announced at startup is replayed to
+    sinks that join later.
+    """
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.frames = 0
+        self.streams = []
+        self._sinks = []
+        self._last_frame = None
+        self._intervals = deque(maxlen=FRAME_INTERVALS)
+        self._lock = threading.Lock()
+
+    @property
+    def sinks(self) -> list:
+        with self._lock:
+            return list(self._sinks)
+
+    def add_stream(self, *args, **kwargs):
+        """Record a stream announced by the encoder at startup (`Output._add_stream`), before any sink is added."""
+        with self._lock:
+            self.streams.append((args, kwargs))
+
+    def add(self, sink: VideoSink):
+        """Start `sink` and feed it from the next frame on. Blocks while the consumer is opened."""
+        with self._lock:
+            streams = list(self.streams)
+        sink.start(streams)
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove(self, sink: VideoSink):
+        """Stop feeding `sink`. The caller closes it."""
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def outputframe(self, frame, keyframe: bool, timestamp=None):
+        """Distribute an encoded frame. The frame is copied once, because encoders reuse their output buffers."""
+        data = bytes(frame)
+        now = time.perf_counter()
+        with self._lock:
+            self.frames += 1
+            if self._last_frame is not None:
+                self._intervals.append((self.frames, now - self._last_frame))
+            self._last_frame = now
+            sinks = list(self._sinks)
+        for sink in sinks:
+            sink.put(data, keyframe, timestamp)
+
+    def gap_since(self, frames: int) -> float:
+        """Longest interval in seconds between encoded frames, that arrived after the first `frames` frames. Time since the last frame counts as
+        interval, so a stalled encoder shows up before its next frame."""
+        with self._lock:
+            gap = max((interval for index, interval in self._intervals if index > frames), default=0.0)
+            if self._last_frame is not None:
+                gap = max(gap, time.perf_counter() - self._last_frame)
+        return gap
+
+    def status(self) -> dict:
+        return {"resolution": list(self.size),
+                "frames": self.frames,
+                "sinks": [sink.status() for sink in self.sinks]}
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import deque
+
+
+class VideoRing:
+    """Bounded in-memory ring of the most recently encoded video frames.
+
+    The encoder thread appends every frame with its arrival time. Frames older than `seconds`, or beyond the
+    `max_bytes` budget, are dropped from the front. Clips are cut so they start on a keyframe, which carries the
+    repeated H.264 sequence headers, so every clip is decodable on its own.
+    The ring has no camera dependency and can be fed by any encoder (or a synthetic one).
+    """
+
+    def __init__(self, seconds: float, max_bytes: int, clock=time.monotonic):
+        if seconds <= 0:
+            raise ValueError(f"Invalid ring buffer length '{seconds}'. Expected FLOAT: 0.0<SECONDS.")
+        if max_bytes <= 0:
+            raise ValueError(f"Invalid ring buffer budget '{max_bytes}'. Expected INTEGER: 0<MAX_BYTES.")
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.nbytes = 0
+        self.dropped = 0
+        self._frames = deque()
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def append(self, frame, keyframe: bool, timestamp: float = None):
+        """Add an encoded frame. The frame data is copied, because encoders reuse their output buffers."""
+        data = bytes(frame)
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            self._frames.append((timestamp, keyframe, data))
+            self.nbytes += len(data)
+            while self._frames and (self.nbytes > self.max_bytes or timestamp - self._frames[0][0] > self.seconds):
+                _, _, old = self._frames.popleft()
+                self.nbytes -= len(old)
+                self.dropped += 1
+            self._appended.notify_all()
+
+    def span(self) -> float:
+        """Seconds of video currently held by the ring."""
+        with self._lock:
+            return self._frames[-1][0] - self._frames[0][0] if len(self._frames) > 1 else 0.0
+
+    def wait_until(self, timestamp: float, timeout: float = None) -> bool:
+        """Block until a frame at or after `timestamp` was appended. Returns `False` on timeout."""
+        with self._lock:
+            return self._appended.wait_for(lambda: self._frames and self._frames[-1][0] >= timestamp, timeout)
+
+    def clip(self, start: float, end: float):
+        """Return the frames between `start` and `end`, beginning at the last keyframe at or before `start`
+        (or the first keyframe after it, if the ring does not reach back that far).
+
+        Returns:
+            frames (list): `(timestamp, keyframe, data)` tuples in encoding order.
+        """
+        with self._lock:
+            frames = list(self._frames)
+        first = None
+        for index, (timestamp, keyframe, _) in enumerate(frames):
+            if timestamp > end:
+                break
+            if keyframe and (first is None or timestamp <= start):
+                first = index
+        if first is None:
+            return []
+        return [frame for frame in frames[first:] if frame[0] <= end]
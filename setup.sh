@@ -13,11 +13,16 @@ if ! command -v git &>/dev/null; then
 fi
 
 # 2) Installing the Picamera2 Library (if not already available)
-echo "[2/4] CAMERA-SERVER SETUP: Checking for picamera2 library…"
+echo "[2/4] CAMERA-SERVER SETUP: Checking for picamera2 and pyzbar libraries…"
 if ! python3 - <<<'import picamera2' &>/dev/null; then
   apt-get update
   DEBIAN_FRONTEND=noninteractive apt-get install -y python3-picamera2
 fi
+# QR code and barcode decoding (zbar) for the scan commands
+if ! python3 - <<<'import pyzbar.pyzbar' &>/dev/null; then
+  apt-get update
+  DEBIAN_FRONTEND=noninteractive apt-get install -y python3-pyzbar
+fi
 
 # 3) Clone or update the repo
 if [ -d "$TARGET/.git" ]; then